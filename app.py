@@ -1,5 +1,6 @@
 import streamlit as st
 import os
+import json
 import time
 from datetime import datetime
 
@@ -16,9 +17,14 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
 from components.pdf_processor import PDFProcessor
-from components.vector_store import VectorStore
-from components.llm_handler import LLMHandler
 from components.analytics import AnalyticsLogger
+from components.ingestion import IngestionManifest
+from components.context_builder import ContextBuilder
+from components.resources import (
+    get_vector_store, get_llm_handler, get_query_cache, get_context_builder, get_ingestion_worker
+)
+from components.metadata_index import RetrievalScope
+from components.tracing import trace, span, recent_traces, to_chrome_trace
 
 # Custom CSS for professional look
 st.markdown("""
@@ -167,11 +173,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
+# Initialize session state; the store, model and LLM clients are shared by every session
 if 'vector_store' not in st.session_state:
-    st.session_state.vector_store = VectorStore()
+    st.session_state.vector_store = get_vector_store()
 if 'llm_handler' not in st.session_state:
-    st.session_state.llm_handler = LLMHandler(provider="gemini")
+    st.session_state.llm_handler = get_llm_handler("gemini")
 if 'analytics' not in st.session_state:
     st.session_state.analytics = AnalyticsLogger()
 if 'chat_history' not in st.session_state:
@@ -180,6 +186,12 @@ if 'processed_pdfs' not in st.session_state:
     st.session_state.processed_pdfs = []
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "upload"
+if 'ingestion_jobs' not in st.session_state:
+    st.session_state.ingestion_jobs = []
+if 'pinned_pdfs' not in st.session_state:
+    st.session_state.pinned_pdfs = []
+if 'retrieval_mode' not in st.session_state:
+    st.session_state.retrieval_mode = Config.RETRIEVAL_MODE
 
 def render_header():
     """Render animated header"""
@@ -214,47 +226,119 @@ def render_upload_section():
         with col2:
             if st.button("🚀 Process Documents", use_container_width=True):
                 process_pdfs(uploaded_files)
+    
+    render_ingestion_jobs()
 
 def process_pdfs(uploaded_files):
-    """Process uploaded PDFs with progress tracking"""
-    progress_container = st.container()
-    
-    with progress_container:
-        # Save files temporarily
-        pdf_paths = []
-        for uploaded_file in uploaded_files:
-            save_path = os.path.join(Config.UPLOAD_DIR, uploaded_file.name)
-            with open(save_path, "wb") as f:
-                f.write(uploaded_file.getvalue())
-            pdf_paths.append(save_path)
+    """Save uploaded PDFs and queue them for the background ingestion worker"""
+    # Save new or changed files; identical content is skipped by hash
+    manifest = IngestionManifest()
+    documents = []
+    content_hashes = set()
+    skipped = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name not in st.session_state.processed_pdfs:
             st.session_state.processed_pdfs.append(uploaded_file.name)
         
-        # Process with progress bar
-        st.markdown("### 📊 Processing Documents")
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        processor = PDFProcessor(max_workers=Config.MAX_WORKERS)
-        
-        # Simulate progress updates
-        total_files = len(pdf_paths)
-        for i, pdf_path in enumerate(pdf_paths):
-            status_text.text(f"Processing {os.path.basename(pdf_path)}...")
-            progress_bar.progress((i + 1) / total_files * 0.5)
-        
-        # Actual processing
-        chunks = processor.process_multiple_pdfs(pdf_paths)
-        progress_bar.progress(0.75)
-        status_text.text("Creating vector embeddings...")
-        
-        # Add to vector store
-        count = st.session_state.vector_store.add_documents(chunks)
-        progress_bar.progress(1.0)
+        # Hash and save straight from the upload's buffer rather than a getvalue() copy
+        with uploaded_file.getbuffer() as data:
+            content_hash = IngestionManifest.hash_bytes(data)
+            if manifest.contains(content_hash) or content_hash in content_hashes:
+                skipped.append(uploaded_file.name)
+                continue
+            
+            # The worker and later re-indexes read the PDF from disk
+            save_path = os.path.join(Config.UPLOAD_DIR, uploaded_file.name)
+            with open(save_path, "wb") as f:
+                f.write(data)
         
-        st.success(f"✅ Successfully processed {len(pdf_paths)} PDFs into {count} chunks!")
-        time.sleep(1)
-        st.session_state.current_tab = "chat"
-        st.rerun()
+        content_hashes.add(content_hash)
+        documents.append({
+            "path": save_path,
+            "pdf_name": uploaded_file.name,
+            "content_hash": content_hash,
+            # Same name, new content: only the chunks that changed are rewritten
+            "reindex": bool(manifest.hash_for_name(uploaded_file.name))
+        })
+    
+    if skipped:
+        st.info(f"⏭️ Already ingested, skipped: {', '.join(skipped)}")
+    if not documents:
+        return
+    
+    job_id = get_ingestion_worker().submit(documents)
+    st.session_state.ingestion_jobs.append(job_id)
+    st.success(f"📥 Queued {len(documents)} PDFs for ingestion (job {job_id}). "
+               f"You can keep chatting while they are processed.")
+
+# Timed fragments (Streamlit >= 1.33) redraw only the job list; older versions rerun the page
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+def render_ingestion_jobs():
+    """Progress of this session's ingestion jobs, polled from the shared job table while any are active"""
+    if _fragment is not None:
+        _ingestion_jobs_fragment()
+    else:
+        _render_job_progress()
+
+if _fragment is not None:
+    @_fragment(run_every=Config.JOB_UI_REFRESH_SECONDS)
+    def _ingestion_jobs_fragment():
+        was_active = st.session_state.get("jobs_active", False)
+        _render_job_progress()
+        if was_active and not st.session_state.jobs_active:
+            # Finished jobs change the document list outside this fragment
+            st.rerun()
+
+def _render_job_progress():
+    job_store = get_ingestion_worker().job_store
+    jobs = [job for job in (job_store.get(job_id) for job_id in st.session_state.ingestion_jobs) if job]
+    st.session_state.jobs_active = any(job["status"] in ("queued", "running") for job in jobs)
+    if not jobs:
+        return
+    
+    st.markdown("### 📊 Ingestion Jobs")
+    for job in reversed(jobs):
+        names = ", ".join(doc["pdf_name"] for doc in job["documents"])
+        if job["status"] == "queued":
+            st.markdown(f"⏳ **Queued**: {names}")
+        elif job["status"] == "running":
+            fraction = job["pages_done"] / job["pages_total"] if job["pages_total"] else 0.0
+            st.progress(
+                min(fraction, 1.0),
+                text=f"Processing {job['current_pdf'] or names}: page {job['pages_done']}/{job['pages_total']}, "
+                     f"{job['chunks_written']} chunks embedded"
+            )
+        elif job["status"] == "done":
+            seconds = (job["finished_at"] or 0) - (job["started_at"] or 0)
+            st.markdown(f"✅ **Done** in {seconds:.1f}s: {names} ({job['result']['chunks']} chunks)")
+        else:
+            st.markdown(f"❌ **Failed**: {names} — {job['error']}")
+
+def create_processor() -> PDFProcessor:
+    return PDFProcessor(
+        max_workers=Config.MAX_WORKERS,
+        execution_mode=Config.EXTRACTION_MODE,
+        engine=Config.EXTRACTION_ENGINE
+    )
+
+def reindex_pdf_file(pdf_name: str, pdf_path: str, content_hash: str = None) -> dict:
+    """Re-extract one PDF and write only the chunks that differ from the index"""
+    with trace("reindex") as reindex_trace:
+        chunks = list(create_processor().iter_multiple_pdfs([pdf_path]))
+        changes = st.session_state.vector_store.reindex_pdf(pdf_name, chunks)
+    st.session_state.analytics.log_trace(reindex_trace)
+    IngestionManifest().record(
+        content_hash or IngestionManifest.hash_file(pdf_path), pdf_name, pdf_path, len(chunks)
+    )
+    return changes
+
+def remove_pdf(pdf_name: str):
+    """Remove one PDF from the index and the manifest"""
+    st.session_state.vector_store.delete_pdf(pdf_name)
+    IngestionManifest().remove(pdf_name)
+    if pdf_name in st.session_state.processed_pdfs:
+        st.session_state.processed_pdfs.remove(pdf_name)
 
 def render_chat_interface():
     """Render professional chat interface"""
@@ -272,6 +356,13 @@ def render_chat_interface():
     
     # Input area
     st.markdown("---")
+    available_pdfs = st.session_state.vector_store.pdf_names()
+    st.session_state.pinned_pdfs = st.multiselect(
+        "📌 Pinned documents",
+        available_pdfs,
+        default=[name for name in st.session_state.pinned_pdfs if name in available_pdfs],
+        help="Only search these documents. Leave empty to search everything."
+    )
     col1, col2 = st.columns([6, 1])
     with col1:
         query = st.text_input("Ask a question...", key="query_input", 
@@ -316,15 +407,58 @@ def handle_query(query: str):
     # Add user message
     st.session_state.chat_history.append({"role": "user", "content": query})
     
-    # Retrieve context
-    with st.spinner("🔍 Searching documents..."):
-        results = st.session_state.vector_store.query(query, n_results=5)
-    
-    # Generate response
-    with st.spinner("🤖 Generating answer..."):
-        response = st.session_state.llm_handler.generate_response(query, results)
-    
-    response_time = (time.time() - start_time) * 1000
+    with trace("query") as query_trace:
+        vector_store = st.session_state.vector_store
+        query_cache = get_query_cache()
+        query_embedding = vector_store.embed_query(query)
+        corpus_version = vector_store.corpus_version()
+        pinned = st.session_state.pinned_pdfs or None
+        cache_namespace = f"{st.session_state.retrieval_mode}|5|{RetrievalScope(pinned).key()}"
+        
+        time_to_first_token = None
+        cached = query_cache.get(query, query_embedding, corpus_version, cache_namespace)
+        context_stats = {}
+        if cached:
+            (results, response), cache_hit = cached
+        else:
+            cache_hit = None
+            
+            # Over-retrieve, then keep a diverse, token-budgeted subset
+            with st.spinner("🔍 Searching documents..."):
+                with span("retrieval", mode=st.session_state.retrieval_mode):
+                    candidates = vector_store.query(
+                        query, n_results=5 * Config.CONTEXT_CANDIDATE_FACTOR,
+                        mode=st.session_state.retrieval_mode,
+                        query_embedding=query_embedding, include_embeddings=True,
+                        pdf_names=pinned
+                    )
+                with span("context_build"):
+                    results, context_stats = get_context_builder().build(candidates)
+                context_stats["prompt_tokens"] = st.session_state.llm_handler.count_prompt_tokens(query, results)
+            
+            # Generate response, rendering the answer as tokens arrive
+            answer_placeholder = st.empty()
+            streamed_answer = ""
+            response = {}
+            with span("llm_call", provider=st.session_state.llm_handler.provider):
+                for event in st.session_state.llm_handler.stream_response(query, results):
+                    if event["type"] == "token":
+                        if time_to_first_token is None:
+                            time_to_first_token = (time.time() - start_time) * 1000
+                        streamed_answer += event["text"]
+                        answer_placeholder.markdown(f'<div class="bot-message">{streamed_answer}▌</div>',
+                                                    unsafe_allow_html=True)
+                    else:
+                        response = event["response"]
+            answer_placeholder.empty()
+            
+            if not response.get("error"):
+                query_cache.put(query, query_embedding, (results, response), corpus_version, cache_namespace)
+            context_stats["citation_grounding"] = ContextBuilder.citation_grounding(response, results)
+        
+        response_time = (time.time() - start_time) * 1000
+        if time_to_first_token is None:
+            time_to_first_token = response_time
     
     # Add to chat history
     st.session_state.chat_history.append({
@@ -340,7 +474,12 @@ def handle_query(query: str):
         {
             "pdf_names": list(set(m.get("pdf_name") for m in results.get("metadatas", [[]])[0])),
             "retrieved_chunks": len(results.get("documents", [[]])[0]),
-            "response_time": response_time
+            "response_time": response_time,
+            "time_to_first_token": time_to_first_token,
+            "cache_hit": cache_hit,
+            **context_stats,
+            "trace_id": query_trace.trace_id,
+            "spans": query_trace.spans
         }
     )
     
@@ -394,6 +533,53 @@ def render_analytics_dashboard():
         </div>
         """, unsafe_allow_html=True)
     
+    # Answer cache effectiveness
+    total_queries = stats.get('total_queries', 0)
+    if total_queries:
+        hit_rate = stats.get('cache_hits', 0) / total_queries * 100
+        st.markdown(f"⚡ **Answer cache hit rate:** {hit_rate:.0f}% "
+                    f"({stats.get('cache_hits', 0)} of {total_queries} queries, "
+                    f"{stats.get('semantic_cache_hits', 0)} near-duplicate)")
+    
+    # Prompt size and answer quality proxies for generated (uncached) answers
+    if stats.get('avg_prompt_tokens') is not None:
+        grounding = stats.get('avg_citation_grounding')
+        grounding_text = f"{grounding * 100:.0f}%" if grounding is not None else "n/a"
+        st.markdown(f"🧮 **Avg prompt tokens:** {stats['avg_prompt_tokens']:.0f} · "
+                    f"**Context relevance:** {stats.get('avg_context_relevance', 0):.2f} · "
+                    f"**Citations grounded in context:** {grounding_text}")
+    
+    # Latency percentiles
+    latency = stats.get('latency_percentiles', {})
+    if any(value is not None for value in latency.get('response_time', {}).values()):
+        st.markdown("### ⏱️ Latency")
+        labels = {"response_time": "Full response", "time_to_first_token": "First token"}
+        st.table({
+            labels[metric]: {p: f"{value:.0f} ms" if value is not None else "–" for p, value in values.items()}
+            for metric, values in latency.items()
+        })
+    
+    # Per-stage latency from traced spans
+    stages = stats.get('stage_percentiles', {})
+    if stages:
+        st.markdown("### 🧭 Latency by Stage")
+        st.table({
+            stage: {
+                "count": values["count"],
+                **{p: f"{values[p]:.2f} ms" for p in ("p50", "p95", "p99")}
+            }
+            for stage, values in stages.items()
+        })
+        traces = recent_traces()
+        if traces:
+            st.download_button(
+                "⬇️ Download Chrome trace",
+                json.dumps(to_chrome_trace(t.to_dict() for t in traces)),
+                file_name="pdf_hub_trace.json",
+                mime="application/json",
+                help="Open in chrome://tracing or ui.perfetto.dev"
+            )
+    
     # Most used documents
     st.markdown("### 📚 Most Referenced Documents")
     common_pdfs = stats.get('common_pdfs', {})
@@ -412,30 +598,77 @@ def render_sidebar():
         
         # LLM Provider selection
         st.markdown("### 🤖 LLM Provider")
+        provider_labels = {
+            "gemini": "Gemini (Recommended)",
+            "groq": "Groq"
+        }
         provider = st.selectbox(
             "Choose Provider",
-            ["Gemini (Recommended)", "Groq"],
+            list(provider_labels),
+            format_func=provider_labels.get,
             help="Gemini offers 1M context window for large PDFs"
         )
         
-        if provider == "Groq":
-            st.session_state.llm_handler = LLMHandler(provider="groq")
+        # Rebuild only when the selection changes, in either direction
+        if st.session_state.llm_handler.provider != provider:
+            try:
+                st.session_state.llm_handler = get_llm_handler(provider)
+            except Exception as e:
+                st.error(f"Could not switch to {provider_labels[provider]}: {e}")
+        
+        hedge_stats = getattr(st.session_state.llm_handler.backend, "stats", None)
+        if hedge_stats and hedge_stats["hedged"]:
+            st.caption(
+                f"Hedged {hedge_stats['hedged']} of {hedge_stats['requests']} requests; "
+                f"backup won {hedge_stats['backup_wins']}"
+            )
+        
+        # Retrieval mode
+        st.markdown("### 🔎 Retrieval")
+        retrieval_labels = {
+            "hybrid": "Hybrid (BM25 + Vector)",
+            "vector": "Vector only",
+            "bm25": "Keyword (BM25) only"
+        }
+        st.session_state.retrieval_mode = st.selectbox(
+            "Retrieval Mode",
+            list(retrieval_labels),
+            index=list(retrieval_labels).index(st.session_state.retrieval_mode),
+            format_func=retrieval_labels.get,
+            help="Hybrid fuses keyword and semantic results, so exact part numbers and codes are found"
+        )
         
         # Vector DB Stats
         st.markdown("### 💾 Vector Database")
         stats = st.session_state.vector_store.get_stats()
         st.json(stats)
+        active_jobs = get_ingestion_worker().job_store.active()
+        if active_jobs:
+            st.caption(f"⏳ {len(active_jobs)} ingestion job(s) queued or running")
         
-        # Processed files
-        if st.session_state.processed_pdfs:
+        # Processed files with per-document maintenance
+        ingested = IngestionManifest().documents
+        if ingested:
             st.markdown("### 📁 Processed Files")
-            for pdf in st.session_state.processed_pdfs:
-                st.markdown(f"✅ {pdf}")
+            for content_hash, entry in sorted(ingested.items(), key=lambda item: item[1]["pdf_name"]):
+                pdf_name = entry["pdf_name"]
+                st.markdown(f"✅ {pdf_name} ({entry.get('chunks', 0)} chunks)")
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button("🔄 Re-index", key=f"reindex_{content_hash}",
+                                 disabled=not os.path.exists(entry.get("path", ""))):
+                        changes = reindex_pdf_file(pdf_name, entry["path"])
+                        st.success(f"{pdf_name}: {changes}")
+                with col2:
+                    if st.button("🗑️ Remove", key=f"remove_{content_hash}"):
+                        remove_pdf(pdf_name)
+                        st.rerun()
         
         # Clear data option
         st.markdown("---")
         if st.button("🗑️ Clear All Data", type="secondary"):
             st.session_state.vector_store.clear()
+            IngestionManifest().clear()
             st.session_state.processed_pdfs = []
             st.session_state.chat_history = []
             st.success("All data cleared!")
@@ -459,6 +692,11 @@ def main():
     
     with tabs[2]:
         render_analytics_dashboard()
+    
+    # Without fragments, poll by rerunning the whole page once it has been drawn
+    if _fragment is None and st.session_state.get("jobs_active"):
+        time.sleep(Config.JOB_UI_REFRESH_SECONDS)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,71 @@
+"""Answer a file of questions against the indexed PDFs, for offline evaluation.
+
+Usage:
+    python batch_eval.py questions.jsonl --output answers.jsonl [--concurrency 8] [--provider gemini]
+
+Input is JSONL with a "query" (or "question") field and an optional "id", or
+plain text with one question per line. Each answer is written as one JSONL
+record with per-query timings; a summary is printed when the run finishes.
+"""
+import argparse
+import json
+import sys
+
+from config import Config
+from components.vector_store import VectorStore
+from components.llm_handler import LLMHandler
+from components.llm_providers import PROVIDERS
+from components.batch_qa import BatchQA
+
+
+def load_questions(path: str):
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                entry = json.loads(line)
+                question = {"query": entry.get("query") or entry["question"]}
+                if "id" in entry:
+                    question["id"] = entry["id"]
+                questions.append(question)
+            else:
+                questions.append({"query": line})
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help=".jsonl with query/question fields, or one question per line")
+    parser.add_argument("--output", required=True, help="JSONL file receiving one record per answer")
+    parser.add_argument("--concurrency", type=int, default=Config.BATCH_QA_CONCURRENCY)
+    parser.add_argument("--retrieval-batch-size", type=int, default=Config.BATCH_QA_RETRIEVAL_SIZE)
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="gemini")
+    parser.add_argument("--mode", choices=VectorStore.RETRIEVAL_MODES, default=Config.RETRIEVAL_MODE)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--pdf", action="append", dest="pdf_names", help="Restrict retrieval to this PDF (repeatable)")
+    args = parser.parse_args()
+    
+    questions = load_questions(args.questions)
+    batch = BatchQA(
+        VectorStore(),
+        LLMHandler(provider=args.provider),
+        concurrency=args.concurrency,
+        retrieval_batch_size=args.retrieval_batch_size,
+        n_results=args.n_results,
+        mode=args.mode,
+        pdf_names=args.pdf_names
+    )
+    
+    def report(done, total):
+        if done % 50 == 0 or done == total:
+            print(f"Answered {done}/{total}", file=sys.stderr)
+    
+    summary = batch.run(questions, args.output, progress_callback=report)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare pdfplumber and PyMuPDF extraction throughput on the same corpus.
+
+Usage:
+    python benchmarks/compare_engines.py path/to/pdfs [more.pdf ...] [--repeat 3]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from components.pdf_processor import PDFProcessor
+
+
+def collect_pdfs(paths):
+    pdf_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_paths.extend(sorted(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True)))
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+def bench_engine(engine, pdf_paths, repeat):
+    """Serially extract every PDF and report the best of `repeat` runs"""
+    processor = PDFProcessor(engine=engine)
+    pages = sum(processor.count_pages(path) for path in pdf_paths)
+    best = None
+    chunks = 0
+    
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = sum(len(processor.extract_structure(path)) for path in pdf_paths)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    return {
+        "engine": engine,
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": round(best, 4),
+        "pages_per_second": round(pages / best, 2) if best else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="PDF files or directories")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    pdf_paths = collect_pdfs(args.paths)
+    if not pdf_paths:
+        parser.error("no PDFs found")
+    
+    results = [bench_engine(engine, pdf_paths, args.repeat) for engine in PDFProcessor.ENGINES]
+    baseline = results[0]["pages_per_second"]
+    for result in results:
+        result["speedup_vs_pdfplumber"] = round(result["pages_per_second"] / baseline, 2) if baseline else None
+    
+    print(json.dumps({"documents": len(pdf_paths), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
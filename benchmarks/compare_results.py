@@ -0,0 +1,73 @@
+"""Compare two benchmark reports (run_benchmarks.py, vector_backends.py) and flag regressions.
+
+Usage:
+    python benchmarks/compare_results.py baseline.json candidate.json [--threshold 0.10]
+
+Exits with status 1 when any throughput or recall metric drops, or any latency
+metric rises, by more than the threshold (a fraction of the baseline value).
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("_per_second", "qps", "recall")
+LOWER_IS_BETTER = ("_ms", "seconds")
+
+
+def direction(metric):
+    """+1 if larger values are better, -1 if smaller are, 0 for counts and settings"""
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline, candidate, threshold):
+    rows = []
+    for bench, metrics in sorted(baseline["results"].items()):
+        for metric, old in sorted(metrics.items()):
+            new = candidate["results"].get(bench, {}).get(metric)
+            sign = direction(metric)
+            if not sign or new is None or not old:
+                continue
+            change = (new - old) / old
+            rows.append({
+                "benchmark": bench,
+                "metric": metric,
+                "baseline": old,
+                "candidate": new,
+                "change": round(change, 4),
+                "regression": change * sign < -threshold
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+    
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+    
+    if baseline["meta"]["corpus"] != candidate["meta"]["corpus"]:
+        print("Warning: the runs used different corpora; results are not directly comparable", file=sys.stderr)
+    
+    rows = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else ""
+        print(f"{row['benchmark']:<32} {row['metric']:<18} {row['baseline']:>12} -> "
+              f"{row['candidate']:>12} {row['change']:>+8.1%} {flag}")
+    
+    regressions = [row for row in rows if row["regression"]]
+    print(json.dumps({"compared": len(rows), "regressions": len(regressions)}))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
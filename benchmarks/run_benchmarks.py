@@ -0,0 +1,259 @@
+"""Benchmark extraction, chunking, ingestion and query latency on a synthetic corpus.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--documents 10] [--pages 50] [--output results.json]
+    python benchmarks/compare_results.py baseline.json results.json
+
+PDFs come from synthetic_pdfs.py and the LLM is a FakeProvider, so nothing
+calls a remote service. Two files are still downloaded on first use and
+cached: tiktoken's cl100k_base encoding (about 1.7 MB, used by the chunker;
+set TIKTOKEN_CACHE_DIR to a pre-filled directory on offline machines) and the
+ONNX embedding model. Use --embedder hash to take the embedding model out of
+the measurement and out of the download.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from importlib import metadata
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from components.pdf_processor import PDFProcessor
+from components.vector_store import VectorStore
+from components.vector_backends import BACKENDS
+from components.context_builder import ContextBuilder
+from components.llm_handler import LLMHandler
+from components.llm_providers import FakeProvider
+from components.cache import ResponseCache
+from synthetic_pdfs import generate_corpus, WORDS
+
+
+class HashEmbedding:
+    """Deterministic bag-of-words hashing embedder (384-d, like all-MiniLM-L6-v2)"""
+    
+    def __call__(self, input):
+        vectors = np.zeros((len(input), 384), dtype=np.float32)
+        for row, text in enumerate(input):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % 384] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1.0, norms)).tolist()
+
+
+def best_of(repeat, fn):
+    """Run fn repeat times; return (best seconds, last result)"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def latency_summary(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "mean_ms": round(float(samples.mean()), 3)
+    }
+
+
+def bench_extraction(pdf_paths, pages, repeat):
+    results = {}
+    for engine in PDFProcessor.ENGINES:
+        processor = PDFProcessor(engine=engine)
+        seconds, chunks = best_of(repeat, lambda: sum(len(processor.extract_structure(p)) for p in pdf_paths))
+        results[f"extract_structure_{engine}"] = {
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 2),
+            "chunks": chunks
+        }
+    
+    for mode in PDFProcessor.EXECUTION_MODES:
+        processor = PDFProcessor(max_workers=Config.MAX_WORKERS, execution_mode=mode,
+                                 engine=Config.EXTRACTION_ENGINE)
+        seconds, chunks = best_of(repeat, lambda: len(processor.process_multiple_pdfs(pdf_paths)))
+        results[f"process_multiple_pdfs_{mode}"] = {
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 2),
+            "chunks": chunks
+        }
+    return results
+
+
+def bench_chunking(pdf_paths, repeat):
+    """Chunking alone, on pages extracted up front"""
+    processor = PDFProcessor(engine=Config.EXTRACTION_ENGINE)
+    extracted = [(processor._pdf_name(p), processor.extract_pages(p)) for p in pdf_paths]
+    pages = sum(len(doc_pages) for _, doc_pages in extracted)
+    
+    seconds, chunks = best_of(repeat, lambda: sum(
+        1 for name, doc_pages in extracted for _ in processor._chunk_pages(name, doc_pages)
+    ))
+    return {
+        "chunking": {
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 2),
+            "chunks_per_second": round(chunks / seconds, 2),
+            "chunks": chunks
+        }
+    }
+
+
+def bench_ingest(vector_store, pdf_paths, batch_size):
+    chunks = PDFProcessor(engine=Config.EXTRACTION_ENGINE).process_multiple_pdfs(pdf_paths)
+    start = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        vector_store.add_documents(chunks[i:i + batch_size])
+    seconds = time.perf_counter() - start
+    return {
+        "add_documents": {
+            "seconds": round(seconds, 4),
+            "chunks_per_second": round(len(chunks) / seconds, 2),
+            "chunks": len(chunks),
+            "batch_size": batch_size
+        }
+    }
+
+
+def make_queries(count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))) for _ in range(count)]
+
+
+def bench_queries(vector_store, queries):
+    results = {}
+    for mode in VectorStore.RETRIEVAL_MODES:
+        samples = []
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            vector_store.query(query, n_results=5, mode=mode)
+            samples.append((time.perf_counter() - query_start) * 1000)
+        seconds = time.perf_counter() - start
+        results[f"query_{mode}"] = {
+            "queries": len(queries),
+            "qps": round(len(queries) / seconds, 2),
+            **latency_summary(samples)
+        }
+    return results
+
+
+def bench_answer(vector_store, queries, work_dir):
+    """Full answer path (retrieve, pack context, generate) against a zero-latency fake LLM"""
+    llm_handler = LLMHandler(
+        provider="fake",
+        backend=FakeProvider(),
+        response_cache=ResponseCache(path=os.path.join(work_dir, "responses.sqlite"))
+    )
+    context_builder = ContextBuilder()
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        candidates = vector_store.query(query, n_results=5 * Config.CONTEXT_CANDIDATE_FACTOR,
+                                        include_embeddings=True)
+        context, _ = context_builder.build(candidates)
+        llm_handler.generate_response(query, context)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"answer_fake_llm": {"queries": len(queries), **latency_summary(samples)}}
+
+
+def package_versions():
+    versions = {}
+    for package in ("pdfplumber", "pymupdf", "chromadb", "tiktoken", "numpy"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--paragraphs-per-page", type=int, default=6)
+    parser.add_argument("--headings-per-page", type=int, default=1)
+    parser.add_argument("--words-per-paragraph", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=Config.INGEST_BATCH_SIZE)
+    parser.add_argument("--embedder", choices=("default", "hash"), default="default")
+    parser.add_argument("--backend", choices=BACKENDS, default=Config.VECTOR_BACKEND)
+    parser.add_argument("--shards", type=int, default=Config.VECTOR_SHARDS)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "pdf_hub_bench_corpus"),
+                        help="Generated PDFs are cached here and reused when the spec matches")
+    parser.add_argument("--output", help="Write the JSON results here as well as to stdout")
+    args = parser.parse_args()
+    
+    pdf_paths = generate_corpus(args.corpus_dir, args.documents, args.pages, args.paragraphs_per_page,
+                                args.headings_per_page, args.words_per_paragraph, args.seed)
+    pages = args.documents * args.pages
+    queries = make_queries(args.queries, args.seed)
+    
+    results = {}
+    results.update(bench_extraction(pdf_paths, pages, args.repeat))
+    results.update(bench_chunking(pdf_paths, args.repeat))
+    
+    work_dir = tempfile.mkdtemp(prefix="pdf_hub_bench_")
+    try:
+        vector_store = VectorStore(
+            persist_dir=work_dir,
+            embedding_function=HashEmbedding() if args.embedder == "hash" else None,
+            backend=args.backend,
+            shards=args.shards
+        )
+        results.update(bench_ingest(vector_store, pdf_paths, args.batch_size))
+        results.update(bench_queries(vector_store, queries))
+        results.update(bench_answer(vector_store, queries, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "packages": package_versions(),
+            "corpus": {
+                "documents": args.documents,
+                "pages": args.pages,
+                "paragraphs_per_page": args.paragraphs_per_page,
+                "headings_per_page": args.headings_per_page,
+                "words_per_paragraph": args.words_per_paragraph,
+                "seed": args.seed
+            },
+            "embedder": args.embedder,
+            "vector_backend": args.backend,
+            "vector_shards": args.shards,
+            "extraction_engine": Config.EXTRACTION_ENGINE,
+            "chunk_size": Config.CHUNK_SIZE
+        },
+        "results": results
+    }
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Measure app import time and per-session memory with isolated vs shared resources.
+
+Usage:
+    python benchmarks/startup.py [--sessions 10] [--embedder default] [--output startup.json]
+
+"isolated" builds a VectorStore and LLMHandler per session, as the app used
+to; "shared" takes them from components.resources. Each measurement runs in
+a fresh interpreter inside an empty working directory.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("chromadb", "onnxruntime", "google.generativeai", "groq", "fitz", "pdfplumber", "tiktoken")
+# What app.py imports from the repo, minus streamlit itself
+APP_IMPORTS = (
+    "config", "components.pdf_processor", "components.analytics", "components.ingestion",
+    "components.context_builder", "components.metadata_index", "components.tracing",
+    "components.vector_store", "components.llm_handler", "components.resources"
+)
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), falling back to the peak elsewhere"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def child_imports():
+    start = time.perf_counter()
+    for module in APP_IMPORTS:
+        __import__(module)
+    return {
+        "import_seconds": round(time.perf_counter() - start, 4),
+        "rss_mb": round(rss_mb(), 1),
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules]
+    }
+
+
+def child_sessions(mode, sessions, embedder, provider):
+    from components.vector_store import VectorStore
+    from components.llm_handler import LLMHandler
+    from components import resources
+    
+    embedding_function = None
+    if embedder == "hash":
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        from run_benchmarks import HashEmbedding
+        embedding_function = HashEmbedding()
+    
+    baseline = rss_mb()
+    after = []
+    start = time.perf_counter()
+    kept = []  # hold every session's objects, as st.session_state would
+    shared_store = None
+    for _ in range(sessions):
+        if mode == "isolated":
+            store = VectorStore(embedding_function=embedding_function)
+            handler = LLMHandler(provider=provider)
+        else:
+            if embedding_function is not None:
+                # resources always uses the default model; share one store the same way
+                shared_store = shared_store or VectorStore(embedding_function=embedding_function)
+                store = shared_store
+            else:
+                store = resources.get_vector_store()
+            handler = resources.get_llm_handler(provider)
+        store.query("warm up the embedding model", n_results=1)  # models load on first use
+        kept.append((store, handler))
+        after.append(rss_mb())
+    seconds = time.perf_counter() - start
+    
+    return {
+        "sessions": sessions,
+        "seconds": round(seconds, 3),
+        "first_session_mb": round(after[0] - baseline, 1),
+        "per_extra_session_mb": round((after[-1] - after[0]) / max(sessions - 1, 1), 2),
+        "rss_mb": round(after[-1], 1)
+    }
+
+
+def run_child(args):
+    """Re-run this script in a fresh interpreter and an empty working directory"""
+    with tempfile.TemporaryDirectory(prefix="pdf_hub_startup_") as work_dir:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *args],
+            cwd=work_dir, env=env, capture_output=True, text=True, check=True
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--embedder", choices=("default", "hash"), default="default")
+    parser.add_argument("--provider", default="fake", help="LLM provider built per session")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold import runs (best is reported)")
+    parser.add_argument("--output")
+    parser.add_argument("--child", choices=("imports", "isolated", "shared"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child == "imports":
+        print(json.dumps(child_imports()))
+        return
+    if args.child:
+        print(json.dumps(child_sessions(args.child, args.sessions, args.embedder, args.provider)))
+        return
+    
+    imports = min((run_child(["--child", "imports"]) for _ in range(args.repeat)),
+                  key=lambda result: result["import_seconds"])
+    common = ["--sessions", str(args.sessions), "--embedder", args.embedder, "--provider", args.provider]
+    report = {
+        "meta": {"python": sys.version.split()[0], "embedder": args.embedder, "provider": args.provider},
+        "results": {
+            "cold_import": imports,
+            "sessions_isolated": run_child(["--child", "isolated", *common]),
+            "sessions_shared": run_child(["--child", "shared", *common])
+        }
+    }
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Generate a deterministic synthetic PDF corpus for benchmarks, fully offline.
+
+Usage:
+    python benchmarks/synthetic_pdfs.py out_dir [--documents 10] [--pages 50] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+
+import fitz  # PyMuPDF
+
+WORDS = (
+    "contract clause party agreement term payment invoice delivery warranty liability "
+    "system module interface latency throughput request response server client cache "
+    "valve pressure temperature sensor engine pump flow safety inspection maintenance "
+    "revenue margin forecast quarter growth budget expense audit compliance policy "
+    "patient dosage trial outcome protocol cohort baseline adverse placebo endpoint"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+BODY_SIZE = 10
+HEADING_SIZE = 14
+
+
+def make_paragraph(rng, words_per_paragraph):
+    words = [rng.choice(WORDS) for _ in range(words_per_paragraph)]
+    # A few identifiers so exact-match (BM25) queries have something to find
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), f"{rng.choice('ABCDEFGH')}X-{rng.randrange(1000, 9999)}")
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def generate_pdf(path, pages=50, paragraphs_per_page=6, headings_per_page=1,
+                 words_per_paragraph=80, seed=0):
+    """Write one PDF whose every page has the given number of headings and body paragraphs"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    section = 0
+    box = fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN)
+    
+    for _ in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        heading_slots = set(rng.sample(range(paragraphs_per_page), min(headings_per_page, paragraphs_per_page)))
+        y = box.y0
+        
+        for index in range(paragraphs_per_page):
+            if index in heading_slots:
+                section += 1
+                # "Section N" also matches the pdfplumber engine's heading regex
+                y = _write(page, box, y, f"Section {section} {rng.choice(WORDS).title()}",
+                           HEADING_SIZE, "hebo")
+            y = _write(page, box, y, make_paragraph(rng, words_per_paragraph), BODY_SIZE, "helv")
+            if y >= box.y1:
+                break
+    
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+
+def _write(page, box, y, text, size, font):
+    """Write a text block below y and return the y where the next block starts"""
+    rect = fitz.Rect(box.x0, y, box.x1, box.y1)
+    remaining = page.insert_textbox(rect, text, fontsize=size, fontname=font)
+    if remaining < 0:
+        return box.y1  # did not fit; the page is full
+    used = rect.height - remaining
+    return y + used + size
+
+
+def generate_corpus(out_dir, documents=10, pages=50, paragraphs_per_page=6, headings_per_page=1,
+                    words_per_paragraph=80, seed=0):
+    """Generate (or reuse) a corpus and return the PDF paths; identical arguments give identical files"""
+    os.makedirs(out_dir, exist_ok=True)
+    spec = {
+        "documents": documents,
+        "pages": pages,
+        "paragraphs_per_page": paragraphs_per_page,
+        "headings_per_page": headings_per_page,
+        "words_per_paragraph": words_per_paragraph,
+        "seed": seed
+    }
+    spec_path = os.path.join(out_dir, "corpus.json")
+    paths = [os.path.join(out_dir, f"synthetic_{i:04d}.pdf") for i in range(documents)]
+    
+    if os.path.exists(spec_path) and all(os.path.exists(path) for path in paths):
+        with open(spec_path, "r", encoding="utf-8") as f:
+            if json.load(f) == spec:
+                return paths
+    
+    for i, path in enumerate(paths):
+        generate_pdf(path, pages, paragraphs_per_page, headings_per_page, words_per_paragraph, seed * 100_003 + i)
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--paragraphs-per-page", type=int, default=6)
+    parser.add_argument("--headings-per-page", type=int, default=1)
+    parser.add_argument("--words-per-paragraph", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    paths = generate_corpus(args.out_dir, args.documents, args.pages, args.paragraphs_per_page,
+                            args.headings_per_page, args.words_per_paragraph, args.seed)
+    print(json.dumps({"documents": len(paths), "directory": args.out_dir}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Compare vector backends: build time, query latency and recall against exact search.
+
+Usage:
+    python benchmarks/vector_backends.py [--rows 50000] [--dim 384] [--output backends.json]
+    python benchmarks/compare_results.py baseline.json backends.json
+
+Vectors are a seeded mixture of Gaussian clusters, so results are
+reproducible without PDFs or an embedding model. Recall is the share of the
+exact float32 top-k (cosine) that each backend returns.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from components.vector_backends import ChromaBackend, NumpyBackend
+from run_benchmarks import latency_summary, package_versions
+
+BACKENDS = {
+    "chroma": lambda path: ChromaBackend(path),
+    "numpy_float16": lambda path: NumpyBackend(path, dtype="float16"),
+    "numpy_int8": lambda path: NumpyBackend(path, dtype="int8")
+}
+
+
+def make_vectors(rows, dim, clusters, queries, seed):
+    """Clustered corpus vectors and queries drawn near the same centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    corpus = centres[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    probes = centres[rng.integers(0, clusters, queries)] + 0.6 * rng.standard_normal((queries, dim)).astype(np.float32)
+    return corpus, probes
+
+
+def exact_top_k(corpus, probes, k, allowed=None):
+    """Ground truth by float32 cosine similarity; allowed restricts it to some rows"""
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    probes = probes / np.linalg.norm(probes, axis=1, keepdims=True)
+    truth = []
+    for start in range(0, len(probes), 256):
+        scores = probes[start:start + 256] @ corpus.T
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+        truth.extend(np.argsort(-scores, axis=1, kind="stable")[:, :k])
+    return [set(f"v{row}" for row in rows) for rows in truth]
+
+
+def recall(results, truth):
+    return round(float(np.mean([len(set(ids) & expected) / len(expected) for ids, expected in zip(results, truth)])), 4)
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench_backend(name, path, corpus, probes, metadatas, args, truth, scoped_truth, scope):
+    backend = BACKENDS[name](path)
+    ids = [f"v{row}" for row in range(len(corpus))]
+    documents = [f"document {row}" for row in range(len(corpus))]
+    
+    start = time.perf_counter()
+    for offset in range(0, len(corpus), args.batch_size):
+        end = offset + args.batch_size
+        backend.add(ids[offset:end], corpus[offset:end].tolist(), documents[offset:end], metadatas[offset:end])
+    build_seconds = time.perf_counter() - start
+    
+    include = ["distances"]
+    samples, found = [], []
+    for probe in probes:
+        query_start = time.perf_counter()
+        found.extend(backend.query([probe.tolist()], n_results=args.k, include=include)["ids"])
+        samples.append((time.perf_counter() - query_start) * 1000)
+    
+    start = time.perf_counter()
+    batched = []
+    for offset in range(0, len(probes), args.query_batch):
+        batched.extend(backend.query(probes[offset:offset + args.query_batch].tolist(),
+                                     n_results=args.k, include=include)["ids"])
+    batch_seconds = time.perf_counter() - start
+    
+    scoped_samples, scoped_found = [], []
+    for probe in probes:
+        query_start = time.perf_counter()
+        scoped_found.extend(backend.query([probe.tolist()], n_results=args.k, where=scope, include=include)["ids"])
+        scoped_samples.append((time.perf_counter() - query_start) * 1000)
+    
+    return {
+        f"{name}_build": {
+            "seconds": round(build_seconds, 4),
+            "vectors_per_second": round(len(corpus) / build_seconds, 2),
+            "disk_bytes": directory_bytes(path)
+        },
+        f"{name}_query": {
+            "queries": len(probes),
+            "recall": recall(found, truth),
+            **latency_summary(samples)
+        },
+        f"{name}_query_batched": {
+            "batch_size": args.query_batch,
+            "qps": round(len(probes) / batch_seconds, 2),
+            "recall": recall(batched, truth)
+        },
+        f"{name}_query_scoped": {
+            "recall": recall(scoped_found, scoped_truth),
+            **latency_summary(scoped_samples)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Vectors per add() call")
+    parser.add_argument("--query-batch", type=int, default=64, help="Query embeddings per batched query")
+    parser.add_argument("--pdfs", type=int, default=100, help="Distinct pdf_name values; scoped queries use a tenth")
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS), dest="backends",
+                        help="Backend to measure (repeatable; default all)")
+    parser.add_argument("--output", help="Write the JSON results here as well as to stdout")
+    args = parser.parse_args()
+    
+    corpus, probes = make_vectors(args.rows, args.dim, args.clusters, args.queries, args.seed)
+    pdf_of_row = np.arange(args.rows) % args.pdfs
+    metadatas = [{"pdf_name": f"doc{pdf}.pdf", "page_start": int(row // args.pdfs)} for row, pdf in enumerate(pdf_of_row)]
+    scoped_pdfs = list(range(max(1, args.pdfs // 10)))
+    scope = {"pdf_name": {"$in": [f"doc{pdf}.pdf" for pdf in scoped_pdfs]}}
+    truth = exact_top_k(corpus, probes, args.k)
+    scoped_truth = exact_top_k(corpus, probes, args.k, allowed=np.isin(pdf_of_row, scoped_pdfs))
+    
+    results = {}
+    for name in args.backends or list(BACKENDS):
+        work_dir = tempfile.mkdtemp(prefix=f"pdf_hub_{name}_")
+        try:
+            results.update(bench_backend(name, work_dir, corpus, probes, metadatas, args, truth, scoped_truth, scope))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "packages": package_versions(),
+            "corpus": {
+                "rows": args.rows,
+                "dim": args.dim,
+                "clusters": args.clusters,
+                "queries": args.queries,
+                "k": args.k,
+                "seed": args.seed
+            }
+        },
+        "results": results
+    }
+    
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,320 @@
+import atexit
+import glob
 import json
+import math
 import os
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 
+_STATE_LOCK = threading.Lock()
+LATENCY_METRICS = ("response_time", "time_to_first_token")
+QUALITY_METRICS = ("prompt_tokens", "context_relevance", "citation_grounding")
+
+
+def histogram_add(histogram: Dict[str, int], value_ms: float):
+    """Count a latency in a log-spaced bucket (relative error bounded by the growth factor)"""
+    growth = Config.LATENCY_HISTOGRAM_GROWTH
+    bucket = math.ceil(math.log(max(value_ms, 0.01)) / math.log(growth))  # 10 µs floor
+    histogram[str(bucket)] = histogram.get(str(bucket), 0) + 1
+
+
+def histogram_percentile(histogram: Dict[str, int], percentile: float) -> Optional[float]:
+    """Upper bound of the bucket holding the given percentile, in milliseconds"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    target = percentile / 100 * total
+    seen = 0
+    for bucket in sorted(histogram, key=int):
+        seen += histogram[bucket]
+        if seen >= target:
+            return round(Config.LATENCY_HISTOGRAM_GROWTH ** int(bucket), 3)
+    return None
+
+
+class AnalyticsWriter:
+    """Background thread appending queued log entries in batches, one whole-line write per batch"""
+    
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self, flush_entries: int = Config.ANALYTICS_FLUSH_ENTRIES,
+                 flush_seconds: float = Config.ANALYTICS_FLUSH_SECONDS,
+                 queue_size: int = Config.ANALYTICS_QUEUE_SIZE):
+        self.flush_entries = flush_entries
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    @classmethod
+    def get(cls) -> "AnalyticsWriter":
+        """The process-wide writer shared by every session"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+    
+    def submit(self, path: str, line: str):
+        """Queue a line for appending without blocking the caller"""
+        try:
+            self._queue.put_nowait((path, line))
+        except queue.Full:
+            self.dropped += 1
+    
+    def flush(self, timeout: float = 5.0):
+        """Block until everything queued before this call is on disk"""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+    
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
+    
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_seconds
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = False
+            
+            if isinstance(item, tuple):
+                pending.append(item)
+                if len(pending) < self.flush_entries:
+                    continue
+            
+            self._write(pending)
+            pending = []
+            deadline = time.monotonic() + self.flush_seconds
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+    
+    @staticmethod
+    def _write(entries: List):
+        by_path = {}
+        for path, line in entries:
+            by_path.setdefault(path, []).append(line)
+        
+        for path, lines in by_path.items():
+            data = "".join(lines).encode("utf-8")
+            try:
+                # O_APPEND makes each write land at the current end of file, so whole
+                # batches from concurrent sessions or processes never interleave
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    written = os.write(fd, data)
+                    while written < len(data):
+                        written += os.write(fd, data[written:])
+                finally:
+                    os.close(fd)
+            except Exception as e:
+                print(f"Error writing analytics log: {e}")
+
 
 class AnalyticsLogger:
     def __init__(self):
         self.log_file = os.path.join(Config.LOG_DIR, f"queries_{datetime.now().strftime('%Y%m')}.jsonl")
+        self.state_file = Config.ANALYTICS_STATE_PATH
         self.session_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.writer = AnalyticsWriter.get()
         os.makedirs(Config.LOG_DIR, exist_ok=True)
     
     def log_query(self, query: str, response: Dict, metadata: Dict[str, Any]):
-        """Log query and response for analysis"""
+        """Log query and response for analysis (queued; written by the background writer)"""
+        now = datetime.now()
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "session_id": self.session_id,
             "query": query,
             "response": response,
             "metadata": metadata
         }
         
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
+        # Resolve the month file per entry so long-running sessions roll over
+        log_file = os.path.join(Config.LOG_DIR, f"queries_{now.strftime('%Y%m')}.jsonl")
+        self.writer.submit(log_file, json.dumps(log_entry, ensure_ascii=False) + '\n')
+    
+    def log_trace(self, trace):
+        """Log a finished non-query trace (e.g. ingestion) for per-stage latency stats"""
+        now = datetime.now()
+        log_entry = {
+            "timestamp": now.isoformat(),
+            "session_id": self.session_id,
+            **trace.to_dict()
+        }
+        log_file = os.path.join(Config.LOG_DIR, f"traces_{now.strftime('%Y%m')}.jsonl")
+        self.writer.submit(log_file, json.dumps(log_entry, ensure_ascii=False) + '\n')
     
     def get_analytics(self) -> Dict:
-        """Generate analytics from logs"""
-        if not os.path.exists(self.log_file):
+        """Generate analytics, parsing only log lines appended since the last call"""
+        self.writer.flush()
+        with _STATE_LOCK:
+            state = self._load_state()
+            if self._catch_up(state):
+                self._save_state(state)
+        
+        aggregates = state["aggregates"]
+        if not aggregates["total_queries"]:
             return {}
         
         stats = {
+            "total_queries": aggregates["total_queries"],
+            "queries_today": aggregates["queries_by_day"].get(datetime.now().date().isoformat(), 0),
+            "queries_by_month": aggregates["queries_by_month"],
+            "cache_hits": aggregates["cache_hits"],
+            "semantic_cache_hits": aggregates["semantic_cache_hits"],
+            "common_pdfs": aggregates["common_pdfs"],
+            "feedback_distribution": aggregates["feedback_distribution"],
+            "latency_percentiles": {
+                metric: {
+                    f"p{p}": histogram_percentile(aggregates["latency_histograms"][metric], p)
+                    for p in (50, 95, 99)
+                }
+                for metric in LATENCY_METRICS
+            },
+            "stage_percentiles": {
+                stage: {
+                    "count": sum(histogram.values()),
+                    **{f"p{p}": histogram_percentile(histogram, p) for p in (50, 95, 99)}
+                }
+                for stage, histogram in sorted(aggregates["stage_histograms"].items())
+            }
+        }
+        for key, (value_sum, count) in aggregates["totals"].items():
+            stats[f"avg_{key}"] = round(value_sum / count, 4) if count else None
+        return stats
+    
+    @staticmethod
+    def _empty_aggregates() -> Dict:
+        return {
             "total_queries": 0,
-            "queries_today": 0,
+            "queries_by_day": {},
+            "queries_by_month": {},
+            "cache_hits": 0,
+            "semantic_cache_hits": 0,
             "common_pdfs": {},
-            "feedback_distribution": {"thumbs_up": 0, "thumbs_down": 0}
+            "feedback_distribution": {"thumbs_up": 0, "thumbs_down": 0},
+            # Per-query quality metrics are only logged for generated answers
+            "totals": {key: [0, 0] for key in QUALITY_METRICS},
+            "latency_histograms": {metric: {} for metric in LATENCY_METRICS},
+            "stage_histograms": {}  # span name -> histogram of span durations
+        }
+    
+    def _catch_up(self, state: Dict) -> bool:
+        """Fold new lines of every monthly log into the aggregates; True if anything changed"""
+        offsets = state["offsets"]
+        log_files = {
+            os.path.basename(path): path
+            for pattern in ("queries_*.jsonl", "traces_*.jsonl")
+            for path in glob.glob(os.path.join(Config.LOG_DIR, pattern))
         }
         
-        today = datetime.now().date()
+        # A vanished or shrunken log means the history was rewritten: start over
+        if any(name not in log_files or os.path.getsize(log_files[name]) < offset
+               for name, offset in offsets.items()):
+            state["offsets"], state["aggregates"] = {}, self._empty_aggregates()
+            offsets = state["offsets"]
         
-        try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if not line.strip():
-                        continue
-                    entry = json.loads(line)
-                    stats["total_queries"] += 1
-                    
-                    entry_date = datetime.fromisoformat(entry["timestamp"]).date()
-                    if entry_date == today:
-                        stats["queries_today"] += 1
-                    
-                    for pdf in entry["metadata"].get("pdf_names", []):
-                        stats["common_pdfs"][pdf] = stats["common_pdfs"].get(pdf, 0) + 1
-                    
-                    feedback = entry["metadata"].get("user_feedback")
-                    if feedback == "up":
-                        stats["feedback_distribution"]["thumbs_up"] += 1
-                    elif feedback == "down":
-                        stats["feedback_distribution"]["thumbs_down"] += 1
-        except Exception as e:
-            print(f"Error reading analytics: {e}")
+        changed = False
+        for name in sorted(log_files):
+            offset = offsets.get(name, 0)
+            if os.path.getsize(log_files[name]) <= offset:
+                continue
+            try:
+                with open(log_files[name], 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # a writer is mid-append; pick it up next time
+                        offset += len(line)
+                        if not line.strip():
+                            continue
+                        if name.startswith("traces_"):
+                            self._add_spans(state["aggregates"], json.loads(line).get("spans", []))
+                        else:
+                            self._add_entry(state["aggregates"], json.loads(line), name)
+            except Exception as e:
+                print(f"Error reading analytics: {e}")
+            if offset != offsets.get(name, 0):
+                offsets[name] = offset
+                changed = True
+        return changed
+    
+    @staticmethod
+    def _add_entry(aggregates: Dict, entry: Dict, log_name: str):
+        metadata = entry.get("metadata", {})
+        aggregates["total_queries"] += 1
         
-        return stats
\ No newline at end of file
+        day = entry["timestamp"][:10]
+        aggregates["queries_by_day"][day] = aggregates["queries_by_day"].get(day, 0) + 1
+        month = log_name[len("queries_"):-len(".jsonl")]
+        aggregates["queries_by_month"][month] = aggregates["queries_by_month"].get(month, 0) + 1
+        
+        for pdf in metadata.get("pdf_names", []):
+            aggregates["common_pdfs"][pdf] = aggregates["common_pdfs"].get(pdf, 0) + 1
+        
+        cache_hit = metadata.get("cache_hit")
+        if cache_hit:
+            aggregates["cache_hits"] += 1
+            if cache_hit == "semantic":
+                aggregates["semantic_cache_hits"] += 1
+        
+        for key, total in aggregates["totals"].items():
+            value = metadata.get(key)
+            if value is not None:
+                total[0] += value
+                total[1] += 1
+        
+        for metric, histogram in aggregates["latency_histograms"].items():
+            value = metadata.get(metric)
+            if value is not None:
+                histogram_add(histogram, value)
+        
+        AnalyticsLogger._add_spans(aggregates, metadata.get("spans", []))
+        
+        feedback = metadata.get("user_feedback")
+        if feedback == "up":
+            aggregates["feedback_distribution"]["thumbs_up"] += 1
+        elif feedback == "down":
+            aggregates["feedback_distribution"]["thumbs_down"] += 1
+    
+    @staticmethod
+    def _add_spans(aggregates: Dict, spans: List[Dict]):
+        for span in spans:
+            histogram = aggregates["stage_histograms"].setdefault(span["name"], {})
+            histogram_add(histogram, span["duration_ms"])
+    
+    def _load_state(self) -> Dict:
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if state.get("version") == Config.ANALYTICS_STATE_VERSION:
+                    return state
+            except Exception as e:
+                print(f"Error reading analytics state, rebuilding: {e}")
+        return {"version": Config.ANALYTICS_STATE_VERSION, "offsets": {}, "aggregates": self._empty_aggregates()}
+    
+    def _save_state(self, state: Dict):
+        # Write-then-rename so a crash never leaves offsets out of step with aggregates
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_file)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import time
+from typing import List, Dict, Any, Optional, Callable, Union
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from components.context_builder import ContextBuilder
+from components.llm_providers import run_sync
+
+
+class BatchQA:
+    """Answer many questions offline: batched retrieval, generation under a concurrency limit"""
+    
+    def __init__(self, vector_store, llm_handler, context_builder: Optional[ContextBuilder] = None,
+                 concurrency: int = Config.BATCH_QA_CONCURRENCY,
+                 retrieval_batch_size: int = Config.BATCH_QA_RETRIEVAL_SIZE,
+                 n_results: int = 5, mode: str = None, pdf_names: Optional[List[str]] = None):
+        self.vector_store = vector_store
+        self.llm_handler = llm_handler
+        self.context_builder = context_builder or ContextBuilder()
+        self.concurrency = max(1, concurrency)
+        self.retrieval_batch_size = max(1, retrieval_batch_size)
+        self.n_results = n_results
+        self.mode = mode or Config.RETRIEVAL_MODE
+        self.pdf_names = pdf_names
+    
+    def run(self, questions: List[Union[str, Dict]], output_path: Optional[str] = None,
+            progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Answer every question, appending one JSONL record per answer; returns a summary"""
+        return run_sync(self.arun(questions, output_path, progress_callback))
+    
+    async def arun(self, questions: List[Union[str, Dict]], output_path: Optional[str] = None,
+                   progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        questions = [q if isinstance(q, dict) else {"query": q} for q in questions]
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        output = open(output_path, "w", encoding="utf-8") if output_path else None
+        records = []
+        start = time.perf_counter()
+        
+        async def answer(index: int, question: Dict, context: Dict):
+            record = await self._answer(semaphore, index, question, context)
+            # Runs on the event loop thread, so appends never interleave
+            records.append(record)
+            if output:
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+            if progress_callback:
+                progress_callback(len(records), len(questions))
+        
+        pending = set()
+        try:
+            for offset in range(0, len(questions), self.retrieval_batch_size):
+                # Retrieval stays a batch ahead of generation, not the whole set, to bound memory
+                while len(pending) >= self.concurrency + self.retrieval_batch_size:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()  # Surfaces output write errors
+                
+                batch = questions[offset:offset + self.retrieval_batch_size]
+                # Chroma and the embedding model are blocking; keep them off the event loop
+                contexts = await loop.run_in_executor(None, self._retrieve, batch)
+                for index, (question, context) in enumerate(zip(batch, contexts), offset):
+                    pending.add(asyncio.ensure_future(answer(index, question, context)))
+            
+            await asyncio.gather(*pending)
+        finally:
+            # After a failure, stop the remaining answers before the output file closes under them
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if output:
+                output.close()
+        
+        return self._summary(records, time.perf_counter() - start)
+    
+    def _retrieve(self, batch: List[Dict]) -> List[Dict]:
+        """One vector store round trip for the whole batch, then per-query context packing"""
+        start = time.perf_counter()
+        candidates = self.vector_store.query_batch(
+            [question["query"] for question in batch],
+            n_results=self.n_results * Config.CONTEXT_CANDIDATE_FACTOR,
+            mode=self.mode, include_embeddings=True, pdf_names=self.pdf_names
+        )
+        retrieval_ms = (time.perf_counter() - start) * 1000
+        
+        contexts = []
+        for question, candidate in zip(batch, candidates):
+            context_start = time.perf_counter()
+            results, stats = self.context_builder.build(candidate)
+            contexts.append({
+                "results": results,
+                "stats": stats,
+                "started_at": start,
+                "timings": {
+                    "batch_retrieval_ms": round(retrieval_ms, 3),
+                    "retrieval_ms": round(retrieval_ms / len(batch), 3),  # amortized over the batch
+                    "context_ms": round((time.perf_counter() - context_start) * 1000, 3)
+                }
+            })
+        return contexts
+    
+    async def _answer(self, semaphore: asyncio.Semaphore, index: int, question: Dict,
+                      context: Dict) -> Dict[str, Any]:
+        timings = context["timings"]
+        queued_at = time.perf_counter()
+        async with semaphore:
+            llm_start = time.perf_counter()
+            try:
+                response = await self.llm_handler.agenerate_response(question["query"], context["results"])
+            except Exception as e:
+                response = {"answer": "", "sources": [], "confidence": "low", "error": str(e)}
+            finished_at = time.perf_counter()
+        
+        timings["queue_ms"] = round((llm_start - queued_at) * 1000, 3)
+        timings["llm_ms"] = round((finished_at - llm_start) * 1000, 3)
+        timings["total_ms"] = round((finished_at - context["started_at"]) * 1000, 3)
+        results = context["results"]
+        record = {
+            "index": index,
+            "id": question.get("id", index),
+            "query": question["query"],
+            "answer": "",
+            "sources": [],
+            "confidence": None,
+            "error": None,
+            "chunk_ids": results.get("ids", [[]])[0],
+            "context_stats": context["stats"],
+            "citation_grounding": None,
+            "timings": timings
+        }
+        # Every question gets a record, so a malformed response is counted as an error, not lost
+        try:
+            if not isinstance(response, dict):
+                raise TypeError(f"LLM response is a {type(response).__name__}, not a dict")
+            record.update({
+                "answer": response.get("answer", ""),
+                "sources": response.get("sources", []),
+                "confidence": response.get("confidence"),
+                "error": response.get("error"),
+                "citation_grounding": ContextBuilder.citation_grounding(response, results)
+            })
+        except Exception as e:
+            record["error"] = f"Bad LLM response: {e}"
+        return record
+    
+    def _summary(self, records: List[Dict], seconds: float) -> Dict[str, Any]:
+        summary = {
+            "questions": len(records),
+            "errors": sum(1 for record in records if record["error"]),
+            "seconds": round(seconds, 3),
+            "questions_per_second": round(len(records) / seconds, 3) if seconds else None,
+            "concurrency": self.concurrency,
+            "model": self.llm_handler.model_name,
+            "retrieval_mode": self.mode
+        }
+        for key in ("retrieval_ms", "llm_ms", "total_ms"):
+            values = [record["timings"][key] for record in records]
+            if values:
+                summary[key] = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)}
+        return summary
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Iterable, Callable, Optional, Tuple, Any
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+def normalize_query(query: str) -> str:
+    """Case-, whitespace- and Unicode-form-insensitive form of a user query"""
+    return " ".join(unicodedata.normalize("NFC", query).lower().split())
+
+
+class DiskCache:
+    """SQLite-backed key/value cache with least-recently-used eviction"""
+    
+    _BATCH = 500  # stay well below SQLite's bound-parameter limit
+    
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON cache (last_access)")
+        self._conn.commit()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+    
+    def set(self, key: str, value: bytes):
+        self.set_many({key: value})
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Look up keys, refreshing the access time of every hit"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        
+        with self._lock:
+            for i in range(0, len(keys), self._BATCH):
+                batch = keys[i:i + self._BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+            
+            if found:
+                self._conn.executemany(
+                    "UPDATE cache SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+    
+    def set_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, last_access) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()]
+            )
+            self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class EmbeddingCache(DiskCache):
+    """Persistent embedding cache keyed by normalized chunk text and model ID"""
+    
+    def __init__(self, model_id: str = Config.EMBEDDING_MODEL_ID,
+                 path: str = Config.EMBEDDING_CACHE_PATH,
+                 max_entries: int = Config.EMBEDDING_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+        self.model_id = model_id
+    
+    def key(self, text: str) -> str:
+        # Whitespace and Unicode form do not change what the model sees
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{self.model_id}\0{normalized}".encode("utf-8")).hexdigest()
+    
+    def embed(self, texts: List[str],
+              embedding_function: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Return embeddings for texts, only calling embedding_function for cache misses"""
+        keys = [self.key(text) for text in texts]
+        cached = self.get_many(keys)
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        
+        if missing:
+            vectors = embedding_function(list(missing.values()))
+            encoded = {
+                key: np.asarray(vector, dtype=np.float32).tobytes()
+                for key, vector in zip(missing, vectors)
+            }
+            self.set_many(encoded)
+            cached.update(encoded)
+        
+        return [np.frombuffer(cached[key], dtype=np.float32).tolist() for key in keys]
+
+
+class ResponseCache(DiskCache):
+    """Persistent LLM response cache keyed by model, temperature, query and retrieved chunks"""
+    
+    def __init__(self, path: str = Config.RESPONSE_CACHE_PATH,
+                 max_entries: int = Config.RESPONSE_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+    
+    @staticmethod
+    def key(model: str, temperature: float, query: str, chunk_ids: List[str]) -> str:
+        # Chunk order is part of the key: it changes the prompt
+        payload = json.dumps([model, temperature, normalize_query(query), list(chunk_ids)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get_response(self, model: str, temperature: float, query: str,
+                     chunk_ids: List[str]) -> Optional[Dict]:
+        value = self.get(self.key(model, temperature, query, chunk_ids))
+        return json.loads(value) if value is not None else None
+    
+    def put_response(self, model: str, temperature: float, query: str,
+                     chunk_ids: List[str], response: Dict):
+        value = json.dumps(response, ensure_ascii=False).encode("utf-8")
+        self.set(self.key(model, temperature, query, chunk_ids), value)
+
+
+class SemanticQueryCache:
+    """In-memory LRU/TTL cache answering exact and near-duplicate queries"""
+    
+    def __init__(self, max_entries: int = Config.QUERY_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = Config.QUERY_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = Config.QUERY_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (namespace, normalized query) -> entry, oldest first
+        self._corpus_version = None
+        self._lock = threading.Lock()
+    
+    def get(self, query: str, embedding: List[float], corpus_version: Any,
+            namespace: str = "") -> Optional[Tuple[Any, str]]:
+        """Return (value, "exact" | "semantic") for a cached answer, or None"""
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            self._sync_version(corpus_version)
+            self._expire()
+            
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["value"], "exact"
+            
+            candidates = [(k, e) for k, e in self._entries.items() if k[0] == namespace]
+            if candidates:
+                query_vector = self._unit(embedding)
+                matrix = np.stack([e["embedding"] for _, e in candidates])
+                similarities = matrix @ query_vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_key = candidates[best][0]
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.semantic_hits += 1
+                    return candidates[best][1]["value"], "semantic"
+            
+            self.misses += 1
+            return None
+    
+    def put(self, query: str, embedding: List[float], value: Any, corpus_version: Any,
+            namespace: str = ""):
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            self._sync_version(corpus_version)
+            self._entries[key] = {
+                "embedding": self._unit(embedding),
+                "value": value,
+                "created": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+    
+    def _sync_version(self, corpus_version: Any):
+        """Drop everything once the indexed corpus has changed"""
+        if corpus_version != self._corpus_version:
+            self._entries.clear()
+            self._corpus_version = corpus_version
+    
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        # LRU reordering breaks creation order, so scan (bounded by max_entries)
+        expired = [key for key, entry in self._entries.items() if entry["created"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+    
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
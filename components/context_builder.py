@@ -0,0 +1,194 @@
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from components.tokens import encode, decode, count_tokens
+
+
+class ContextBuilder:
+    """Select, de-duplicate and pack retrieved chunks into a token-budgeted prompt context"""
+    
+    def __init__(self, token_budget: int = Config.CONTEXT_TOKEN_BUDGET,
+                 max_chunks: int = Config.CONTEXT_MAX_CHUNKS,
+                 mmr_lambda: float = Config.MMR_LAMBDA,
+                 min_trim_tokens: int = Config.CONTEXT_MIN_TRIM_TOKENS):
+        self.token_budget = token_budget
+        self.max_chunks = max_chunks
+        self.mmr_lambda = mmr_lambda
+        self.min_trim_tokens = min_trim_tokens
+    
+    def build(self, results: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Turn over-retrieved query results into (packed Chroma-shaped context, stats)"""
+        entries = [
+            {"id": chunk_id, "document": doc, "metadata": meta or {}, "distance": distance}
+            for chunk_id, doc, meta, distance in zip(
+                results.get("ids", [[]])[0],
+                results.get("documents", [[]])[0],
+                results.get("metadatas", [[]])[0],
+                results.get("distances", [[]])[0]
+            )
+        ]
+        embeddings = results.get("embeddings", [None])[0]
+        
+        selected = self._select_mmr(entries, embeddings)
+        merged = self._merge_adjacent(selected)
+        packed, context_tokens = self._pack(merged)
+        
+        relevances = [1.0 - entry["distance"] for entry in packed]
+        stats = {
+            "candidates": len(entries),
+            "selected": len(selected),
+            "merged": len(selected) - len(merged),
+            "packed": len(packed),
+            "context_tokens": context_tokens,
+            "token_budget": self.token_budget,
+            "context_relevance": round(float(np.mean(relevances)), 4) if relevances else 0.0
+        }
+        
+        context = {
+            "ids": [[entry["id"] for entry in packed]],
+            "documents": [[entry["document"] for entry in packed]],
+            "metadatas": [[entry["metadata"] for entry in packed]],
+            "distances": [[entry["distance"] for entry in packed]]
+        }
+        return context, stats
+    
+    def _select_mmr(self, entries: List[Dict], embeddings: Optional[List]) -> List[Dict]:
+        """Maximal marginal relevance: trade query similarity against similarity to chunks already chosen"""
+        if not entries:
+            return []
+        relevance = np.array([1.0 - entry["distance"] for entry in entries], dtype=np.float32)
+        if embeddings is None or any(embedding is None for embedding in embeddings):
+            order = np.argsort(-relevance, kind="stable")[:self.max_chunks]
+            return [entries[i] for i in order]
+        
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        
+        chosen = []
+        remaining = list(range(len(entries)))
+        redundancy = np.zeros(len(entries), dtype=np.float32)  # max similarity to any chosen chunk
+        while remaining and len(chosen) < self.max_chunks:
+            scores = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy[remaining]
+            best = remaining.pop(int(np.argmax(scores)))
+            chosen.append(best)
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+        return [entries[i] for i in chosen]
+    
+    def _merge_adjacent(self, entries: List[Dict]) -> List[Dict]:
+        """Join consecutive chunks of the same page into one entry, dropping their shared overlap"""
+        groups = {}
+        for rank, entry in enumerate(entries):
+            meta = entry["metadata"]
+            if meta.get("position") is None:
+                groups[("", rank)] = [(rank, entry)]
+                continue
+            key = (meta.get("pdf_name"), meta.get("page_number"))
+            groups.setdefault(key, []).append((rank, entry))
+        
+        merged = []
+        for members in groups.values():
+            members.sort(key=lambda member: member[1]["metadata"].get("position", 0))
+            run = [members[0]]
+            for member in members[1:]:
+                previous = run[-1][1]["metadata"]["position"]
+                if member[1]["metadata"]["position"] == previous + 1:
+                    run.append(member)
+                else:
+                    merged.append(self._join_run(run))
+                    run = [member]
+            merged.append(self._join_run(run))
+        
+        # Keep MMR order, placing each merged run where its best-ranked chunk was
+        merged.sort(key=lambda item: item[0])
+        return [entry for _, entry in merged]
+    
+    def _join_run(self, run: List[Tuple[int, Dict]]) -> Tuple[int, Dict]:
+        rank = min(member_rank for member_rank, _ in run)
+        if len(run) == 1:
+            return rank, run[0][1]
+        
+        entries = [entry for _, entry in run]
+        text = entries[0]["document"]
+        for entry in entries[1:]:
+            text = self._join_overlapping(text, entry["document"])
+        
+        metadata = dict(entries[0]["metadata"])
+        metadata.update({
+            "page_end": max(e["metadata"].get("page_end", e["metadata"].get("page_number", 0)) for e in entries),
+            "content_hash": "+".join(e["metadata"].get("content_hash", "") for e in entries),
+            "token_count": count_tokens(text),
+            "char_count": len(text),
+            "merged_chunks": len(entries)
+        })
+        return rank, {
+            "id": "+".join(e["id"] for e in entries),
+            "document": text,
+            "metadata": metadata,
+            "distance": min(e["distance"] for e in entries)
+        }
+    
+    @staticmethod
+    def _join_overlapping(first: str, second: str) -> str:
+        """Concatenate two chunks, removing paragraphs the second repeats from the end of the first"""
+        # Chunk overlap is carried as whole trailing paragraphs, so only paragraph
+        # boundaries of the second chunk need to be tried, longest first
+        boundaries = [i for i in range(len(second)) if second.startswith("\n\n", i)] + [len(second)]
+        for boundary in reversed(boundaries):
+            if first.endswith(second[:boundary]):
+                rest = second[boundary:].lstrip("\n")
+                return f"{first}\n\n{rest}" if rest else first
+        return f"{first}\n\n{second}"
+    
+    def _pack(self, entries: List[Dict]) -> Tuple[List[Dict], int]:
+        """Add entries in order until the token budget is spent, trimming the first one that overflows"""
+        packed = []
+        used = 0
+        for entry in entries:
+            header_tokens = count_tokens(self._reference(entry["metadata"])) + 2
+            tokens = encode(entry["document"])
+            cost = header_tokens + len(tokens)
+            
+            if used + cost <= self.token_budget:
+                packed.append(entry)
+                used += cost
+                continue
+            
+            room = self.token_budget - used - header_tokens
+            if room >= self.min_trim_tokens:
+                metadata = dict(entry["metadata"], truncated=True)
+                packed.append(dict(entry, document=decode(tokens[:room]), metadata=metadata))
+                used += header_tokens + room
+                break
+        return packed, used
+    
+    @staticmethod
+    def _reference(meta: Dict) -> str:
+        # Mirrors the per-chunk header written by LLMHandler._format_context
+        return f"[PDF: {meta.get('pdf_name', 'Unknown')}, Page: {meta.get('page_number', 'N/A')}, Heading: {meta.get('heading', 'General')}]"
+    
+    @staticmethod
+    def citation_grounding(response: Dict, context: Dict) -> Optional[float]:
+        """Share of cited sources that point at a page present in the packed context"""
+        sources = response.get("sources") or []
+        if not sources:
+            return None
+        pages = {}
+        for meta in context.get("metadatas", [[]])[0]:
+            start = meta.get("page_start", meta.get("page_number"))
+            end = meta.get("page_end", start)
+            pages.setdefault(meta.get("pdf_name"), []).append((start, end))
+        
+        grounded = 0
+        for source in sources:
+            try:
+                page = int(source.get("page_number"))
+            except (TypeError, ValueError):
+                continue
+            if any(start <= page <= end for start, end in pages.get(source.get("pdf_name"), [])):
+                grounded += 1
+        return round(grounded / len(sources), 4)
@@ -0,0 +1,207 @@
+import contextvars
+import hashlib
+import json
+import queue
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict, Callable, Optional, Tuple, Union
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+_DONE = object()
+_MANIFEST_LOCK = threading.Lock()
+
+
+class IngestionManifest:
+    """Record of ingested PDFs keyed by the SHA-256 of their bytes"""
+    
+    def __init__(self, path: str = Config.MANIFEST_PATH):
+        self.path = path
+        self.documents, self.names = self._load()
+    
+    @staticmethod
+    def hash_bytes(data: Union[bytes, memoryview]) -> str:
+        return hashlib.sha256(data).hexdigest()
+    
+    @staticmethod
+    def hash_file(path: str, block_size: int = 1 << 20) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def contains(self, content_hash: str) -> bool:
+        return content_hash in self.documents
+    
+    def get(self, content_hash: str) -> Optional[Dict]:
+        return self.documents.get(content_hash)
+    
+    def hash_for_name(self, pdf_name: str) -> Optional[str]:
+        return self.names.get(pdf_name)
+    
+    def record(self, content_hash: str, pdf_name: str, path: str, chunk_count: int):
+        """Mark content as ingested under pdf_name, replacing any older version of that name"""
+        self.record_many([(content_hash, pdf_name, path, chunk_count)])
+    
+    def record_many(self, entries: List[Tuple[str, str, str, int]]):
+        """record() for several (content_hash, pdf_name, path, chunk_count) with one rewrite"""
+        with _MANIFEST_LOCK:
+            self.documents, self.names = self._load()
+            for content_hash, pdf_name, path, chunk_count in entries:
+                previous = self.names.get(pdf_name)
+                if previous and previous != content_hash:
+                    self.documents.pop(previous, None)
+                self.documents[content_hash] = {
+                    "pdf_name": pdf_name,
+                    "path": path,
+                    "chunks": chunk_count,
+                    "ingested_at": datetime.now().isoformat()
+                }
+                self.names[pdf_name] = content_hash
+            self._save()
+    
+    def remove(self, pdf_name: str):
+        with _MANIFEST_LOCK:
+            self.documents, self.names = self._load()
+            content_hash = self.names.pop(pdf_name, None)
+            self.documents.pop(content_hash, None)
+            self._save()
+    
+    def clear(self):
+        with _MANIFEST_LOCK:
+            self.documents, self.names = {}, {}
+            self._save()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data.get("documents", {}), data.get("names", {})
+        except Exception as e:
+            print(f"Error reading ingestion manifest: {e}")
+            return {}, {}
+    
+    def _save(self):
+        # Write-then-rename so a crash never leaves a truncated manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": self.documents, "names": self.names}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class IngestionPipeline:
+    """Stream chunks from a PDFProcessor into a VectorStore in bounded batches"""
+    
+    def __init__(self, processor, vector_store,
+                 batch_size: int = Config.INGEST_BATCH_SIZE,
+                 queue_size: int = Config.INGEST_QUEUE_SIZE, upsert: bool = False):
+        self.processor = processor
+        self.vector_store = vector_store
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        # Upserting makes re-running a partly written PDF safe, e.g. after an interrupted run
+        self.write = vector_store.upsert_documents if upsert else vector_store.add_documents
+        self.chunks_per_pdf = Counter()
+    
+    def run(self, pdf_paths: List[str],
+            progress_callback: Optional[Callable[[int], None]] = None,
+            document_callback: Optional[Callable[[str, int], None]] = None,
+            page_callback: Optional[Callable[[str, int], None]] = None) -> int:
+        """Ingest PDFs and return the number of chunks written.
+        
+        progress_callback(chunks_written) fires after each batch is stored and
+        document_callback(pdf_path, chunk_count) once every chunk of that PDF is;
+        PDF names (basenames) must be unique within one run. page_callback is
+        passed to PDFProcessor.iter_multiple_pdfs and runs on the producer thread.
+        """
+        # Extraction fills a bounded queue on a producer thread while this
+        # thread embeds and writes, so at most queue_size + 2 batches are
+        # alive at once regardless of corpus size.
+        batches = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        
+        # The producer runs in a copy of this context so its spans join the caller's trace
+        producer = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._produce, pdf_paths, batches, stop, errors, page_callback),
+            name="ingestion-producer",
+            daemon=True
+        )
+        producer.start()
+        
+        written = 0
+        self.chunks_per_pdf = Counter()
+        try:
+            while True:
+                item = batches.get()
+                if item is _DONE:
+                    break
+                batch, finished = item
+                if batch:
+                    written += self.write(batch)
+                    self.chunks_per_pdf.update(chunk.pdf_name for chunk in batch)
+                    if progress_callback:
+                        progress_callback(written)
+                if document_callback:
+                    for pdf_path in finished:
+                        document_callback(pdf_path, self.chunks_per_pdf.get(self.processor._pdf_name(pdf_path), 0))
+        finally:
+            # Unblocks the producer if the consumer failed mid-stream
+            stop.set()
+            producer.join()
+        
+        if errors:
+            raise errors[0]
+        return written
+    
+    def _produce(self, pdf_paths: List[str], batches: queue.Queue,
+                 stop: threading.Event, errors: List[Exception],
+                 page_callback: Optional[Callable[[str, int], None]] = None):
+        # Chunks arrive grouped by PDF in pdf_paths order, so once a chunk of a
+        # later PDF shows up, every PDF before it (including any that produced
+        # no chunks) is complete and is reported with the batch that ends it.
+        batch, finished = [], []
+        upcoming = iter(pdf_paths)
+        current = None
+        try:
+            for chunk in self.processor.iter_multiple_pdfs(pdf_paths, page_callback):
+                if current is None or chunk.pdf_name != self.processor._pdf_name(current):
+                    if current is not None:
+                        finished.append(current)
+                    for current in upcoming:
+                        if self.processor._pdf_name(current) == chunk.pdf_name:
+                            break
+                        finished.append(current)
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    if not self._put(batches, (batch, finished), stop):
+                        return
+                    batch, finished = [], []
+            
+            if current is not None:
+                finished.append(current)
+            finished.extend(upcoming)
+            self._put(batches, (batch, finished), stop)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            self._put(batches, _DONE, stop)
+    
+    @staticmethod
+    def _put(batches: queue.Queue, item, stop: threading.Event) -> bool:
+        """Block until the item is queued, giving up once the consumer has stopped"""
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
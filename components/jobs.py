@@ -0,0 +1,372 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import List, Dict, Any, Optional
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from components.ingestion import IngestionPipeline, IngestionManifest
+from components.pdf_processor import PDFProcessor
+from components.analytics import AnalyticsLogger
+from components.tracing import trace
+
+
+def _process_identity(pid: int) -> Optional[str]:
+    """host:pid:start-time of a running process where the OS exposes start times (Linux /proc), else None"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22 is the start time; split after the command name, which may contain spaces
+    start = stat.rsplit(b")", 1)[1].split()[19].decode()
+    return f"{socket.gethostname()}:{pid}:{start}"
+
+
+# Recorded on claimed jobs; the start time (or a random token) tells a restarted server from one that reused its PID
+PROCESS_OWNER = _process_identity(os.getpid()) or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_gone(owner: Optional[str]) -> bool:
+    """True if the process that claimed a job has certainly exited; unknown owners count as alive"""
+    if owner is None:
+        return True  # Claimed before owners were recorded
+    if owner == PROCESS_OWNER:
+        return False
+    host, pid, _ = owner.rsplit(":", 2)
+    if host != socket.gethostname():
+        return False  # Another machine: left to the stale timeout
+    if int(pid) == os.getpid():
+        return True  # Our PID, but an earlier process
+    if not os.path.isdir("/proc/self"):
+        return False  # No way to check other processes here
+    return _process_identity(int(pid)) != owner
+
+
+class JobStore:
+    """SQLite table of ingestion jobs (queued, running, done, failed), shared by threads and processes"""
+    
+    STATUSES = ("queued", "running", "done", "failed")
+    _COLUMNS = ("id", "status", "documents", "created_at", "started_at", "finished_at", "updated_at",
+                "pages_done", "pages_total", "chunks_written", "current_pdf", "error", "result", "owner")
+    
+    def __init__(self, path: str = Config.JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, documents TEXT NOT NULL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, updated_at REAL NOT NULL, "
+            "pages_done INTEGER DEFAULT 0, pages_total INTEGER DEFAULT 0, chunks_written INTEGER DEFAULT 0, "
+            "current_pdf TEXT, error TEXT, result TEXT, owner TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+    
+    def submit(self, documents: List[Dict[str, Any]]) -> str:
+        """Queue documents ({path, pdf_name, content_hash, reindex}) as one job and return its ID"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, documents, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(documents), now, now)
+            )
+            self._conn.commit()
+        return job_id
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+    
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return self._select("ORDER BY created_at DESC LIMIT ?", (limit,))
+    
+    def active(self) -> List[Dict[str, Any]]:
+        return self._select("WHERE status IN ('queued', 'running') ORDER BY created_at")
+    
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job running and return it; None when the queue is empty"""
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                # The status check makes the claim atomic if another process got there first
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, updated_at = ?, error = NULL, owner = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (now, now, PROCESS_OWNER, row[0])
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    break
+        return self.get(row[0])
+    
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+    
+    def heartbeat(self, job_id: str):
+        """Mark a job this process is running as alive, unless it was requeued meanwhile"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running' AND owner = ?",
+                (time.time(), job_id, PROCESS_OWNER)
+            )
+            self._conn.commit()
+    
+    def finish(self, job_id: str, result: Dict[str, Any]):
+        self.update(job_id, status="done", finished_at=time.time(), current_pdf=None, result=json.dumps(result))
+    
+    def fail(self, job_id: str, error: str):
+        self.update(job_id, status="failed", finished_at=time.time(), error=error)
+    
+    def requeue_orphaned(self) -> int:
+        """Put running jobs whose process has exited (e.g. a server restart) back in the queue"""
+        with self._lock:
+            running = self._conn.execute("SELECT id, owner FROM jobs WHERE status = 'running'").fetchall()
+            count = 0
+            for job_id, owner in running:
+                if _owner_gone(owner):
+                    # The owner check skips jobs another process requeued and claimed meanwhile
+                    count += self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', updated_at = ?, owner = NULL "
+                        "WHERE id = ? AND status = 'running' AND owner IS ?",
+                        (time.time(), job_id, owner)
+                    ).rowcount
+            self._conn.commit()
+        return count
+    
+    def requeue_stale(self, max_age: float = Config.JOB_STALE_SECONDS) -> int:
+        """Put running jobs whose worker stopped reporting back in the queue, wherever it ran"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ?, owner = NULL "
+                "WHERE status = 'running' AND updated_at < ?",
+                (time.time(), time.time() - max_age)
+            ).rowcount
+            self._conn.commit()
+        return count
+    
+    def _select(self, clause: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs {clause}", params).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(zip(self._COLUMNS, row))
+            job["documents"] = json.loads(job["documents"])
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+            jobs.append(job)
+        return jobs
+
+
+class IngestionWorker:
+    """Background thread running queued ingestion jobs one at a time, reporting progress to the JobStore"""
+    
+    def __init__(self, job_store: JobStore, vector_store, processor: Optional[PDFProcessor] = None,
+                 poll_seconds: float = Config.JOB_POLL_SECONDS):
+        self.job_store = job_store
+        self.vector_store = vector_store
+        self.processor = processor or PDFProcessor(
+            max_workers=Config.MAX_WORKERS,
+            execution_mode=Config.EXTRACTION_MODE,
+            engine=Config.EXTRACTION_ENGINE
+        )
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._recover()
+            self._thread = threading.Thread(target=self._run, name="ingestion-worker", daemon=True)
+            self._thread.start()
+    
+    def submit(self, documents: List[Dict[str, Any]]) -> str:
+        job_id = self.job_store.submit(documents)
+        self.start()
+        self._wake.set()
+        return job_id
+    
+    def _run(self):
+        while True:
+            job = self.job_store.claim_next()
+            if job is None:
+                # Pick up jobs left behind by servers that exited or stalled while this one runs
+                self._recover()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            try:
+                # Steps like re-embedding a large PDF report no progress for minutes
+                with _Heartbeat(self.job_store, job["id"]):
+                    self._process(job)
+            except Exception as e:
+                print(f"Ingestion job {job['id']} failed: {e}")
+                traceback.print_exc()
+                self.job_store.fail(job["id"], str(e))
+    
+    def _recover(self):
+        try:
+            self.job_store.requeue_orphaned()
+            self.job_store.requeue_stale()
+        except Exception as e:
+            print(f"Error requeueing interrupted ingestion jobs: {e}")
+    
+    def _process(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        documents = job["documents"]
+        progress = _JobProgress(self.job_store, job_id, {
+            doc["path"]: self._count_pages(doc["path"]) for doc in documents
+        })
+        manifest = IngestionManifest()
+        reindexed = {}
+        
+        with trace("ingest") as ingest_trace:
+            # Same name, new content: only rewrite the chunks that changed
+            for doc in documents:
+                if not doc.get("reindex"):
+                    continue
+                progress.document_started(doc["path"])
+                chunks = list(self.processor.iter_multiple_pdfs([doc["path"]], progress.page))
+                reindexed[doc["pdf_name"]] = self.vector_store.reindex_pdf(doc["pdf_name"], chunks)
+                manifest.record(doc["content_hash"], doc["pdf_name"], doc["path"], len(chunks))
+                progress.reindexed(doc["path"], len(chunks))
+            
+            # Upsert: a job requeued after a restart may find some of its chunks already stored
+            new_docs = [doc for doc in documents if not doc.get("reindex")]
+            pipeline = IngestionPipeline(self.processor, self.vector_store, upsert=True)
+            if new_docs:
+                pipeline.run(
+                    [doc["path"] for doc in new_docs],
+                    progress_callback=progress.batch,
+                    document_callback=progress.document_done,
+                    page_callback=progress.page
+                )
+                manifest.record_many([
+                    (doc["content_hash"], doc["pdf_name"], doc["path"],
+                     pipeline.chunks_per_pdf.get(doc["pdf_name"], 0))
+                    for doc in new_docs
+                ])
+        AnalyticsLogger().log_trace(ingest_trace)
+        
+        self.job_store.finish(job_id, {
+            "documents": len(documents),
+            "chunks": progress.chunks_written,
+            "chunks_per_pdf": dict(pipeline.chunks_per_pdf),
+            "reindexed": reindexed
+        })
+    
+    def _count_pages(self, pdf_path: str) -> int:
+        try:
+            return self.processor.count_pages(pdf_path)
+        except Exception as e:
+            print(f"Error counting pages of {pdf_path}: {e}")
+            return 0
+
+
+class _Heartbeat:
+    """Background thread keeping a running job's updated_at fresh, so requeue_stale leaves it alone"""
+    
+    def __init__(self, job_store: JobStore, job_id: str, interval: float = Config.JOB_HEARTBEAT_SECONDS):
+        self.job_store = job_store
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ingestion-heartbeat", daemon=True)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.job_store.heartbeat(self.job_id)
+            except Exception as e:
+                print(f"Error recording heartbeat of ingestion job {self.job_id}: {e}")
+
+
+class _JobProgress:
+    """Collects page and batch callbacks from both pipeline threads; writes to the job table at most every interval"""
+    
+    def __init__(self, job_store: JobStore, job_id: str, page_totals: Dict[str, int],
+                 interval: float = Config.JOB_PROGRESS_INTERVAL):
+        self.job_store = job_store
+        self.job_id = job_id
+        self.page_totals = page_totals
+        self.interval = interval
+        self.pages_seen: Dict[str, int] = {}
+        self.chunks_written = 0
+        self.current_pdf = None
+        self._chunks_before = 0  # written by earlier re-index steps of this job
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+        job_store.update(job_id, pages_total=sum(page_totals.values()))
+    
+    def page(self, pdf_path: str, page_number: int):
+        """Page extracted (producer thread)"""
+        with self._lock:
+            self.pages_seen[pdf_path] = page_number
+            self.current_pdf = os.path.basename(pdf_path)
+        self._write()
+    
+    def batch(self, written: int):
+        """Chunks embedded and stored so far by the pipeline (consumer thread)"""
+        with self._lock:
+            self.chunks_written = self._chunks_before + written
+        self._write()
+    
+    def document_started(self, pdf_path: str):
+        with self._lock:
+            self.current_pdf = os.path.basename(pdf_path)
+        self._write(force=True)
+    
+    def document_done(self, pdf_path: str, chunks: int):
+        with self._lock:
+            # Trailing pages without text are never reported, so count them here
+            self.pages_seen[pdf_path] = self.page_totals.get(pdf_path, self.pages_seen.get(pdf_path, 0))
+        self._write(force=True)
+    
+    def reindexed(self, pdf_path: str, chunks: int):
+        """A re-index step finished; its chunks precede everything the pipeline writes"""
+        with self._lock:
+            self._chunks_before += chunks
+            self.chunks_written = self._chunks_before
+        self.document_done(pdf_path, chunks)
+    
+    def _write(self, force: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < self.interval:
+                return
+            self._last_write = now
+            fields = {
+                "pages_done": sum(self.pages_seen.values()),
+                "chunks_written": self.chunks_written,
+                "current_pdf": self.current_pdf
+            }
+        self.job_store.update(self.job_id, **fields)
@@ -0,0 +1,335 @@
+import json
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Optional, Iterable, Set
+import numpy as np
+import sys
+
+try:
+    import fcntl  # serializes journal writers across processes; not available on Windows
+except ImportError:
+    fcntl = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+# Keeps part numbers, error codes and clause IDs ("AB-1234", "3.2.1") whole
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+_PART_SPLIT = re.compile(r"[-_./:]")
+_JOURNAL_LOCK = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; compound identifiers also contribute their parts"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = _PART_SPLIT.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+class BM25Index:
+    """Incrementally maintained BM25 inverted index persisted as snapshot + journal"""
+    
+    def __init__(self, directory: str = Config.BM25_INDEX_DIR,
+                 k1: float = Config.BM25_K1, b: float = Config.BM25_B):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.snapshot_path = os.path.join(directory, "snapshot.pkl")
+        self.journal_path = os.path.join(directory, "journal.jsonl")
+        self.lock_path = os.path.join(directory, "journal.lock")
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.RLock()
+        self._reset()
+        self._snapshot_version = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self.refresh()
+    
+    def _reset(self):
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)  # term -> {chunk_id: tf}
+        self.doc_terms: Dict[str, List[str]] = {}  # chunk_id -> unique terms, for deletes
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_pdf: Dict[str, str] = {}
+        self.pdf_docs: Dict[str, set] = defaultdict(set)
+        self.total_length = 0
+        self._reset_rows()
+    
+    def _reset_rows(self):
+        # Documents are numbered so search can score postings as arrays;
+        # a term's arrays are built when first queried and dropped when it changes
+        self._doc_rows: Dict[str, int] = {chunk_id: row for row, chunk_id in enumerate(self.doc_lengths)}
+        self._row_ids: List[Optional[str]] = list(self.doc_lengths)
+        self._term_arrays: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+    
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+    
+    def version(self):
+        """Token that changes whenever any instance writes to the index"""
+        self.refresh()
+        with self._lock:
+            return self._snapshot_version, self._journal_offset
+    
+    # Mutations are appended to the journal and then replayed, so every
+    # instance sharing the directory applies the same operations in order.
+    
+    def add(self, ids: List[str], texts: List[str], pdf_names: List[str]):
+        """Index chunks, replacing any existing entries with the same IDs"""
+        self._write_ops([
+            {"op": "add", "id": chunk_id, "pdf": pdf_name, "tf": Counter(tokenize(text))}
+            for chunk_id, text, pdf_name in zip(ids, texts, pdf_names)
+        ])
+    
+    def delete(self, ids: Iterable[str]):
+        ids = list(ids)
+        if ids:
+            self._write_ops([{"op": "delete", "ids": ids}])
+    
+    def delete_pdf(self, pdf_name: str):
+        self._write_ops([{"op": "delete_pdf", "pdf": pdf_name}])
+    
+    def clear(self):
+        with self._journal_lock(exclusive=True), self._lock:
+            self._reset()
+            self._save_snapshot()
+    
+    def search(self, query: str, n_results: int = 10,
+               pdf_names: Optional[Iterable[str]] = None,
+               allowed_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Return the top (chunk_id, score) pairs for a query, optionally limited to some chunks"""
+        self.refresh()
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self.total_length / doc_count
+            allowed = allowed_ids
+            if pdf_names is not None:
+                in_pdfs = set().union(*(self.pdf_docs.get(name, set()) for name in pdf_names))
+                allowed = in_pdfs if allowed is None else allowed & in_pdfs
+            
+            rows, contributions = [], []
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                # Terms in most chunks carry almost no weight but dominate
+                # scoring time on large corpora, so they are skipped.
+                if doc_count > 1000 and df > doc_count * Config.BM25_MAX_DF_RATIO:
+                    continue
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                term_rows, tf, lengths = self._postings_arrays(term)
+                norm = 1 - self.b + self.b * lengths / avg_length
+                rows.append(term_rows)
+                contributions.append(idf * tf * (self.k1 + 1) / (tf + self.k1 * norm))
+            if not rows or n_results <= 0:
+                return []
+            
+            scores = np.bincount(np.concatenate(rows), weights=np.concatenate(contributions),
+                                 minlength=len(self._row_ids))
+            if allowed is not None:
+                mask = np.zeros(len(scores), dtype=bool)
+                mask[[self._doc_rows[chunk_id] for chunk_id in allowed if chunk_id in self._doc_rows]] = True
+                scores[~mask] = 0
+            
+            matched = np.flatnonzero(scores)
+            if len(matched) > n_results:
+                matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+            # Ties keep index order, as the chunks were added
+            matched = matched[np.lexsort((matched, -scores[matched]))]
+            return [(self._row_ids[row], float(scores[row])) for row in matched]
+    
+    def _postings_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(document rows, term frequencies, document lengths) of a term's postings"""
+        arrays = self._term_arrays.get(term)
+        if arrays is None:
+            postings = self.postings[term]
+            arrays = (
+                np.fromiter((self._doc_rows[chunk_id] for chunk_id in postings), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings)),
+                np.fromiter((self.doc_lengths[chunk_id] for chunk_id in postings), dtype=np.float64,
+                            count=len(postings))
+            )
+            self._term_arrays[term] = arrays
+        return arrays
+    
+    def _apply(self, op: Dict):
+        kind = op["op"]
+        if kind == "add":
+            self._remove_doc(op["id"])
+            tf = op["tf"]
+            for term, count in tf.items():
+                self.postings[term][op["id"]] = count
+                self._term_arrays.pop(term, None)
+            self._doc_rows[op["id"]] = len(self._row_ids)
+            self._row_ids.append(op["id"])
+            length = sum(tf.values())
+            self.doc_terms[op["id"]] = list(tf)
+            self.doc_lengths[op["id"]] = length
+            self.doc_pdf[op["id"]] = op["pdf"]
+            self.pdf_docs[op["pdf"]].add(op["id"])
+            self.total_length += length
+        elif kind == "delete":
+            for chunk_id in op["ids"]:
+                self._remove_doc(chunk_id)
+        elif kind == "delete_pdf":
+            for chunk_id in list(self.pdf_docs.get(op["pdf"], ())):
+                self._remove_doc(chunk_id)
+    
+    def _remove_doc(self, chunk_id: str):
+        terms = self.doc_terms.pop(chunk_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            self._term_arrays.pop(term, None)
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(chunk_id)
+        self._row_ids[self._doc_rows.pop(chunk_id)] = None
+        pdf_name = self.doc_pdf.pop(chunk_id)
+        docs = self.pdf_docs.get(pdf_name)
+        if docs is not None:
+            docs.discard(chunk_id)
+            if not docs:
+                del self.pdf_docs[pdf_name]
+    
+    # Persistence
+    
+    @contextmanager
+    def _journal_lock(self, exclusive: bool):
+        """Writers hold the journal exclusively and readers share it, across threads and, where
+        fcntl exists, processes, so nobody reads a journal that compaction is truncating"""
+        thread_lock = _JOURNAL_LOCK if exclusive else None
+        if thread_lock is not None:
+            thread_lock.acquire()
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(self.lock_path, "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+            if thread_lock is not None:
+                thread_lock.release()
+    
+    def _write_ops(self, ops: List[Dict]):
+        if not ops:
+            return
+        with self._journal_lock(exclusive=True):
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+            # Replaying under the lock takes in every append of other processes
+            # too, so compacting cannot truncate away operations not yet applied
+            self._replay()
+            if self._journal_entries >= Config.BM25_COMPACT_EVERY:
+                with self._lock:
+                    self._save_snapshot()
+    
+    def refresh(self):
+        """Pick up operations written by other instances since the last call"""
+        with self._lock:
+            if (self._file_version(self.snapshot_path) == self._snapshot_version
+                    and self._journal_size() <= self._journal_offset):
+                return
+        with self._journal_lock(exclusive=False):
+            self._replay()
+    
+    def _journal_size(self) -> int:
+        try:
+            return os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return 0
+    
+    def _replay(self):
+        """Apply the snapshot and journal entries not yet seen (caller holds the journal lock)"""
+        with self._lock:
+            version = self._file_version(self.snapshot_path)
+            if version != self._snapshot_version:
+                self._load_snapshot()
+                self._snapshot_version = version
+                self._journal_offset = 0
+                self._journal_entries = 0
+            
+            if self._journal_size() <= self._journal_offset:
+                return
+            
+            with open(self.journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # a writer is mid-append; pick it up next time
+                    self._journal_offset += len(line)
+                    self._journal_entries += 1
+                    self._apply(json.loads(line))
+    
+    def _load_snapshot(self):
+        self._reset()
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+            self.postings = defaultdict(dict, state["postings"])
+            self.doc_terms = state["doc_terms"]
+            self.doc_lengths = state["doc_lengths"]
+            self.doc_pdf = state["doc_pdf"]
+            self.pdf_docs = defaultdict(set, state["pdf_docs"])
+            self.total_length = state["total_length"]
+            self._reset_rows()
+        except Exception as e:
+            print(f"Error loading BM25 index, starting empty: {e}")
+            self._reset()
+    
+    def _save_snapshot(self):
+        """Write the full index and truncate the journal (caller holds the exclusive journal lock and _lock)"""
+        state = {
+            "postings": dict(self.postings),
+            "doc_terms": self.doc_terms,
+            "doc_lengths": self.doc_lengths,
+            "doc_pdf": self.doc_pdf,
+            "pdf_docs": dict(self.pdf_docs),
+            "total_length": self.total_length
+        }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.snapshot_path)
+        open(self.journal_path, "w").close()
+        self._reset_rows()  # reclaim the rows of deleted chunks
+        self._snapshot_version = self._file_version(self.snapshot_path)
+        self._journal_offset = 0
+        self._journal_entries = 0
+    
+    @staticmethod
+    def _file_version(path: str):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = Config.RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(id) = sum over rankings of 1 / (k + rank)"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,43 +1,156 @@
-import google.generativeai as genai
-from typing import List, Dict, Any, Generator
+from typing import List, Dict, Any, Generator, Iterator, Optional
 import json
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from components.cache import ResponseCache
+from components.tokens import count_tokens
+from components.tracing import span
+from components.llm_providers import LLMProvider, create_provider, run_sync, iterate_sync
+
+# Separates the streamed prose answer from the trailing sources JSON
+SOURCES_MARKER = "<<<SOURCES>>>"
 
 
 class LLMHandler:
-    def __init__(self, provider: str = "gemini"):
+    def __init__(self, provider: str = "gemini", response_cache: Optional[ResponseCache] = None,
+                 temperature: float = Config.TEMPERATURE, backend: Optional[LLMProvider] = None):
         self.provider = provider
-        self._setup_client()
+        self.temperature = temperature
+        # Pass a cache to share it; None opens the default on-disk cache
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self._setup_client(backend)
     
-    def _setup_client(self):
-        if self.provider == "gemini":
-            genai.configure(api_key=Config.GOOGLE_API_KEY)
-            self.model = genai.GenerativeModel(Config.DEFAULT_MODEL)
+    def _setup_client(self, backend: Optional[LLMProvider] = None):
+        # An explicit backend (e.g. FakeProvider) bypasses provider construction
+        self.backend = backend if backend is not None else create_provider(self.provider)
+        self.model_name = self.backend.model_name
     
     def generate_response(self, query: str, context: Dict, chat_history: List[Dict] = None) -> Dict[str, Any]:
         """Generate response with citations"""
-        context_str = self._format_context(context)
+        with span("llm_call", provider=self.provider):
+            return run_sync(self.agenerate_response(query, context, chat_history))
+    
+    async def agenerate_response(self, query: str, context: Dict,
+                                 chat_history: List[Dict] = None) -> Dict[str, Any]:
+        """Async generate_response, for callers already running an event loop"""
+        chunk_ids = self._chunk_keys(context)
+        cached = self.response_cache.get_response(self.model_name, self.temperature, query, chunk_ids)
+        if cached is not None:
+            return cached
         
-        prompt = f"""You are a helpful AI assistant answering questions based on provided PDF documents.
+        result = await self._generate_uncached(query, context)
+        if not result.get("error"):
+            self.response_cache.put_response(self.model_name, self.temperature, query, chunk_ids, result)
+        return result
+    
+    @staticmethod
+    def _chunk_keys(context: Dict) -> List[str]:
+        """Ordered chunk IDs, pinned to the stored content so a re-indexed chunk misses the cache"""
+        ids = context.get('ids', [[]])[0]
+        metadatas = context.get('metadatas', [[]])[0] or [{}] * len(ids)
+        return [f"{chunk_id}:{(meta or {}).get('content_hash', '')}" for chunk_id, meta in zip(ids, metadatas)]
+    
+    async def _generate_uncached(self, query: str, context: Dict) -> Dict[str, Any]:
+        with span("prompt_build"):
+            prompt = self._build_prompt(query, context)
         
-Context from documents:
-{context_str}
-
-Question: {query}
-
-Instructions:
-1. Answer based ONLY on the provided context
-2. Cite your sources using [PDF: name, Page: X, Heading: Y] format
-3. If the answer isn't in the context, say "I cannot find this information in the provided documents"
-4. Be concise but thorough
-
-Provide your answer in this JSON structure:
+        try:
+            raw_text = await self.backend.generate(prompt, self.temperature)
+            
+            with span("json_parse"):
+                clean_json = raw_text.strip().strip('```json').strip('```').strip()
+                result = json.loads(clean_json)
+            return result
+            
+        except Exception as e:
+            return {
+                "answer": raw_text if 'raw_text' in locals() else str(e),
+                "sources": [],
+                "confidence": "low",
+                "error": str(e)
+            }
+    
+    def stream_response(self, query: str, context: Dict) -> Iterator[Dict[str, Any]]:
+        """Yield {"type": "token", "text"} events as the answer arrives, then {"type": "done", "response"}"""
+        chunk_ids = self._chunk_keys(context)
+        cached = self.response_cache.get_response(self.model_name, self.temperature, query, chunk_ids)
+        if cached is not None:
+            yield {"type": "token", "text": cached.get("answer", "")}
+            yield {"type": "done", "response": cached}
+            return
+        
+        with span("prompt_build"):
+            prompt = self._build_prompt(query, context, streaming=True)
+        answer = ""
+        pending = ""  # text that might be the start of the sources marker
+        tail = None
+        
+        try:
+            for chunk_text in iterate_sync(self.backend.stream(prompt, self.temperature)):
+                if tail is not None:
+                    tail += chunk_text
+                    continue
+                
+                pending += chunk_text
+                marker_at = pending.find(SOURCES_MARKER)
+                if marker_at >= 0:
+                    text, tail = pending[:marker_at], pending[marker_at + len(SOURCES_MARKER):]
+                    pending = ""
+                else:
+                    # Hold back a suffix that could still grow into the marker
+                    safe = len(pending) - len(SOURCES_MARKER) + 1
+                    text, pending = pending[:max(safe, 0)], pending[max(safe, 0):]
+                
+                if text:
+                    answer += text
+                    yield {"type": "token", "text": text}
+            
+            if pending:
+                answer += pending
+                yield {"type": "token", "text": pending}
+            
+            with span("json_parse"):
+                result = {"answer": answer.strip(), **self._parse_sources(tail)}
+            self.response_cache.put_response(self.model_name, self.temperature, query, chunk_ids, result)
+            
+        except Exception as e:
+            result = {
+                "answer": answer or str(e),
+                "sources": [],
+                "confidence": "low",
+                "error": str(e)
+            }
+        
+        yield {"type": "done", "response": result}
+    
+    def count_prompt_tokens(self, query: str, context: Dict, streaming: bool = True) -> int:
+        return count_tokens(self._build_prompt(query, context, streaming=streaming))
+    
+    @staticmethod
+    def _parse_sources(tail: Optional[str]) -> Dict[str, Any]:
+        """Parse the JSON block streamed after the sources marker"""
+        if tail is None:
+            return {"sources": [], "confidence": "low"}
+        try:
+            clean_json = tail.strip().strip('```json').strip('```').strip()
+            parsed = json.loads(clean_json)
+            return {
+                "sources": parsed.get("sources", []),
+                "confidence": parsed.get("confidence", "low")
+            }
+        except Exception:
+            return {"sources": [], "confidence": "low"}
+    
+    def _build_prompt(self, query: str, context: Dict, streaming: bool = False) -> str:
+        context_str = self._format_context(context)
+        
+        if streaming:
+            output_format = f"""Write the answer first as plain text with inline citations [PDF: doc.pdf, Page: 5, Heading: Introduction].
+Then, on a new line, write {SOURCES_MARKER} followed by this JSON structure:
 {{
-    "answer": "Your detailed answer here with inline citations [PDF: doc.pdf, Page: 5, Heading: Introduction]",
     "sources": [
         {{
             "pdf_name": "document.pdf",
@@ -48,22 +161,35 @@ Provide your answer in this JSON structure:
     ],
     "confidence": "high/medium/low"
 }}"""
+        else:
+            output_format = """Provide your answer in this JSON structure:
+{
+    "answer": "Your detailed answer here with inline citations [PDF: doc.pdf, Page: 5, Heading: Introduction]",
+    "sources": [
+        {
+            "pdf_name": "document.pdf",
+            "page_number": 5,
+            "heading": "Introduction",
+            "relevant_text": "Exact text snippet..."
+        }
+    ],
+    "confidence": "high/medium/low"
+}"""
+        
+        return f"""You are a helpful AI assistant answering questions based on provided PDF documents.
+        
+Context from documents:
+{context_str}
 
-        try:
-            response = self.model.generate_content(prompt)
-            raw_text = response.text
-            
-            clean_json = raw_text.strip().strip('```json').strip('```').strip()
-            result = json.loads(clean_json)
-            return result
-            
-        except Exception as e:
-            return {
-                "answer": raw_text if 'raw_text' in locals() else str(e),
-                "sources": [],
-                "confidence": "low",
-                "error": str(e)
-            }
+Question: {query}
+
+Instructions:
+1. Answer based ONLY on the provided context
+2. Cite your sources using [PDF: name, Page: X, Heading: Y] format
+3. If the answer isn't in the context, say "I cannot find this information in the provided documents"
+4. Be concise but thorough
+
+{output_format}"""
     
     def _format_context(self, context_results: Dict) -> str:
         """Format retrieved context for LLM"""
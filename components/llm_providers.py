@@ -0,0 +1,325 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterator, Optional, Any, Coroutine
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+class _LoopThread:
+    """One background event loop per process shared by every provider.
+    
+    Async SDK clients (grpc.aio for Gemini, httpx for Groq) are bound to the
+    loop they were first used on, so synchronous callers submit coroutines
+    here instead of spinning up a fresh loop with asyncio.run().
+    """
+    
+    _lock = threading.Lock()
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=cls._loop.run_forever, name="llm-event-loop", daemon=True
+                ).start()
+            return cls._loop
+
+
+async def _in_context(context: contextvars.Context, coro: Coroutine) -> Any:
+    # Tasks copy the loop thread's context; carry over the caller's (e.g. the active trace)
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """Run a coroutine on the shared provider loop and wait for its result"""
+    wrapped = _in_context(contextvars.copy_context(), coro)
+    return asyncio.run_coroutine_threadsafe(wrapped, _LoopThread.get_loop()).result()
+
+
+def iterate_sync(agen: AsyncIterator[str]) -> Iterator[str]:
+    """Drive an async iterator on the shared provider loop from synchronous code"""
+    loop = _LoopThread.get_loop()
+    try:
+        while True:
+            try:
+                step = _in_context(contextvars.copy_context(), agen.__anext__())
+                yield asyncio.run_coroutine_threadsafe(step, loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+
+class LLMProvider:
+    """Async text-generation backend with a rolling latency window"""
+    
+    name = "base"
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.latencies = {
+            "generate": deque(maxlen=Config.HEDGE_LATENCY_WINDOW),
+            "first_chunk": deque(maxlen=Config.HEDGE_LATENCY_WINDOW)
+        }
+    
+    async def generate(self, prompt: str, temperature: float) -> str:
+        raise NotImplementedError
+    
+    async def stream(self, prompt: str, temperature: float) -> AsyncIterator[str]:
+        """Yield text as it is produced; providers without streaming yield once"""
+        yield await self.generate(prompt, temperature)
+    
+    # A call cancelled because a hedge won took at least as long as it ran.
+    # Recording that lower bound keeps the slow calls in the window; otherwise
+    # only fast calls are sampled and the hedge deadline keeps shrinking.
+    
+    async def timed_generate(self, prompt: str, temperature: float) -> str:
+        start = time.perf_counter()
+        try:
+            text = await self.generate(prompt, temperature)
+        except asyncio.CancelledError:
+            self.latencies["generate"].append(time.perf_counter() - start)
+            raise
+        self.latencies["generate"].append(time.perf_counter() - start)
+        return text
+    
+    async def timed_stream(self, prompt: str, temperature: float) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        first = True
+        try:
+            async for text in self.stream(prompt, temperature):
+                if first:
+                    self.latencies["first_chunk"].append(time.perf_counter() - start)
+                    first = False
+                yield text
+        except asyncio.CancelledError:
+            if first:
+                self.latencies["first_chunk"].append(time.perf_counter() - start)
+            raise
+    
+    def latency_percentile(self, kind: str, percentile: float) -> Optional[float]:
+        """Observed latency percentile in seconds, or None until enough samples exist"""
+        samples = sorted(self.latencies[kind])
+        if len(samples) < Config.HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    
+    def __init__(self, model_name: str = Config.DEFAULT_MODEL, api_key: str = Config.GOOGLE_API_KEY):
+        super().__init__(model_name)
+        import google.generativeai as genai  # imported on first use: slow to load
+        self.genai = genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+    
+    async def generate(self, prompt: str, temperature: float) -> str:
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self.genai.GenerationConfig(temperature=temperature)
+        )
+        return response.text
+    
+    async def stream(self, prompt: str, temperature: float) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self.genai.GenerationConfig(temperature=temperature),
+            stream=True
+        )
+        async for chunk in response:
+            yield chunk.text
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+    
+    def __init__(self, model_name: str = Config.GROQ_MODEL, api_key: str = Config.GROQ_API_KEY):
+        super().__init__(model_name)
+        from groq import AsyncGroq
+        self.client = AsyncGroq(api_key=api_key)
+    
+    async def generate(self, prompt: str, temperature: float) -> str:
+        completion = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature
+        )
+        return completion.choices[0].message.content or ""
+    
+    async def stream(self, prompt: str, temperature: float) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+class FakeProvider(LLMProvider):
+    """Offline provider returning a canned response after a fixed delay, for tests and benchmarks"""
+    
+    name = "fake"
+    
+    def __init__(self, response: Optional[str] = None, latency: float = 0.0,
+                 fail: bool = False, model_name: str = "fake"):
+        super().__init__(model_name)
+        self.response = response
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+    
+    async def generate(self, prompt: str, temperature: float) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.model_name} failed")
+        if self.response is not None:
+            return self.response
+        return json.dumps({
+            "answer": f"Fake answer from {self.model_name}",
+            "sources": [],
+            "confidence": "low"
+        })
+    
+    async def stream(self, prompt: str, temperature: float) -> AsyncIterator[str]:
+        text = await self.generate(prompt, temperature)
+        for start in range(0, len(text), 16):
+            yield text[start:start + 16]
+
+
+class HedgedProvider(LLMProvider):
+    """Fire a backup provider when the primary has not answered within its p95 latency"""
+    
+    name = "hedged"
+    
+    def __init__(self, primary: LLMProvider, backup: LLMProvider,
+                 percentile: float = Config.HEDGE_PERCENTILE,
+                 default_deadline: float = Config.HEDGE_DEFAULT_DEADLINE_SECONDS):
+        super().__init__(f"{primary.model_name}|{backup.model_name}")
+        self.primary = primary
+        self.backup = backup
+        self.percentile = percentile
+        self.default_deadline = default_deadline
+        self.stats = {"requests": 0, "hedged": 0, "backup_wins": 0}
+    
+    def deadline(self, kind: str) -> float:
+        observed = self.primary.latency_percentile(kind, self.percentile)
+        return observed if observed is not None else self.default_deadline
+    
+    async def generate(self, prompt: str, temperature: float) -> str:
+        self.stats["requests"] += 1
+        primary = asyncio.ensure_future(self.primary.timed_generate(prompt, temperature))
+        done, _ = await asyncio.wait({primary}, timeout=self.deadline("generate"))
+        if primary in done and primary.exception() is None:
+            return primary.result()
+        
+        self.stats["hedged"] += 1
+        backup = asyncio.ensure_future(self.backup.timed_generate(prompt, temperature))
+        pending = {backup} if primary in done else {primary, backup}
+        error = primary.exception() if primary in done else None
+        
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if task is backup:
+                        self.stats["backup_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    
+    async def stream(self, prompt: str, temperature: float) -> AsyncIterator[str]:
+        """Hedge on time to first chunk, then stream the rest from whichever provider won"""
+        self.stats["requests"] += 1
+        streams = {}
+        
+        def start(provider: LLMProvider):
+            agen = provider.timed_stream(prompt, temperature)
+            task = asyncio.ensure_future(agen.__anext__())
+            streams[task] = (provider, agen)
+            return task
+        
+        primary = start(self.primary)
+        done, _ = await asyncio.wait({primary}, timeout=self.deadline("first_chunk"))
+        pending = {primary}
+        if not done or (primary.exception() is not None
+                        and not isinstance(primary.exception(), StopAsyncIteration)):
+            self.stats["hedged"] += 1
+            pending.add(start(self.backup))
+        
+        winner = None
+        first_text = None
+        error = None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exception = task.exception()
+                if exception is None or isinstance(exception, StopAsyncIteration):
+                    winner = streams[task]
+                    first_text = task.result() if exception is None else None
+                    break
+                error = exception
+        
+        for task in pending:
+            task.cancel()
+        # A generator cannot be closed while its cancelled __anext__ is still unwinding
+        await asyncio.gather(*pending, return_exceptions=True)
+        for provider, agen in streams.values():
+            if winner is None or agen is not winner[1]:
+                await agen.aclose()
+        
+        if winner is None:
+            raise error
+        if winner[0] is self.backup:
+            self.stats["backup_wins"] += 1
+        
+        if first_text is not None:
+            yield first_text
+            async for text in winner[1]:
+                yield text
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "groq": GroqProvider,
+    "fake": FakeProvider
+}
+
+
+def _has_credentials(name: str) -> bool:
+    return {
+        "gemini": bool(Config.GOOGLE_API_KEY),
+        "groq": bool(Config.GROQ_API_KEY)
+    }.get(name, False)
+
+
+def create_provider(name: str, hedge: bool = Config.HEDGE_ENABLED) -> LLMProvider:
+    """Build a provider, hedged with the other cloud provider when its key is configured"""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    provider = PROVIDERS[name]()
+    
+    backup_name = {"gemini": "groq", "groq": "gemini"}.get(name)
+    if hedge and backup_name and _has_credentials(backup_name):
+        return HedgedProvider(provider, PROVIDERS[backup_name]())
+    return provider
@@ -0,0 +1,141 @@
+import threading
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Set
+
+
+class RetrievalScope:
+    """Restriction of a query to some PDFs, an inclusive page range and/or headings"""
+    
+    def __init__(self, pdf_names: Optional[Iterable[str]] = None,
+                 page_range: Optional[Tuple[int, int]] = None,
+                 headings: Optional[Iterable[str]] = None):
+        self.pdf_names = sorted(set(pdf_names)) if pdf_names else None
+        self.page_range = tuple(page_range) if page_range else None
+        self.headings = sorted(set(headings)) if headings else None
+    
+    def is_empty(self) -> bool:
+        return not (self.pdf_names or self.page_range or self.headings)
+    
+    def key(self) -> str:
+        """Stable text form, used to keep cached answers per scope"""
+        if self.is_empty():
+            return ""
+        return f"{self.pdf_names}|{self.page_range}|{self.headings}"
+    
+    def where(self) -> Optional[Dict[str, Any]]:
+        """Chroma where filter; a chunk matches a page range when its pages overlap it"""
+        clauses = []
+        if self.pdf_names:
+            clauses.append({"pdf_name": {"$in": self.pdf_names}})
+        if self.page_range:
+            first, last = self.page_range
+            clauses.append({"page_start": {"$lte": last}})
+            clauses.append({"page_end": {"$gte": first}})
+        if self.headings:
+            clauses.append({"heading": {"$in": self.headings}})
+        
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class MetadataIndex:
+    """In-memory map of chunk metadata used to resolve a scope to chunk IDs without touching Chroma"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.version = None
+    
+    def _reset(self):
+        self.chunks: Dict[str, Tuple[str, int, int, str]] = {}  # chunk_id -> (pdf, page_start, page_end, heading)
+        self.pdf_chunks: Dict[str, Set[str]] = defaultdict(set)
+        self.heading_chunks: Dict[str, Set[str]] = defaultdict(set)
+    
+    def __len__(self) -> int:
+        return len(self.chunks)
+    
+    def rebuild(self, collection, version: Any, batch_size: int = 5000):
+        """Reload from every stored chunk's metadata"""
+        with self._lock:
+            self._reset()
+            total = collection.count()
+            for offset in range(0, total, batch_size):
+                batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+                self._add(batch["ids"], batch["metadatas"])
+            self.version = version
+    
+    def add(self, ids: List[str], metadatas: List[Dict], version: Any = None):
+        with self._lock:
+            self._add(ids, metadatas)
+            if version is not None:
+                self.version = version
+    
+    def delete(self, ids: Iterable[str], version: Any = None):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove(chunk_id)
+            if version is not None:
+                self.version = version
+    
+    def delete_pdf(self, pdf_name: str, version: Any = None):
+        self.delete(list(self.pdf_chunks.get(pdf_name, ())), version)
+    
+    def clear(self, version: Any = None):
+        with self._lock:
+            self._reset()
+            self.version = version
+    
+    def pdf_names(self) -> List[str]:
+        return sorted(self.pdf_chunks)
+    
+    def headings(self, pdf_names: Optional[Iterable[str]] = None) -> List[str]:
+        with self._lock:
+            if pdf_names is None:
+                return sorted(self.heading_chunks)
+            return sorted({
+                self.chunks[chunk_id][3]
+                for name in pdf_names for chunk_id in self.pdf_chunks.get(name, ())
+            })
+    
+    def resolve(self, scope: RetrievalScope) -> Optional[Set[str]]:
+        """Chunk IDs inside the scope, or None when the scope does not restrict anything"""
+        if scope.is_empty():
+            return None
+        with self._lock:
+            candidates = None
+            if scope.pdf_names:
+                candidates = set().union(*(self.pdf_chunks.get(name, set()) for name in scope.pdf_names))
+            if scope.headings:
+                in_headings = set().union(*(self.heading_chunks.get(h, set()) for h in scope.headings))
+                candidates = in_headings if candidates is None else candidates & in_headings
+            if scope.page_range:
+                first, last = scope.page_range
+                pool = candidates if candidates is not None else self.chunks.keys()
+                candidates = {
+                    chunk_id for chunk_id in pool
+                    if self.chunks[chunk_id][1] <= last and self.chunks[chunk_id][2] >= first
+                }
+            return candidates
+    
+    def _add(self, ids: List[str], metadatas: List[Dict]):
+        for chunk_id, meta in zip(ids, metadatas):
+            meta = meta or {}
+            self._remove(chunk_id)
+            page_start = meta.get("page_start", meta.get("page_number", 0))
+            page_end = meta.get("page_end", page_start)
+            entry = (meta.get("pdf_name", ""), page_start, page_end, meta.get("heading", ""))
+            self.chunks[chunk_id] = entry
+            self.pdf_chunks[entry[0]].add(chunk_id)
+            self.heading_chunks[entry[3]].add(chunk_id)
+    
+    def _remove(self, chunk_id: str):
+        entry = self.chunks.pop(chunk_id, None)
+        if entry is None:
+            return
+        for mapping, key in ((self.pdf_chunks, entry[0]), (self.heading_chunks, entry[3])):
+            ids = mapping.get(key)
+            if ids is not None:
+                ids.discard(chunk_id)
+                if not ids:
+                    del mapping[key]
@@ -1,10 +1,26 @@
-import pdfplumber
-import fitz  # PyMuPDF
 import re
-from typing import List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterator, Iterable, Callable, Union, BinaryIO
+from itertools import groupby
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, BrokenExecutor, as_completed
 import hashlib
+import io
+import mmap
+import multiprocessing
+import threading
 from dataclasses import dataclass
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from components.tokens import encode, decode
+from components.tracing import span, detached_trace, current_trace, current_span_id
+
+# A path, the PDF's bytes (bytes, memoryview, mmap) or a binary file object such as an upload
+PDFSource = Union[str, bytes, bytearray, memoryview, mmap.mmap, BinaryIO]
+# What sources are resolved to: a path, bytes (PyMuPDF) or a shared read-only view (pdfplumber)
+ResolvedSource = Union[str, bytes, memoryview]
 
 
 @dataclass
@@ -17,33 +33,343 @@ class DocumentChunk:
     metadata: Dict[str, Any]
 
 
+class _BufferReader(io.RawIOBase):
+    """Read-only, seekable stream over a buffer; reads copy only the requested slice"""
+    
+    def __init__(self, buffer: memoryview):
+        self._buffer = buffer.cast("B") if buffer.format != "B" else buffer
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._buffer)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+    
+    def readinto(self, target) -> int:
+        count = max(0, min(len(target), len(self._buffer) - self._position))
+        target[:count] = self._buffer[self._position:self._position + count]
+        self._position += count
+        return count
+
+
+class _OpenDocuments:
+    """PyMuPDF documents kept open per worker thread, so the page-range tasks a
+    worker runs over one PDF share a single open instead of parsing it again"""
+    
+    def __init__(self, opener: Callable[[ResolvedSource], Any]):
+        self._opener = opener
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._documents: Dict[int, Any] = {}
+    
+    def get(self, source: ResolvedSource):
+        cached = getattr(self._local, "entry", None)
+        if cached is not None and cached[0] is source:
+            return cached[1]
+        if cached is not None:
+            # Tasks arrive PDF by PDF, so a worker never returns to the previous one
+            self._close(cached[1])
+        document = self._opener(source)
+        self._local.entry = (source, document)
+        with self._lock:
+            self._documents[id(document)] = document
+        return document
+    
+    def _close(self, document):
+        with self._lock:
+            self._documents.pop(id(document), None)
+        document.close()
+    
+    def close(self):
+        with self._lock:
+            documents, self._documents = list(self._documents.values()), {}
+        for document in documents:
+            document.close()
+
+
 class PDFProcessor:
-    def __init__(self, max_workers: int = 4):
+    EXECUTION_MODES = ("thread", "process")
+    ENGINES = ("pdfplumber", "pymupdf")
+    
+    def __init__(self, max_workers: int = 4, execution_mode: str = "thread",
+                 pages_per_task: int = Config.PAGES_PER_TASK, engine: str = "pdfplumber",
+                 chunk_size: int = Config.CHUNK_SIZE, chunk_overlap: int = Config.CHUNK_OVERLAP,
+                 max_chunk_tokens: Optional[int] = None):
+        if execution_mode not in self.EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {execution_mode}")
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown extraction engine: {engine}")
+        # Text past the embedding model's input limit is silently truncated, so chunks never exceed it
+        if max_chunk_tokens is None:
+            max_chunk_tokens = int(Config.EMBEDDING_MAX_TOKENS * Config.EMBEDDING_TOKEN_RATIO)
+        if chunk_size > max_chunk_tokens:
+            print(f"chunk_size {chunk_size} exceeds the {max_chunk_tokens} tokens the embedding model reads; "
+                  f"using {max_chunk_tokens}")
+            chunk_overlap = chunk_overlap * max_chunk_tokens // chunk_size
+            chunk_size = max_chunk_tokens
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
         self.max_workers = max_workers
+        self.execution_mode = execution_mode
+        self.pages_per_task = max(1, pages_per_task)
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.heading_font_ratio = Config.HEADING_FONT_RATIO
         self.heading_pattern = re.compile(r'^(?:Chapter\s+\d+|Section\s+\d+|\d+\.\d+\s+|[A-Z][A-Z\s]{2,}|.{0,50}:)$', re.MULTILINE)
     
-    def extract_structure(self, pdf_path: str) -> List[DocumentChunk]:
-        """Extract text with structural information"""
-        chunks = []
-        pdf_name = pdf_path.split("/")[-1].split("\\")[-1]  # Handle both / and \
+    def extract_structure(self, pdf_path: PDFSource, pdf_name: Optional[str] = None) -> List[DocumentChunk]:
+        """Extract text with structural information from a path, bytes, mmap or binary file object"""
+        return self.extract_page_range(pdf_path, 0, None, pdf_name)
+    
+    def extract_page_range(self, pdf_path: PDFSource, start: int = 0,
+                           end: Optional[int] = None, pdf_name: Optional[str] = None) -> List[DocumentChunk]:
+        """Extract chunks from the zero-based page slice [start, end)"""
+        return list(self.iter_chunks(pdf_path, start, end, pdf_name))
+    
+    def iter_chunks(self, pdf_path: PDFSource, start: int = 0,
+                    end: Optional[int] = None, pdf_name: Optional[str] = None) -> Iterator[DocumentChunk]:
+        """Yield chunks as pages are read so only one chunk's worth of pages is held in memory"""
+        pdf_name = pdf_name or self._pdf_name(pdf_path)
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    text = page.extract_text() or ""
-                    if not text.strip():
-                        continue
-                    
-                    headings = self._extract_headings(text)
-                    page_chunks = self._chunk_with_context(
-                        text, pdf_name, page_num, headings
-                    )
-                    chunks.extend(page_chunks)
-                    
+            source = self._as_source(pdf_path)
+            yield from self._chunk_pages(pdf_name, self._iter_page_text(source, start, end))
+        
         except Exception as e:
             print(f"Error processing {pdf_name}: {e}")
-            
-        return chunks
+    
+    def extract_pages(self, pdf_path: PDFSource, start: int = 0, end: Optional[int] = None,
+                      documents: Optional[_OpenDocuments] = None) -> List[Tuple[int, str, List[Dict]]]:
+        """Extract (page_number, text, headings) for the zero-based page slice [start, end)"""
+        try:
+            return list(self._iter_page_text(self._as_source(pdf_path), start, end, documents))
+        except Exception as e:
+            print(f"Error processing {self._pdf_name(pdf_path)}: {e}")
+            return []
+    
+    def extract_pages_traced(self, pdf_path: PDFSource, start: int = 0, end: Optional[int] = None,
+                             documents: Optional[_OpenDocuments] = None
+                             ) -> Tuple[List[Tuple[int, str, List[Dict]]], List[Dict]]:
+        """extract_pages plus the spans it recorded, for workers outside the caller's trace"""
+        with detached_trace("extract_pages") as worker_trace:
+            pages = self.extract_pages(pdf_path, start, end, documents)
+        return pages, worker_trace.spans
+    
+    @staticmethod
+    def _pdf_name(pdf_path: PDFSource) -> str:
+        if not isinstance(pdf_path, str):
+            # Uploaded and opened files carry a name; bare buffers do not
+            pdf_path = getattr(pdf_path, "name", None)
+            if not isinstance(pdf_path, str):
+                return "document.pdf"
+        return pdf_path.split("/")[-1].split("\\")[-1]  # Handle both / and \
+    
+    @classmethod
+    def _pdf_names(cls, pdf_paths: List[PDFSource], names: Optional[List[str]] = None) -> List[str]:
+        """Name of each PDF; chunk IDs derive from it, so in-memory PDFs must not share one"""
+        if names is None:
+            names = [cls._pdf_name(pdf_path) for pdf_path in pdf_paths]
+        elif len(names) != len(pdf_paths):
+            raise ValueError(f"Got {len(names)} names for {len(pdf_paths)} PDFs")
+        
+        # Files sharing a base name are the caller's call (ingest.py keeps the first), but
+        # buffers without a name of their own would silently overwrite each other's chunks
+        sources_by_name = defaultdict(list)
+        for pdf_path, name in zip(pdf_paths, names):
+            sources_by_name[name].append(pdf_path)
+        for name, sources in sources_by_name.items():
+            if len(sources) > 1 and not all(isinstance(source, str) for source in sources):
+                raise ValueError(f"{len(sources)} PDFs are named {name}; pass names= to tell in-memory PDFs apart")
+        return names
+    
+    def _as_source(self, pdf_path: PDFSource) -> ResolvedSource:
+        """A path, or the PDF's bytes in the form the engine opens without copying.
+        
+        Files on disk are opened by name. PyMuPDF (up to 1.24) only keeps a
+        stream without copying it when it is exactly bytes, so in-memory PDFs
+        become one bytes object that every open shares; pdfplumber reads from
+        a shared view instead.
+        """
+        if isinstance(pdf_path, str):
+            return pdf_path
+        name = getattr(pdf_path, "name", None)
+        if hasattr(pdf_path, "fileno") and isinstance(name, str) and os.path.isfile(name):
+            return name
+        if self.engine == "pymupdf":
+            if type(pdf_path) is bytes:
+                return pdf_path
+            if isinstance(pdf_path, memoryview) and type(pdf_path.obj) is bytes and pdf_path.nbytes == len(pdf_path.obj):
+                return pdf_path.obj
+            if hasattr(pdf_path, "getvalue"):  # BytesIO (Streamlit's UploadedFile) shares its bytes
+                return pdf_path.getvalue()
+            if isinstance(pdf_path, (bytearray, memoryview, mmap.mmap)):
+                return bytes(pdf_path)  # The one copy, shared by every page range
+        else:
+            if isinstance(pdf_path, memoryview):
+                return pdf_path
+            if isinstance(pdf_path, (bytes, bytearray, mmap.mmap)):
+                return memoryview(pdf_path)
+            if hasattr(pdf_path, "getbuffer"):
+                return pdf_path.getbuffer()
+        try:
+            # A file object without a path: map it instead of reading it into memory
+            view = memoryview(mmap.mmap(pdf_path.fileno(), 0, access=mmap.ACCESS_READ))
+            return bytes(view) if self.engine == "pymupdf" else view
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            pdf_path.seek(0)
+            return pdf_path.read()
+    
+    @staticmethod
+    def _open_fitz(source: ResolvedSource):
+        import fitz  # PyMuPDF
+        if isinstance(source, str):
+            return fitz.open(source)
+        return fitz.open(stream=source, filetype="pdf")
+    
+    @staticmethod
+    def _open_pdfplumber(source: ResolvedSource):
+        import pdfplumber
+        if isinstance(source, str):
+            return pdfplumber.open(source)
+        # Each open gets its own position over the shared buffer, so threads never share a cursor
+        return pdfplumber.open(io.BufferedReader(_BufferReader(memoryview(source))))
+    
+    def count_pages(self, pdf_path: PDFSource) -> int:
+        """Return the page count without extracting any text"""
+        # PDF libraries are imported on first use to keep app startup fast
+        source = self._as_source(pdf_path)
+        if self.engine == "pymupdf":
+            with self._open_fitz(source) as doc:
+                return doc.page_count
+        with self._open_pdfplumber(source) as pdf:
+            return len(pdf.pages)
+    
+    def _iter_page_text(self, pdf_path: ResolvedSource, start: int, end: Optional[int],
+                        documents: Optional[_OpenDocuments] = None) -> Iterator[Tuple[int, str, List[Dict]]]:
+        """Yield (page_number, text, headings) for every non-empty page in [start, end)"""
+        if self.engine == "pymupdf":
+            yield from self._iter_pymupdf_pages(pdf_path, start, end, documents)
+        else:
+            yield from self._iter_pdfplumber_pages(pdf_path, start, end)
+    
+    def _iter_pdfplumber_pages(self, pdf_path: ResolvedSource, start: int,
+                               end: Optional[int]) -> Iterator[Tuple[int, str, List[Dict]]]:
+        with span("pdf_open", engine="pdfplumber"):
+            pdf = self._open_pdfplumber(pdf_path)
+        with pdf:
+            for page_num, page in enumerate(pdf.pages[start:end], start + 1):
+                with span("extract_page", page=page_num):
+                    text = self._pdfplumber_text(page)
+                    headings = self._extract_headings(text) if text.strip() else []
+                if not text.strip():
+                    continue
+                yield page_num, text, headings
+    
+    @staticmethod
+    def _pdfplumber_text(page) -> str:
+        """Page text; the parsed page objects are released so memory stays flat across the document"""
+        try:
+            return page.extract_text() or ""
+        finally:
+            # pdfplumber otherwise keeps every parsed page cached on the open PDF
+            if hasattr(page, "close"):
+                page.close()
+            else:
+                # Before 0.11 (no Page.close): the layout and the memoized text map both hold the page's characters
+                page.flush_cache()
+                page.get_textmap.cache_clear()
+    
+    def _iter_pymupdf_pages(self, pdf_path: ResolvedSource, start: int, end: Optional[int],
+                            documents: Optional[_OpenDocuments] = None) -> Iterator[Tuple[int, str, List[Dict]]]:
+        doc = None
+        fallback = None  # pdfplumber is only opened if PyMuPDF yields an empty page
+        
+        try:
+            with span("pdf_open", engine="pymupdf"):
+                # Documents shared across tasks are closed by their owner, not here
+                doc = documents.get(pdf_path) if documents is not None else self._open_fitz(pdf_path)
+            stop = doc.page_count if end is None else min(end, doc.page_count)
+            for index in range(start, stop):
+                # Spans must close before the yield, which hands control to the caller
+                with span("extract_page", page=index + 1):
+                    text, headings = self._extract_pymupdf_page(doc[index])
+                    
+                    if not text.strip():
+                        if fallback is None:
+                            fallback = self._open_pdfplumber(pdf_path)
+                        text = self._pdfplumber_text(fallback.pages[index])
+                        headings = self._extract_headings(text) if text.strip() else []
+                
+                if not text.strip():
+                    continue
+                yield index + 1, text, headings
+        finally:
+            if documents is None and doc is not None:
+                doc.close()
+            if fallback is not None:
+                fallback.close()
+    
+    def _extract_pymupdf_page(self, page) -> Tuple[str, List[Dict]]:
+        """Rebuild page text from PyMuPDF blocks, detecting headings by font size and weight"""
+        lines = []
+        size_weights = Counter()
+        
+        for block_no, block in enumerate(page.get_text("dict")["blocks"]):
+            if block.get("type") != 0:  # image block
+                continue
+            for line in block["lines"]:
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                text = "".join(span["text"] for span in line["spans"]).strip()
+                if not spans or not text:
+                    continue
+                size = round(max(span["size"] for span in spans), 1)
+                bold = all(span["flags"] & 16 or "bold" in span["font"].lower() for span in spans)
+                size_weights[size] += len(text)
+                lines.append((block_no, text, size, bold))
+        
+        if not lines:
+            return "", []
+        
+        body_size = size_weights.most_common(1)[0][0]
+        
+        # Group consecutive lines of the same block and kind into paragraphs
+        groups = []
+        for block_no, text, size, bold in lines:
+            is_heading = self._is_font_heading(text, size, bold, body_size)
+            if groups and groups[-1][0] == block_no and groups[-1][1] == is_heading:
+                groups[-1][2].append(text)
+            else:
+                groups.append((block_no, is_heading, [text]))
+        
+        paragraphs = []
+        headings = []
+        for _, is_heading, texts in groups:
+            if is_heading:
+                heading = " ".join(texts)
+                headings.append({"text": heading, "line_number": len(paragraphs)})
+                paragraphs.append(heading)
+            else:
+                paragraphs.append("\n".join(texts))
+        
+        return "\n\n".join(paragraphs), headings
+    
+    def _is_font_heading(self, text: str, size: float, bold: bool, body_size: float) -> bool:
+        """Headings are short lines set larger than body text, or bold at body size"""
+        if len(text) >= 100:
+            return False
+        if size >= body_size * self.heading_font_ratio:
+            return True
+        return bold and size >= body_size and len(text.split()) <= 12 and not text.endswith(".")
     
     def _extract_headings(self, text: str) -> List[Dict]:
         """Extract potential headings from text"""
@@ -59,54 +385,302 @@ class PDFProcessor:
                 })
         return headings
     
-    def _chunk_with_context(self, text: str, pdf_name: str, page_num: int, 
-                           headings: List[Dict]) -> List[DocumentChunk]:
-        """Create intelligent chunks with metadata"""
-        chunks = []
+    def _chunk_pages(self, pdf_name: str,
+                     pages: Iterable[Tuple[int, str, List[Dict]]]) -> Iterator[DocumentChunk]:
+        """Pack paragraphs into chunks of up to chunk_size tokens, carrying headings across pages"""
         current_heading = "Introduction/General"
+        buffer = []  # (text, token_count, page_number) of paragraphs in the open chunk
+        buffer_tokens = 0
+        positions = Counter()  # chunks started per page, for stable chunk IDs
         
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        def emit():
+            text = "\n\n".join(para for para, _, _ in buffer)
+            page_start, page_end = buffer[0][2], buffer[-1][2]
+            position = positions[page_start]
+            positions[page_start] += 1
+            return self._make_chunk(text, pdf_name, page_start, page_end, current_heading,
+                                    position, buffer_tokens)
         
-        for i, para in enumerate(paragraphs):
-            if any(h["text"] == para for h in headings):
-                current_heading = para
-                continue
+        for page_num, text, headings in pages:
+            heading_texts = {h["text"] for h in headings}
+            ready = []  # chunks completed on this page, yielded once the page is done
+            
+            with span("chunking", page=page_num):
+                for para, is_heading in self._paragraphs(text, heading_texts):
+                    if is_heading:
+                        # A new section always starts a new chunk, without overlap
+                        if buffer:
+                            ready.append(emit())
+                        buffer, buffer_tokens = [], 0
+                        current_heading = para
+                        continue
+                    
+                    tokens = encode(para)
+                    if len(tokens) > self.chunk_size:
+                        if buffer:
+                            ready.append(emit())
+                        buffer, buffer_tokens = [], 0
+                        for piece, piece_tokens in self._split_tokens(tokens):
+                            buffer, buffer_tokens = [(piece, piece_tokens, page_num)], piece_tokens
+                            ready.append(emit())
+                        buffer, buffer_tokens = self._overlap_tail(buffer)
+                        continue
+                    
+                    if buffer and buffer_tokens + len(tokens) > self.chunk_size:
+                        ready.append(emit())
+                        buffer, buffer_tokens = self._overlap_tail(buffer)
+                        if buffer_tokens + len(tokens) > self.chunk_size:
+                            buffer, buffer_tokens = [], 0
+                    
+                    buffer.append((para, len(tokens), page_num))
+                    buffer_tokens += len(tokens)
             
-            content_hash = hashlib.md5(f"{pdf_name}{page_num}{i}{para[:50]}".encode()).hexdigest()[:12]
+            yield from ready
+        
+        if buffer:
+            yield emit()
+    
+    @staticmethod
+    def _paragraphs(text: str, heading_texts: Set[str]) -> Iterator[Tuple[str, bool]]:
+        """Yield (paragraph, is_heading); a heading line splits the paragraph it sits in.
+        
+        PyMuPDF text separates paragraphs with blank lines and its (possibly
+        wrapped) headings are whole paragraphs, while pdfplumber text has no
+        blank lines at all, so its headings only show up as single lines.
+        """
+        for para in (p.strip() for p in text.split('\n\n')):
+            if not para:
+                continue
+            if para in heading_texts:
+                yield para, True
+                continue
             
-            chunk = DocumentChunk(
-                text=para,
-                pdf_name=pdf_name,
-                page_number=page_num,
-                heading=current_heading,
-                chunk_id=content_hash,
-                metadata={
-                    "char_count": len(para),
-                    "word_count": len(para.split()),
-                    "position": i
-                }
-            )
-            chunks.append(chunk)
-        
-        return chunks
-    
-    def process_multiple_pdfs(self, pdf_paths: List[str]) -> List[DocumentChunk]:
-        """Process multiple PDFs using ThreadPoolExecutor"""
+            lines = []
+            for line in para.split('\n'):
+                if line.strip() not in heading_texts:
+                    lines.append(line)
+                    continue
+                body = "\n".join(lines).strip()
+                if body:
+                    yield body, False
+                lines = []
+                yield line.strip(), True
+            body = "\n".join(lines).strip()
+            if body:
+                yield body, False
+    
+    def _split_tokens(self, tokens: List[int]) -> Iterator[Tuple[str, int]]:
+        """Cut an oversized paragraph into overlapping windows of chunk_size tokens"""
+        step = self.chunk_size - self.chunk_overlap
+        for start in range(0, len(tokens), step):
+            window = tokens[start:start + self.chunk_size]
+            yield decode(window), len(window)
+            if start + self.chunk_size >= len(tokens):
+                break
+    
+    def _overlap_tail(self, buffer: List[Tuple[str, int, int]]) -> Tuple[List[Tuple[str, int, int]], int]:
+        """Trailing paragraphs of an emitted chunk that fit in chunk_overlap tokens"""
+        tail = []
+        tail_tokens = 0
+        for para, token_count, page_num in reversed(buffer):
+            if tail_tokens + token_count <= self.chunk_overlap:
+                tail.insert(0, (para, token_count, page_num))
+                tail_tokens += token_count
+                continue
+            if not tail and self.chunk_overlap:
+                # The last paragraph alone exceeds the overlap: keep its final tokens
+                tokens = encode(para)[-self.chunk_overlap:]
+                tail, tail_tokens = [(decode(tokens), len(tokens), page_num)], len(tokens)
+            break
+        return tail, tail_tokens
+    
+    def _make_chunk(self, text: str, pdf_name: str, page_start: int, page_end: int,
+                    heading: str, position: int, token_count: int) -> DocumentChunk:
+        content_hash = hashlib.md5(f"{pdf_name}{page_start}{position}{text[:50]}".encode()).hexdigest()[:12]
+        
+        return DocumentChunk(
+            text=text,
+            pdf_name=pdf_name,
+            page_number=page_start,
+            heading=heading,
+            chunk_id=content_hash,
+            metadata={
+                "page_start": page_start,
+                "page_end": page_end,
+                "token_count": token_count,
+                "char_count": len(text),
+                "word_count": len(text.split()),
+                "position": position
+            }
+        )
+    
+    def process_multiple_pdfs(self, pdf_paths: List[PDFSource],
+                              names: Optional[List[str]] = None) -> List[DocumentChunk]:
+        """Process multiple PDFs using the configured execution mode"""
+        if self.execution_mode == "process":
+            return list(self.iter_multiple_pdfs(pdf_paths, names=names))
+        
         all_chunks = []
+        names = self._pdf_names(pdf_paths, names)
         
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_pdf = {
-                executor.submit(self.extract_structure, path): path 
-                for path in pdf_paths
+            future_to_name = {
+                executor.submit(self.extract_structure, path, name): name 
+                for path, name in zip(pdf_paths, names)
             }
             
-            for future in as_completed(future_to_pdf):
-                pdf_path = future_to_pdf[future]
+            for future in as_completed(future_to_name):
+                pdf_name = future_to_name[future]
                 try:
                     chunks = future.result()
                     all_chunks.extend(chunks)
-                    print(f"Processed {pdf_path}: {len(chunks)} chunks")
+                    print(f"Processed {pdf_name}: {len(chunks)} chunks")
                 except Exception as e:
-                    print(f"Error with {pdf_path}: {e}")
+                    print(f"Error with {pdf_name}: {e}")
+        
+        return all_chunks
+    
+    def iter_multiple_pdfs(self, pdf_paths: List[PDFSource],
+                           page_callback: Optional[Callable[[PDFSource, int], None]] = None,
+                           names: Optional[List[str]] = None) -> Iterator[DocumentChunk]:
+        """Stream chunks of several PDFs; pages are extracted in parallel and chunked in order.
+        
+        page_callback(pdf_path, page_number) fires as each extracted page reaches
+        the chunker; pages without text are never reported. In-memory sources
+        are shared with the workers, so they always run in threads, where each
+        worker keeps its PyMuPDF document open across page ranges. names
+        overrides the PDF names, and is needed for buffers without a name.
+        """
+        names = self._pdf_names(pdf_paths, names)
+        # Resolve each source to a path or one shared buffer up front; file objects can only be read once
+        sources = [self._as_source(pdf_path) for pdf_path in pdf_paths]
+        in_memory = any(not isinstance(source, str) for source in sources)
+        use_processes = self.execution_mode == "process" and not in_memory
+        reuse_documents = self.engine == "pymupdf" and not use_processes
+        documents = _OpenDocuments(self._open_fitz) if reuse_documents else None
+        
+        try:
+            pages = self._iter_extracted_pages(use_processes, sources, documents)
+            for index, pdf_pages in groupby(pages, key=lambda item: item[0]):
+                pdf_path = pdf_paths[index]
+                doc_pages = (page for _, page in pdf_pages)
+                if page_callback:
+                    doc_pages = self._report_pages(pdf_path, doc_pages, page_callback)
+                # Chunking runs here, in page order, so chunks may span range boundaries
+                yield from self._chunk_pages(names[index], doc_pages)
+                print(f"Processed {names[index]}")
+        finally:
+            if documents is not None:
+                documents.close()
+    
+    @staticmethod
+    def _report_pages(pdf_path: PDFSource, pages: Iterable[Tuple[int, str, List[Dict]]],
+                      callback: Callable[[PDFSource, int], None]) -> Iterator[Tuple[int, str, List[Dict]]]:
+        for page in pages:
+            callback(pdf_path, page[0])
+            yield page
+    
+    def _new_executor(self, use_processes: bool):
+        if use_processes:
+            # Spawned workers start clean instead of inheriting locks held by the app's other threads
+            return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+    
+    def _iter_extracted_pages(self, use_processes: bool, sources: List[ResolvedSource],
+                              documents: Optional[_OpenDocuments] = None
+                              ) -> Iterator[Tuple[int, Tuple[int, str, List[Dict]]]]:
+        """Yield (source index, page) in page order from a bounded window of page-range tasks.
+        
+        If a worker process dies (e.g. killed for running out of memory), the
+        PDF that killed it is dropped and the remaining ranges of the other
+        PDFs run on a fresh pool.
+        """
+        max_in_flight = self.max_workers * 2
+        
+        # Futures are drained in submission order (PDF, then page range), so
+        # pages come out in serial order; capping the number of in-flight
+        # ranges bounds memory regardless of corpus size.
+        # Workers run outside this trace, so they hand their spans back with the pages
+        extract = self.extract_pages_traced if current_trace() is not None else self.extract_pages
+        executor = self._new_executor(use_processes)
+        pending = deque()  # (source index, start, end, future)
+        failed = set()
+        
+        def submit(index: int, start: int, end: int) -> Future:
+            try:
+                return executor.submit(extract, sources[index], start, end, documents)
+            except BrokenExecutor as e:
+                future = Future()
+                future.set_exception(e)
+                return future
+        
+        def isolate(lost: List[Tuple[int, int, int]]) -> None:
+            # The dead worker could have been running any range in flight, so
+            # each one runs again on its own; only a range that kills a worker
+            # by itself fails its PDF
+            nonlocal executor
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = self._new_executor(use_processes)
+            for index, start, end in lost:
+                if index in failed:
+                    continue
+                future = submit(index, start, end)
+                if isinstance(future.exception(), BrokenExecutor):
+                    print(f"Error with PDF #{index + 1}: a worker process died on pages {start + 1}-{end}; skipping this PDF")
+                    failed.add(index)
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = self._new_executor(use_processes)
+                    continue
+                pending.append((index, start, end, future))
+        
+        def drain() -> Iterator[Tuple[int, Tuple[int, str, List[Dict]]]]:
+            index, start, end, future = pending.popleft()
+            if index in failed:
+                return
+            try:
+                pages = future.result()
+            except BrokenExecutor:
+                lost = [(index, start, end)] + [(other, s, e) for other, s, e, _ in pending]
+                pending.clear()
+                isolate(lost)
+                return
+            except Exception as e:
+                print(f"Error with PDF #{index + 1}: {e}")
+                pages = []
+            yield from self._range_pages(index, pages)
         
-        return all_chunks
\ No newline at end of file
+        try:
+            # Sources are keyed by position: buffers compare by content, not identity
+            for index, source in enumerate(sources):
+                for start, end in self._split_page_ranges(source):
+                    if index in failed:
+                        break
+                    pending.append((index, start, end, submit(index, start, end)))
+                    while len(pending) >= max_in_flight:
+                        yield from drain()
+            
+            while pending:
+                yield from drain()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    @staticmethod
+    def _range_pages(index: int, pages) -> Iterator[Tuple[int, Tuple[int, str, List[Dict]]]]:
+        if isinstance(pages, tuple):
+            pages, spans = pages
+            if current_trace() is not None:
+                current_trace().merge(spans, current_span_id())
+        for page in pages:
+            yield index, page
+    
+    def _split_page_ranges(self, pdf_path: PDFSource) -> List[Tuple[int, int]]:
+        """Split a PDF into contiguous page ranges of at most pages_per_task pages"""
+        try:
+            page_count = self.count_pages(pdf_path)
+        except Exception as e:
+            print(f"Error opening {self._pdf_name(pdf_path)}: {e}")
+            return []
+        return [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
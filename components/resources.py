@@ -0,0 +1,87 @@
+import threading
+from typing import Any, Callable, Dict
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Heavy components are imported inside the getters, so importing this module
+# (and the app) does not pull in chromadb, onnxruntime or the LLM SDKs.
+
+_instances: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _shared(key: str, factory: Callable[[], Any]) -> Any:
+    """Build one instance per process on first use; concurrent first callers wait for it"""
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+    
+    # One lock per resource, so a slow build (e.g. the vector store) does not block others
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _instances:
+            _instances[key] = factory()
+        return _instances[key]
+
+
+def get_embedding_function():
+    """Chroma's default ONNX embedding model, shared by every VectorStore in the process"""
+    def build():
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        return DefaultEmbeddingFunction()
+    return _shared("embedding_function", build)
+
+
+def get_vector_store():
+    def build():
+        from components.vector_store import VectorStore
+        return VectorStore()
+    return _shared("vector_store", build)
+
+
+def get_response_cache():
+    def build():
+        from components.cache import ResponseCache
+        return ResponseCache()
+    return _shared("response_cache", build)
+
+
+def get_llm_handler(provider: str = "gemini"):
+    """One handler (and provider client) per provider; handlers hold no per-session state"""
+    def build():
+        from components.llm_handler import LLMHandler
+        return LLMHandler(provider=provider, response_cache=get_response_cache())
+    return _shared(f"llm_handler:{provider}", build)
+
+
+def get_query_cache():
+    def build():
+        from components.cache import SemanticQueryCache
+        return SemanticQueryCache()
+    return _shared("query_cache", build)
+
+
+def get_context_builder():
+    def build():
+        from components.context_builder import ContextBuilder
+        return ContextBuilder()
+    return _shared("context_builder", build)
+
+
+def get_ingestion_worker():
+    """The background ingestion worker, started on first use and fed from the shared job table"""
+    def build():
+        from components.jobs import JobStore, IngestionWorker
+        worker = IngestionWorker(JobStore(), get_vector_store())
+        worker.start()
+        return worker
+    return _shared("ingestion_worker", build)
+
+
+def loaded() -> Dict[str, str]:
+    """Names and types of the resources built so far, for diagnostics"""
+    return {key: type(instance).__name__ for key, instance in _instances.items()}
@@ -0,0 +1,26 @@
+from functools import lru_cache
+from typing import List
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = Config.TOKEN_ENCODING):
+    """Load a tiktoken encoding once per process"""
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+
+def encode(text: str) -> List[int]:
+    return get_encoding().encode(text, disallowed_special=())
+
+
+def decode(tokens: List[int]) -> str:
+    return get_encoding().decode(tokens)
+
+
+def count_tokens(text: str) -> int:
+    return len(encode(text))
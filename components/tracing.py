@@ -0,0 +1,146 @@
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+_recent_traces = deque(maxlen=Config.TRACE_HISTORY)
+
+
+class Trace:
+    """Spans recorded for one query or ingestion run; safe to append to from several threads"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.spans: List[Dict[str, Any]] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+    
+    def record(self, span: Dict[str, Any]):
+        with self._lock:
+            self.spans.append(span)
+    
+    def merge(self, spans: Iterable[Dict[str, Any]], parent: Optional[int] = None):
+        """Adopt spans recorded elsewhere (e.g. a worker process), renumbering their IDs"""
+        spans = list(spans)
+        mapping = {span["id"]: self.next_id() for span in spans}
+        for span in spans:
+            self.record(dict(span, id=mapping[span["id"]], parent=mapping.get(span["parent"], parent)))
+    
+    def stage_totals(self) -> Dict[str, float]:
+        """Total milliseconds spent per span name"""
+        totals = defaultdict(float)
+        for span in self.spans:
+            totals[span["name"]] += span["duration_ms"]
+        return {name: round(value, 3) for name, value in totals.items()}
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "name": self.name, "spans": list(self.spans)}
+
+
+@contextmanager
+def trace(name: str) -> Iterator[Trace]:
+    """Start a new trace for the current context, with a root span of the same name"""
+    current = Trace(name)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(None)
+    try:
+        with span(name):
+            yield current
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _recent_traces.append(current)
+
+
+@contextmanager
+def detached_trace(name: str) -> Iterator[Trace]:
+    """Collect spans without a root span or a place in recent_traces, e.g. inside a worker"""
+    current = Trace(name)
+    trace_token = _current_trace.set(current)
+    span_token = _current_span.set(None)
+    try:
+        yield current
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the enclosing span; a no-op outside a trace.
+    
+    Do not hold a span open across a generator's yield: the caller would run
+    inside it and its own spans would nest under it.
+    """
+    current = _current_trace.get()
+    if current is None:
+        yield
+        return
+    
+    span_id = current.next_id()
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        _current_span.reset(token)
+        current.record({
+            "id": span_id,
+            "parent": parent,
+            "name": name,
+            "start": started_at,
+            "duration_ms": round(duration_ms, 3),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "attrs": attrs
+        })
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_span_id() -> Optional[int]:
+    return _current_span.get()
+
+
+def recent_traces() -> List[Trace]:
+    """Traces finished in this process, newest last"""
+    return list(_recent_traces)
+
+
+def to_chrome_trace(traces: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert trace dicts to the Chrome trace event format (chrome://tracing, Perfetto)"""
+    events = []
+    for trace_dict in traces:
+        for span_dict in trace_dict["spans"]:
+            events.append({
+                "name": span_dict["name"],
+                "cat": trace_dict["name"],
+                "ph": "X",
+                "ts": span_dict["start"] * 1e6,
+                "dur": span_dict["duration_ms"] * 1000,
+                "pid": span_dict["pid"],
+                "tid": span_dict["tid"],
+                "args": dict(span_dict["attrs"], trace_id=trace_dict["trace_id"])
+            })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
@@ -0,0 +1,1058 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Set
+import numpy as np
+import sys
+
+try:
+    import fcntl  # serializes writers across processes; not available on Windows
+except ImportError:
+    fcntl = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+COLLECTION_NAME = "pdf_documents"
+_WHERE_CACHE_SIZE = 32  # filter masks kept per segment; scoped queries tend to repeat
+
+
+class VectorBackend(ABC):
+    """Storage and nearest-neighbour search behind VectorStore.
+    
+    The interface is the subset of a Chroma collection that VectorStore uses,
+    with the same argument names, where filters and result shapes, so
+    backends are interchangeable.
+    """
+    
+    name = COLLECTION_NAME
+    
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+            metadatas: List[Dict[str, Any]]):
+        """Store new records; IDs that already exist are left unchanged"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict[str, List]:
+        raise NotImplementedError
+    
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        raise NotImplementedError
+    
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict] = None, include: Optional[List[str]] = None) -> Dict[str, List]:
+        """Nearest records by cosine distance, one row of results per query embedding"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+    
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class ChromaBackend(VectorBackend):
+    """Chroma's persistent HNSW index (approximate search)"""
+    
+    def __init__(self, path: str = Config.CHROMA_PERSIST_DIR, embedding_function=None):
+        # chromadb is imported here rather than at module load: it is slow to import
+        import chromadb
+        from chromadb.config import Settings
+        
+        self.client = chromadb.PersistentClient(
+            path=path,
+            settings=Settings(anonymized_telemetry=False)
+        )
+        self.embedding_function = embedding_function
+        self.collection = self._get_or_create_collection()
+    
+    def _get_or_create_collection(self):
+        return self.client.get_or_create_collection(
+            name=self.name,
+            embedding_function=self.embedding_function,
+            metadata={"hnsw:space": "cosine"}
+        )
+    
+    def count(self) -> int:
+        return self.collection.count()
+    
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        return self.collection.get(ids=ids, where=where, include=include or ["metadatas", "documents"],
+                                   limit=limit, offset=offset)
+    
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+    
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where,
+                                     include=include or ["metadatas", "documents", "distances"])
+    
+    def clear(self):
+        try:
+            self.client.delete_collection(self.name)
+        except Exception:
+            pass
+        self.collection = self._get_or_create_collection()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "chroma"}
+
+
+class _ResidentBlocks:
+    """Dequantized float32 search blocks kept in RAM, shared by every NumPy index in the process.
+    
+    Blocks are admitted until the byte budget is full and stay until their
+    segment is retired: every query scans all blocks, so evicting the least
+    recently used would turn each scan into misses once the index outgrows
+    the budget. Blocks beyond the budget are converted on every query.
+    """
+    
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self._blocks: Dict[Tuple[str, int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, segment: "_Segment", start: int, end: int) -> Optional[np.ndarray]:
+        """The block's float32 rows, converting and keeping them if they fit; None if they do not"""
+        key = (segment.base, start, end)
+        block = self._blocks.get(key)
+        if block is not None:
+            return block
+        size = (end - start) * segment.vectors.shape[1] * 4
+        with self._lock:
+            if self.used_bytes + size > self.budget_bytes:
+                return None
+            self.used_bytes += size  # reserved, so concurrent queries cannot overshoot the budget
+        block = segment.dequantize(start, end)
+        with self._lock:
+            if key in self._blocks:
+                self.used_bytes -= size
+                return self._blocks[key]
+            self._blocks[key] = block
+        return block
+    
+    def release(self, base: str):
+        """Drop a retired segment's blocks"""
+        with self._lock:
+            for key in [key for key in self._blocks if key[0] == base]:
+                self.used_bytes -= self._blocks.pop(key).nbytes
+    
+    def bytes_for(self, bases: Set[str]) -> int:
+        with self._lock:
+            return sum(block.nbytes for key, block in self._blocks.items() if key[0] in bases)
+
+
+_RESIDENT_BLOCKS = _ResidentBlocks(Config.NUMPY_RESIDENT_MB * 1024 * 1024)
+
+
+class _Segment:
+    """One append-only batch of rows: a vector matrix plus a metadata and a document sidecar"""
+    
+    def __init__(self, directory: str, name: str, dtype: str):
+        self.name = name
+        self.base = os.path.join(directory, name)
+        # Vectors stay on disk; the OS pages in what the matrix products touch
+        self.vectors = np.load(f"{self.base}.vectors.npy", mmap_mode="r")
+        self.scales = np.load(f"{self.base}.scales.npy") if dtype == "int8" else None
+        self.ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(f"{self.base}.meta.jsonl", "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.ids.append(entry["id"])
+                self.metadatas.append(entry["metadata"])
+        # Documents are only read for returned rows, located by line offset
+        offsets = [0]
+        with open(f"{self.base}.docs.jsonl", "rb") as f:
+            for line in f:
+                offsets.append(offsets[-1] + len(line))
+        self.doc_offsets = offsets[:-1]
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self._where_masks: OrderedDict = OrderedDict()
+    
+    def matches(self, where: Dict[str, Any]) -> np.ndarray:
+        """Rows whose metadata satisfies a where filter, ignoring tombstones"""
+        # A segment's rows never change, so the mask for a filter can be reused
+        key = json.dumps(where, sort_keys=True)
+        mask = self._where_masks.get(key)
+        if mask is None:
+            mask = np.fromiter((_matches(where, meta) for meta in self.metadatas), dtype=bool, count=len(self))
+            self._where_masks[key] = mask
+            if len(self._where_masks) > _WHERE_CACHE_SIZE:
+                self._where_masks.popitem(last=False)
+        else:
+            self._where_masks.move_to_end(key)
+        return mask
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def documents(self, rows: List[int]) -> List[str]:
+        documents = []
+        with open(f"{self.base}.docs.jsonl", "rb") as f:
+            for row in rows:
+                f.seek(self.doc_offsets[row])
+                documents.append(json.loads(f.readline()))
+        return documents
+    
+    def embeddings(self, rows: List[int]) -> np.ndarray:
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None] / 127.0
+        return vectors
+    
+    def dequantize(self, start: int, end: int) -> np.ndarray:
+        """Rows [start, end) as float32 unit vectors"""
+        block = np.asarray(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block *= (self.scales[start:end] / 127.0)[:, None]
+        return block
+    
+    def scores(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Cosine similarity of normalized queries to rows [start, end)"""
+        resident = _RESIDENT_BLOCKS.get(self, start, end)
+        if resident is not None:
+            return queries @ resident.T
+        # Over the RAM budget: convert from the memory map, scaling the scores rather than the block
+        block = np.asarray(self.vectors[start:end], dtype=np.float32)
+        scores = queries @ block.T
+        if self.scales is not None:
+            scores *= self.scales[start:end] / 127.0
+        return scores
+    
+    @staticmethod
+    def write(directory: str, name: str, dtype: str, ids: List[str], vectors: np.ndarray,
+              documents: List[str], metadatas: List[Dict[str, Any]]):
+        base = os.path.join(directory, name)
+        if dtype == "int8":
+            # Symmetric per-row quantization of the unit vectors
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12).astype(np.float32)
+            np.save(f"{base}.scales.npy", scales)
+            vectors = np.round(vectors / scales[:, None] * 127.0).astype(np.int8)
+        else:
+            vectors = vectors.astype(np.float16)
+        np.save(f"{base}.vectors.npy", vectors)
+        with open(f"{base}.meta.jsonl", "w", encoding="utf-8") as f:
+            f.write("".join(
+                json.dumps({"id": chunk_id, "metadata": meta}, ensure_ascii=False) + "\n"
+                for chunk_id, meta in zip(ids, metadatas)
+            ))
+        with open(f"{base}.docs.jsonl", "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(doc, ensure_ascii=False) + "\n" for doc in documents))
+    
+    @staticmethod
+    def merge(directory: str, name: str, dtype: str, segments: List["_Segment"]) -> bool:
+        """Write the live rows of segments as one new segment; False if none are live.
+        
+        Rows are copied as stored (no re-quantization) and documents as raw lines,
+        so memory use does not grow with the corpus.
+        """
+        live = [(segment, np.flatnonzero(segment.alive)) for segment in segments]
+        total = sum(len(rows) for _, rows in live)
+        if not total:
+            return False
+        
+        base = os.path.join(directory, name)
+        dim = segments[0].vectors.shape[1]
+        vectors = np.lib.format.open_memmap(f"{base}.vectors.npy", mode="w+",
+                                            dtype=segments[0].vectors.dtype, shape=(total, dim))
+        position = 0
+        for segment, rows in live:
+            vectors[position:position + len(rows)] = segment.vectors[rows]
+            position += len(rows)
+        vectors.flush()
+        del vectors
+        if dtype == "int8":
+            np.save(f"{base}.scales.npy", np.concatenate([segment.scales[rows] for segment, rows in live]))
+        
+        with open(f"{base}.meta.jsonl", "w", encoding="utf-8") as meta_out, \
+                open(f"{base}.docs.jsonl", "wb") as docs_out:
+            for segment, rows in live:
+                with open(f"{segment.base}.docs.jsonl", "rb") as docs_in:
+                    for row in rows:
+                        meta_out.write(json.dumps(
+                            {"id": segment.ids[row], "metadata": segment.metadatas[row]}, ensure_ascii=False
+                        ) + "\n")
+                        docs_in.seek(segment.doc_offsets[row])
+                        docs_out.write(docs_in.readline())
+        return True
+    
+    def remove_files(self):
+        _RESIDENT_BLOCKS.release(self.base)
+        for suffix in (".vectors.npy", ".scales.npy", ".meta.jsonl", ".docs.jsonl"):
+            try:
+                os.remove(self.base + suffix)
+            except OSError:
+                pass
+
+
+class NumpyBackend(VectorBackend):
+    """Exact cosine search over memory-mapped float16 or int8 matrices.
+    
+    Search blocks are kept in RAM as float32 up to Config.NUMPY_RESIDENT_MB
+    (shared by all NumPy indexes in the process); the rest is converted from
+    the memory map on every query, several times slower.
+    
+    Every write appends a segment; deletes and overwritten IDs become
+    tombstones in manifest.json, which is replaced atomically and lists the
+    live segments. Segments are compacted into one once tombstones pass
+    Config.NUMPY_COMPACT_RATIO, and merged pairwise beyond
+    Config.NUMPY_MAX_SEGMENTS. Other instances sharing the directory pick up
+    changes when the manifest changes, as with the BM25 journal.
+    """
+    
+    DTYPES = ("float16", "int8")
+    
+    def __init__(self, directory: str = Config.NUMPY_INDEX_DIR, dtype: str = Config.NUMPY_INDEX_DTYPE,
+                 block_rows: int = Config.NUMPY_SEARCH_BLOCK):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unknown vector dtype: {dtype}")
+        self.directory = directory
+        self.dtype = dtype
+        self.block_rows = max(1, block_rows)
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self._locations: Dict[str, Tuple[_Segment, int]] = {}  # live id -> (segment, row)
+        self._manifest_version = None
+        self._load_manifest()
+    
+    # Reads
+    
+    def count(self) -> int:
+        self.refresh()
+        return len(self._locations)
+    
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        include = include or ["metadatas", "documents"]
+        self.refresh()
+        with self._lock:
+            if ids is not None:
+                located = [self._locations[chunk_id] for chunk_id in dict.fromkeys(ids) if chunk_id in self._locations]
+            else:
+                located = [
+                    (segment, row) for segment in self._segments
+                    for row in np.flatnonzero(self._mask(segment, where))
+                ]
+                located = located[offset or 0:None if limit is None else (offset or 0) + limit]
+            return self._records(located, include)
+    
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        include = include or ["metadatas", "documents", "distances"]
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        self.refresh()
+        with self._lock:
+            segments = list(self._segments)
+            masks = [self._mask(segment, where) for segment in segments]
+        
+        # Top-k per block, then across blocks; ties keep storage order, so results are deterministic
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        position = 0  # global row number across segments
+        for segment, mask in zip(segments, masks):
+            for start in range(0, len(segment), self.block_rows):
+                end = min(start + self.block_rows, len(segment))
+                block_mask = mask[start:end]
+                if block_mask.any():
+                    scores = segment.scores(queries, start, end)
+                    if not block_mask.all():
+                        scores[:, ~block_mask] = -np.inf
+                    best_scores, best_rows = self._merge_top(
+                        best_scores, best_rows, scores, np.arange(position + start, position + end), n_results
+                    )
+            position += len(segment)
+        
+        starts = np.cumsum([0] + [len(segment) for segment in segments])
+        results = {key: [] for key in ["ids"] + include}
+        with self._lock:
+            for scores, rows in zip(best_scores, best_rows):
+                located, distances = [], []
+                for score, row in zip(scores, rows):
+                    if not np.isfinite(score):
+                        continue
+                    index = int(np.searchsorted(starts, row, side="right")) - 1
+                    # Resolve by ID: a write since the search may have merged or deleted the row
+                    location = self._locations.get(segments[index].ids[row - starts[index]])
+                    if location is not None:
+                        located.append(location)
+                        distances.append(float(1.0 - score))
+                records = self._records(located, [key for key in include if key != "distances"])
+                for key, values in records.items():
+                    results[key].append(values)
+                if "distances" in include:
+                    results["distances"].append(distances)
+        return results
+    
+    @staticmethod
+    def _merge_top(best_scores: np.ndarray, best_rows: np.ndarray, scores: np.ndarray,
+                   rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Fold one block's scores into the running top k (per query)"""
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores, rows = np.take_along_axis(scores, top, axis=1), rows[top]
+        else:
+            rows = np.broadcast_to(rows, scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        order = np.lexsort((rows, -scores), axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+    
+    def _records(self, located: List[Tuple[_Segment, int]], include: List[str]) -> Dict[str, List]:
+        records = {"ids": [segment.ids[row] for segment, row in located]}
+        if "metadatas" in include:
+            records["metadatas"] = [segment.metadatas[row] for segment, row in located]
+        if "documents" in include:
+            records["documents"] = self._by_segment(located, lambda segment, rows: segment.documents(rows))
+        if "embeddings" in include:
+            records["embeddings"] = self._by_segment(
+                located, lambda segment, rows: segment.embeddings(rows).tolist()
+            )
+        return records
+    
+    @staticmethod
+    def _by_segment(located: List[Tuple[_Segment, int]], read) -> List:
+        """Read values for rows grouped per segment, returned in the original order"""
+        values = [None] * len(located)
+        groups: Dict[str, Tuple[_Segment, List[int], List[int]]] = {}
+        for position, (segment, row) in enumerate(located):
+            group = groups.setdefault(segment.name, (segment, [], []))
+            group[1].append(position)
+            group[2].append(row)
+        for segment, positions, rows in groups.values():
+            for position, value in zip(positions, read(segment, rows)):
+                values[position] = value
+        return values
+    
+    def _mask(self, segment: _Segment, where: Optional[Dict]) -> np.ndarray:
+        if not where:
+            return segment.alive
+        return segment.alive & segment.matches(where)
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    
+    # Writes
+    
+    def add(self, ids, embeddings, documents, metadatas):
+        with self._write_lock():
+            # Chroma keeps the first copy of an existing ID; so do we
+            keep = {}
+            for index, chunk_id in enumerate(ids):
+                if chunk_id not in self._locations and chunk_id not in keep:
+                    keep[chunk_id] = index
+            self._append([ids[i] for i in keep.values()], [embeddings[i] for i in keep.values()],
+                         [documents[i] for i in keep.values()], [metadatas[i] for i in keep.values()])
+    
+    def upsert(self, ids, embeddings, documents, metadatas):
+        with self._write_lock():
+            latest = {chunk_id: index for index, chunk_id in enumerate(ids)}  # last copy in the batch wins
+            self._tombstone(chunk_id for chunk_id in latest if chunk_id in self._locations)
+            self._append([ids[i] for i in latest.values()], [embeddings[i] for i in latest.values()],
+                         [documents[i] for i in latest.values()], [metadatas[i] for i in latest.values()])
+    
+    def delete(self, ids=None, where=None):
+        with self._write_lock():
+            if ids is not None:
+                doomed = [chunk_id for chunk_id in ids if chunk_id in self._locations]
+                if where:
+                    doomed = [chunk_id for chunk_id in doomed if _matches(where, self._metadata(chunk_id))]
+            else:
+                doomed = [
+                    segment.ids[row] for segment in self._segments
+                    for row in np.flatnonzero(self._mask(segment, where))
+                ]
+            if doomed:
+                self._tombstone(doomed)
+                self._publish()
+    
+    def clear(self):
+        with self._write_lock():
+            old = self._segments
+            self._segments, self._locations = [], {}
+            self._save_manifest()
+            for segment in old:
+                segment.remove_files()
+    
+    def compact(self):
+        """Rewrite the live rows as one segment, dropping tombstones"""
+        with self._write_lock():
+            self._compact()
+    
+    def stats(self) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            rows = sum(len(segment) for segment in self._segments)
+            return {
+                "backend": "numpy",
+                "dtype": self.dtype,
+                "segments": len(self._segments),
+                "rows": rows,
+                "tombstones": rows - len(self._locations),
+                "vector_bytes": sum(segment.vectors.nbytes for segment in self._segments),
+                "resident_bytes": _RESIDENT_BLOCKS.bytes_for({segment.base for segment in self._segments})
+            }
+    
+    def _metadata(self, chunk_id: str) -> Dict[str, Any]:
+        segment, row = self._locations[chunk_id]
+        return segment.metadatas[row]
+    
+    def _append(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+                metadatas: List[Dict[str, Any]]):
+        """Write a segment for the records and publish it (caller holds the write lock)"""
+        if ids:
+            vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+            name = f"seg-{uuid.uuid4().hex[:12]}"
+            _Segment.write(self.directory, name, self.dtype, ids, vectors, documents, metadatas)
+            segment = _Segment(self.directory, name, self.dtype)
+            self._segments.append(segment)
+            for row, chunk_id in enumerate(segment.ids):
+                self._locations[chunk_id] = (segment, row)
+        self._publish()
+    
+    def _publish(self):
+        """Save the manifest, first compacting if tombstones have piled up or merging
+        segments if there are too many (caller holds the write lock)"""
+        rows = sum(len(segment) for segment in self._segments)
+        if rows and (rows - len(self._locations)) / rows > Config.NUMPY_COMPACT_RATIO:
+            self._compact()
+            return
+        
+        retired = []
+        while len(self._segments) > Config.NUMPY_MAX_SEGMENTS:
+            # Merge the smallest adjacent pair: small recent appends fold together
+            # first, so each row is rewritten a logarithmic number of times
+            sizes = [int(segment.alive.sum()) for segment in self._segments]
+            index = min(range(len(sizes) - 1), key=lambda i: sizes[i] + sizes[i + 1])
+            pair = self._segments[index:index + 2]
+            self._segments[index:index + 2] = self._merge(pair)
+            retired.extend(pair)
+        self._save_manifest()
+        for segment in retired:
+            segment.remove_files()
+    
+    def _tombstone(self, ids: Iterator[str]):
+        for chunk_id in list(ids):
+            segment, row = self._locations.pop(chunk_id)
+            segment.alive[row] = False
+    
+    def _merge(self, segments: List[_Segment]) -> List[_Segment]:
+        """One segment holding the live rows of segments (none if all were deleted)"""
+        name = f"seg-{uuid.uuid4().hex[:12]}"
+        if not _Segment.merge(self.directory, name, self.dtype, segments):
+            return []
+        merged = _Segment(self.directory, name, self.dtype)
+        for row, chunk_id in enumerate(merged.ids):
+            self._locations[chunk_id] = (merged, row)
+        return [merged]
+    
+    def _compact(self):
+        old = self._segments
+        self._segments = self._merge(old)
+        self._save_manifest()
+        for segment in old:
+            segment.remove_files()
+    
+    # Persistence
+    
+    def _write_lock(self):
+        return _DirectoryLock(self)
+    
+    def refresh(self):
+        """Pick up segments and tombstones written by other instances"""
+        with self._lock:
+            if _file_version(self.manifest_path) != self._manifest_version:
+                self._load_manifest()
+    
+    def _load_manifest(self):
+        with self._lock:
+            version = _file_version(self.manifest_path)
+            manifest = {"segments": []}
+            if version is not None:
+                try:
+                    with open(self.manifest_path, "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                except Exception as e:
+                    print(f"Error loading vector index manifest, starting empty: {e}")
+            if manifest.get("dtype", self.dtype) != self.dtype:
+                raise ValueError(f"{self.directory} stores {manifest['dtype']} vectors, not {self.dtype}")
+            
+            loaded = {segment.name: segment for segment in self._segments}
+            segments = []
+            for entry in manifest["segments"]:
+                segment = loaded.get(entry["name"]) or _Segment(self.directory, entry["name"], self.dtype)
+                segment.alive = np.ones(len(segment), dtype=bool)
+                segment.alive[entry["deleted"]] = False
+                segments.append(segment)
+            
+            retired = set(loaded) - {segment.name for segment in segments}
+            for name in retired:
+                _RESIDENT_BLOCKS.release(loaded[name].base)
+            self._segments = segments
+            self._locations = {
+                segment.ids[row]: (segment, int(row))
+                for segment in segments for row in np.flatnonzero(segment.alive)
+            }
+            self._manifest_version = version
+    
+    def _save_manifest(self):
+        manifest = {
+            "dtype": self.dtype,
+            "segments": [
+                {"name": segment.name, "rows": len(segment),
+                 "deleted": np.flatnonzero(~segment.alive).tolist()}
+                for segment in self._segments
+            ]
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_version = _file_version(self.manifest_path)
+
+
+class _DirectoryLock:
+    """Thread lock plus, where available, an exclusive file lock on the owner's
+    directory, so writers in other processes apply their changes to the latest
+    state on disk (the owner has _lock, directory and refresh())"""
+    
+    def __init__(self, owner):
+        self.owner = owner
+        self._file = None
+    
+    def __enter__(self):
+        self.owner._lock.acquire()
+        if fcntl is not None:
+            self._file = open(os.path.join(self.owner.directory, ".lock"), "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self.owner.refresh()
+        return self
+    
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        self.owner._lock.release()
+
+
+class ShardedBackend(VectorBackend):
+    """Documents spread over independent backends (shards), queried in parallel.
+    
+    Every PDF lives in exactly one shard. New PDFs are hashed over the
+    hash-pool shards unless assigned to a named shard first (a tenant or
+    document group). shards.json records each PDF's shard, so adding shards
+    never moves existing documents: nothing is re-indexed. An unsharded index
+    found at adopt_dir is taken over in place as shard-000, with its PDFs.
+    """
+    
+    _NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+    
+    def __init__(self, kind: str = "chroma", directory: str = Config.SHARD_DIR, embedding_function=None,
+                 hash_shards: int = Config.VECTOR_SHARDS, workers: int = Config.SHARD_QUERY_WORKERS,
+                 adopt_dir: Optional[str] = None):
+        if kind not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector backend: {kind}")
+        self.kind = kind
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.registry_path = os.path.join(directory, "shards.json")
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="shard")
+        self._shards: List[Dict[str, Any]] = []  # [{"name", "hashed"}] in creation order
+        self._assignments: Dict[str, str] = {}  # pdf_name -> shard name
+        self._children: Dict[str, VectorBackend] = {}
+        self._registry_version = None
+        self.refresh()
+        
+        # Switching an existing install to shards must not leave its documents behind
+        if adopt_dir and not self._assignments:
+            self._adopt(adopt_dir)
+        
+        # Raising the configured count adds hash shards; lowering it never drops data
+        if sum(1 for shard in self._shards if shard["hashed"]) < hash_shards:
+            with self._write_lock():
+                hashed = sum(1 for shard in self._shards if shard["hashed"])
+                for index in range(hashed, hash_shards):
+                    self._shards.append({"name": f"shard-{index:03d}", "hashed": True})
+                self._save_registry()
+                self._open_children()
+    
+    # Routing
+    
+    def shard_names(self) -> List[str]:
+        self.refresh()
+        return [shard["name"] for shard in self._shards]
+    
+    def add_shard(self, name: Optional[str] = None, hashed: bool = True) -> str:
+        """Create a shard; hash shards start taking new PDFs, named ones only assigned PDFs"""
+        with self._write_lock():
+            if name is None:
+                hashed_count = sum(1 for shard in self._shards if shard["hashed"])
+                name = f"shard-{hashed_count:03d}"
+            self._create_shard(name, hashed)
+            self._save_registry()
+        return name
+    
+    def assign(self, pdf_names: List[str], shard: str):
+        """Pin PDFs to a shard before they are ingested, creating it as a named shard if needed"""
+        with self._write_lock():
+            moved = [name for name in pdf_names if self._assignments.get(name, shard) != shard]
+            if moved:
+                raise ValueError(f"Already stored in another shard (delete them first): {', '.join(moved)}")
+            if shard not in self._children:
+                self._create_shard(shard, hashed=False)
+            for name in pdf_names:
+                self._assignments[name] = shard
+            self._save_registry()
+    
+    def _create_shard(self, name: str, hashed: bool):
+        if not self._NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid shard name: {name}")
+        if name not in self._children:
+            self._shards.append({"name": name, "hashed": hashed})
+            self._open_children()
+    
+    def _adopt(self, path: str):
+        """Register a non-empty unsharded index as shard-000 and record its PDFs"""
+        if not os.path.isdir(path):
+            return
+        existing = _open_backend(self.kind, path, self.embedding_function)
+        total = existing.count()
+        if not total:
+            return
+        with self._write_lock():
+            if self._assignments:
+                return  # Another instance adopted it first
+            assignments = {}
+            for offset in range(0, total, 10_000):
+                batch = existing.get(include=["metadatas"], limit=10_000, offset=offset)
+                for meta in batch["metadatas"]:
+                    assignments[(meta or {}).get("pdf_name", "")] = "shard-000"
+            entry = {"name": "shard-000", "hashed": True, "path": path}
+            self._shards = [entry] + [shard for shard in self._shards if shard["name"] != "shard-000"]
+            self._children["shard-000"] = existing
+            self._assignments = assignments
+            self._save_registry()
+            self._open_children()
+        print(f"Adopted the existing index at {path} ({total} chunks, {len(assignments)} PDFs) as shard-000")
+    
+    def _route(self, pdf_names: List[str]) -> Dict[str, str]:
+        """Shard for each PDF, assigning new PDFs by hash"""
+        self.refresh()
+        new = [name for name in set(pdf_names) if name not in self._assignments]
+        if new:
+            with self._write_lock():
+                pool = [shard["name"] for shard in self._shards if shard["hashed"]] or \
+                       [shard["name"] for shard in self._shards]
+                for name in new:
+                    if name not in self._assignments:
+                        digest = int(hashlib.md5(name.encode("utf-8")).hexdigest(), 16)
+                        self._assignments[name] = pool[digest % len(pool)]
+                self._save_registry()
+        return {name: self._assignments[name] for name in pdf_names}
+    
+    def _shards_for(self, where: Optional[Dict]) -> List[str]:
+        """Shards that can hold records matching a filter: all, unless it names PDFs"""
+        self.refresh()
+        names = _pdf_names_in(where)
+        if names is None:
+            return [shard["name"] for shard in self._shards]
+        wanted = {self._assignments[name] for name in names if name in self._assignments}
+        return [shard["name"] for shard in self._shards if shard["name"] in wanted]
+    
+    def _fan_out(self, shards: List[str], call) -> List[Any]:
+        """call(child) on each shard concurrently, results in shard order"""
+        children = [self._children[name] for name in shards]
+        if len(children) == 1:
+            return [call(children[0])]
+        return list(self._executor.map(call, children))
+    
+    # Reads
+    
+    def count(self) -> int:
+        return sum(self._fan_out(self._shards_for(None), lambda child: child.count()))
+    
+    def get(self, ids=None, where=None, include=None, limit=None, offset=None):
+        include = include or ["metadatas", "documents"]
+        shards = self._shards_for(where)
+        merged = {key: [] for key in ["ids"] + include}
+        if ids is None and where is None and (limit is not None or offset):
+            # Page through the shards in order without fetching the skipped rows
+            skip, remaining = offset or 0, limit
+            for name, size in zip(shards, self._fan_out(shards, lambda child: child.count())):
+                if remaining is not None and remaining <= 0:
+                    break
+                if skip >= size:
+                    skip -= size
+                    continue
+                take = size - skip if remaining is None else min(size - skip, remaining)
+                part = self._children[name].get(include=include, limit=take, offset=skip)
+                for key in merged:
+                    merged[key].extend(part[key])
+                skip = 0
+                if remaining is not None:
+                    remaining -= len(part["ids"])
+            return merged
+        
+        parts = self._fan_out(shards, lambda child: child.get(ids=ids, where=where, include=include))
+        for part in parts:
+            for key in merged:
+                merged[key].extend(part[key])
+        if limit is not None or offset:
+            start = offset or 0
+            end = None if limit is None else start + limit
+            merged = {key: values[start:end] for key, values in merged.items()}
+        return merged
+    
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        include = include or ["metadatas", "documents", "distances"]
+        # Distances are needed to merge, even if the caller did not ask for them
+        child_include = include if "distances" in include else include + ["distances"]
+        shards = self._shards_for(where)
+        
+        def search(child):
+            if not child.count():
+                return None  # Chroma rejects queries against an empty collection
+            return child.query(query_embeddings, n_results=n_results, where=where, include=child_include)
+        
+        parts = [part for part in self._fan_out(shards, search) if part is not None]
+        merged = {key: [] for key in ["ids"] + include}
+        for row in range(len(query_embeddings)):
+            # Global top-k: the nearest n_results over every shard's own top-k
+            candidates = sorted(
+                (distance, shard, rank)
+                for shard, part in enumerate(parts)
+                for rank, distance in enumerate(part["distances"][row])
+            )[:n_results]
+            for key in merged:
+                merged[key].append([parts[shard][key][row][rank] for _, shard, rank in candidates])
+        return merged
+    
+    # Writes
+    
+    def add(self, ids, embeddings, documents, metadatas):
+        self._write_grouped("add", ids, embeddings, documents, metadatas)
+    
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._write_grouped("upsert", ids, embeddings, documents, metadatas)
+    
+    def _write_grouped(self, method: str, ids, embeddings, documents, metadatas):
+        """Split a write by shard; shards write concurrently"""
+        routes = self._route([meta["pdf_name"] for meta in metadatas])
+        groups: Dict[str, List[int]] = {}
+        for index, meta in enumerate(metadatas):
+            groups.setdefault(routes[meta["pdf_name"]], []).append(index)
+        
+        def write(item):
+            name, rows = item
+            getattr(self._children[name], method)(
+                [ids[i] for i in rows], [embeddings[i] for i in rows],
+                [documents[i] for i in rows], [metadatas[i] for i in rows]
+            )
+        list(self._executor.map(write, groups.items()))
+    
+    def delete(self, ids=None, where=None):
+        names = _pdf_names_in(where)
+        if names is None:
+            self._fan_out(self._shards_for(where), lambda child: child.delete(ids=ids, where=where))
+            return
+        with self._write_lock():
+            self._fan_out(self._shards_for(where), lambda child: child.delete(ids=ids, where=where))
+            # A PDF with no chunks left is no longer pinned to its shard
+            released = [
+                name for name in names if name in self._assignments and not self._children[
+                    self._assignments[name]].get(where={"pdf_name": name}, include=[], limit=1)["ids"]
+            ]
+            if released:
+                for name in released:
+                    del self._assignments[name]
+                self._save_registry()
+    
+    def clear(self):
+        with self._write_lock():
+            self._fan_out(self._shards_for(None), lambda child: child.clear())
+            self._assignments = {}
+            self._save_registry()
+    
+    def stats(self) -> Dict[str, Any]:
+        shards = self._shards_for(None)
+        per_pdf = Counter(self._assignments.values())
+        counts = self._fan_out(shards, lambda child: child.count())
+        details = self._fan_out(shards, lambda child: child.stats())
+        flags = {shard["name"]: shard["hashed"] for shard in self._shards}
+        return {
+            "backend": "sharded",
+            "shard_backend": self.kind,
+            "shards": [
+                {"name": name, "hashed": flags[name], "documents": count, "pdfs": per_pdf.get(name, 0),
+                 **{key: value for key, value in detail.items() if key != "backend"}}
+                for name, count, detail in zip(shards, counts, details)
+            ]
+        }
+    
+    # Persistence
+    
+    def _write_lock(self):
+        return _DirectoryLock(self)
+    
+    def refresh(self):
+        """Pick up shards and assignments added by other instances"""
+        with self._lock:
+            version = _file_version(self.registry_path)
+            if version == self._registry_version:
+                return
+            registry = {"shards": [], "assignments": {}}
+            if version is not None:
+                try:
+                    with open(self.registry_path, "r", encoding="utf-8") as f:
+                        registry = json.load(f)
+                except Exception as e:
+                    print(f"Error loading shard registry: {e}")
+                    return
+            if registry.get("kind", self.kind) != self.kind:
+                raise ValueError(f"{self.directory} holds {registry['kind']} shards, not {self.kind}")
+            self._shards = registry["shards"]
+            self._assignments = registry["assignments"]
+            self._registry_version = version
+            self._open_children()
+    
+    def _open_children(self):
+        for shard in self._shards:
+            if shard["name"] not in self._children:
+                # Adopted shards keep their original location
+                path = shard.get("path") or _backend_dir(self.kind, os.path.join(self.directory, shard["name"]))
+                self._children[shard["name"]] = _open_backend(self.kind, path, self.embedding_function)
+    
+    def _save_registry(self):
+        tmp_path = f"{self.registry_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"kind": self.kind, "shards": self._shards, "assignments": self._assignments}, f)
+        os.replace(tmp_path, self.registry_path)
+        self._registry_version = _file_version(self.registry_path)
+
+
+_COMPARISONS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target
+}
+
+
+def _file_version(path: str):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _pdf_names_in(where: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+    """PDF names a where filter restricts records to, or None if it does not"""
+    if not where:
+        return None
+    names = None
+    for key, condition in where.items():
+        found = None
+        if key == "$and":
+            for clause in condition:
+                clause_names = _pdf_names_in(clause)
+                if clause_names is not None:
+                    found = clause_names if found is None else found & clause_names
+        elif key == "pdf_name":
+            if not isinstance(condition, dict):
+                found = {condition}
+            elif "$eq" in condition:
+                found = {condition["$eq"]}
+            elif "$in" in condition:
+                found = set(condition["$in"])
+        if found is not None:
+            names = found if names is None else names & found
+    return names
+
+
+def _matches(where: Dict[str, Any], metadata: Dict[str, Any]) -> bool:
+    """Evaluate a Chroma where filter against one record's metadata"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(clause, metadata) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(clause, metadata) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, target in condition.items():
+                if operator not in _COMPARISONS:
+                    raise ValueError(f"Unsupported where operator: {operator}")
+                if not _COMPARISONS[operator](value, target):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+BACKENDS = ("chroma", "numpy")
+
+
+def _backend_dir(name: str, persist_dir: Optional[str] = None) -> str:
+    """Where an unsharded backend keeps its files"""
+    if name == "chroma":
+        return os.path.join(persist_dir, "chroma_db") if persist_dir else Config.CHROMA_PERSIST_DIR
+    if name == "numpy":
+        return os.path.join(persist_dir, "numpy_index") if persist_dir else Config.NUMPY_INDEX_DIR
+    raise ValueError(f"Unknown vector backend: {name}")
+
+
+def _open_backend(name: str, path: str, embedding_function=None) -> VectorBackend:
+    if name == "chroma":
+        return ChromaBackend(path, embedding_function)
+    return NumpyBackend(path)
+
+
+def create_backend(name: str, persist_dir: Optional[str] = None, embedding_function=None,
+                   shards: int = Config.VECTOR_SHARDS) -> VectorBackend:
+    """Build a backend by name, sharded if shards > 1; persist_dir overrides its configured storage directory"""
+    path = _backend_dir(name, persist_dir)
+    if shards > 1:
+        return ShardedBackend(
+            name, os.path.join(persist_dir, "shards") if persist_dir else Config.SHARD_DIR,
+            embedding_function, hash_shards=shards, adopt_dir=path
+        )
+    return _open_backend(name, path, embedding_function)
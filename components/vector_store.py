@@ -1,39 +1,83 @@
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable
+import hashlib
 import json
+import numpy as np
 import sys
 import os
 
 # Add parent directory to path for config import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from components.cache import EmbeddingCache
+from components.lexical_index import BM25Index, reciprocal_rank_fusion
+from components.metadata_index import MetadataIndex, RetrievalScope
+from components.tracing import span
+from components.resources import get_embedding_function
+from components.vector_backends import create_backend, ShardedBackend
 
 
 class VectorStore:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(
-            path=Config.CHROMA_PERSIST_DIR,
-            settings=Settings(anonymized_telemetry=False)
-        )
-        # Use Chroma's default embedding function (no PyTorch needed)
-        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
-        self.embedding_function = DefaultEmbeddingFunction()
-        
-        self.collection = self._get_or_create_collection()
+    RETRIEVAL_MODES = ("hybrid", "vector", "bm25")
     
-    def _get_or_create_collection(self):
-        return self.client.get_or_create_collection(
-            name="pdf_documents",
-            embedding_function=self.embedding_function,
-            metadata={"hnsw:space": "cosine"}
+    def __init__(self, persist_dir: Optional[str] = None, embedding_function=None,
+                 backend: Optional[str] = None, shards: Optional[int] = None):
+        # persist_dir keeps the vector index, the BM25 index and the embedding cache under one
+        # directory instead of the configured paths (benchmarks, tests, separate corpora)
+        bm25_dir = os.path.join(persist_dir, "bm25_index") if persist_dir else Config.BM25_INDEX_DIR
+        cache_path = (os.path.join(persist_dir, "cache", "embeddings.sqlite")
+                      if persist_dir else Config.EMBEDDING_CACHE_PATH)
+        
+        if embedding_function is None:
+            # Chroma's default ONNX model (no PyTorch needed), loaded once per process
+            self.embedding_function = get_embedding_function()
+            model_id = Config.EMBEDDING_MODEL_ID
+        else:
+            self.embedding_function = embedding_function
+            model_id = type(embedding_function).__name__
+        self.embedding_cache = EmbeddingCache(model_id, path=cache_path)
+        
+        # "chroma" or "numpy", split into shards when shards > 1; see components/vector_backends.py
+        self.backend = create_backend(
+            backend or Config.VECTOR_BACKEND, persist_dir, self.embedding_function,
+            shards=Config.VECTOR_SHARDS if shards is None else shards
         )
+        self.lexical_index = BM25Index(bm25_dir)
+        count = self.backend.count()
+        if len(self.lexical_index) != count:
+            if count == 0:
+                # An empty backend next to a populated BM25 index points at a moved or
+                # misconfigured vector index; keep BM25 rather than wipe it
+                print(f"Vector index is empty but BM25 holds {len(self.lexical_index)} chunks; not rebuilding BM25")
+            else:
+                self.rebuild_lexical_index()
+        # Built lazily on the first scoped query
+        self.metadata_index = MetadataIndex()
     
     def add_documents(self, chunks: List[Any]):
         """Add document chunks to vector store"""
         if not chunks:
             return 0
         
+        records = self._prepare_records(chunks)
+        with span("vector_write", chunks=len(chunks)):
+            self.backend.add(**records)
+        self._index_lexical(records)
+        
+        return len(chunks)
+    
+    def upsert_documents(self, chunks: List[Any]):
+        """Insert chunks or overwrite existing chunks with the same ID"""
+        if not chunks:
+            return 0
+        
+        records = self._prepare_records(chunks)
+        with span("vector_write", chunks=len(chunks)):
+            self.backend.upsert(**records)
+        self._index_lexical(records)
+        
+        return len(chunks)
+    
+    def _prepare_records(self, chunks: List[Any]) -> Dict[str, List]:
         ids = [chunk.chunk_id for chunk in chunks]
         texts = [chunk.text for chunk in chunks]
         
@@ -42,37 +86,289 @@ class VectorStore:
             "page_number": chunk.page_number,
             "heading": chunk.heading,
             "text_preview": chunk.text[:200],
+            "content_hash": self._content_hash(chunk),
             **chunk.metadata
         } for chunk in chunks]
         
-        self.collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas
-        )
+        # Only cache misses go through the embedding model
+        with span("embedding", chunks=len(texts)):
+            embeddings = self.embedding_cache.embed(texts, self.embedding_function)
         
-        return len(chunks)
+        return {
+            "ids": ids,
+            "embeddings": embeddings,
+            "documents": texts,
+            "metadatas": metadatas
+        }
+    
+    def _index_lexical(self, records: Dict[str, List]):
+        with span("bm25_index", chunks=len(records["ids"])):
+            self._track_metadata(
+                lambda: self.lexical_index.add(
+                    records["ids"],
+                    records["documents"],
+                    [meta["pdf_name"] for meta in records["metadatas"]]
+                ),
+                lambda version: self.metadata_index.add(records["ids"], records["metadatas"], version)
+            )
+    
+    def _track_metadata(self, write: Callable[[], None], update: Callable[[Any], None]):
+        """Run a lexical index write and apply it to the metadata index if that was current"""
+        # Otherwise another instance wrote in between; the next scoped query rebuilds
+        before = self.corpus_version()
+        write()
+        if self.metadata_index.version == before:
+            update(self.corpus_version())
+    
+    def rebuild_lexical_index(self, batch_size: int = 5000):
+        """Rebuild the BM25 index from the documents stored in the vector backend"""
+        self.lexical_index.clear()
+        total = self.backend.count()
+        for offset in range(0, total, batch_size):
+            batch = self.backend.get(
+                include=["documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            self.lexical_index.add(
+                batch["ids"],
+                batch["documents"],
+                [(meta or {}).get("pdf_name", "") for meta in batch["metadatas"]]
+            )
+    
+    @staticmethod
+    def _content_hash(chunk: Any) -> str:
+        """Hash of everything stored for a chunk, used to detect changes on re-index"""
+        payload = json.dumps(
+            [chunk.text, chunk.page_number, chunk.heading, chunk.metadata],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
     
-    def query(self, query_text: str, n_results: int = 5) -> Dict[str, Any]:
-        """Query similar documents"""
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"]
+    def delete_pdf(self, pdf_name: str):
+        """Delete every chunk belonging to one PDF"""
+        self.backend.delete(where={"pdf_name": pdf_name})
+        self._track_metadata(
+            lambda: self.lexical_index.delete_pdf(pdf_name),
+            lambda version: self.metadata_index.delete_pdf(pdf_name, version)
         )
+    
+    def reindex_pdf(self, pdf_name: str, chunks: List[Any]) -> Dict[str, int]:
+        """Bring one PDF's chunks in line with a fresh extraction, writing only what changed"""
+        existing = self.backend.get(where={"pdf_name": pdf_name}, include=["metadatas"])
+        stored_hashes = {
+            chunk_id: (meta or {}).get("content_hash")
+            for chunk_id, meta in zip(existing["ids"], existing["metadatas"])
+        }
+        
+        new_ids = {chunk.chunk_id for chunk in chunks}
+        changed = [
+            chunk for chunk in chunks
+            if stored_hashes.get(chunk.chunk_id) != self._content_hash(chunk)
+        ]
+        stale = [chunk_id for chunk_id in stored_hashes if chunk_id not in new_ids]
+        
+        self.upsert_documents(changed)
+        if stale:
+            self.backend.delete(ids=stale)
+            self._track_metadata(
+                lambda: self.lexical_index.delete(stale),
+                lambda version: self.metadata_index.delete(stale, version)
+            )
+        
+        added = sum(1 for chunk in changed if chunk.chunk_id not in stored_hashes)
+        return {
+            "added": added,
+            "updated": len(changed) - added,
+            "deleted": len(stale),
+            "unchanged": len(chunks) - len(changed)
+        }
+    
+    def assign_shard(self, pdf_names: List[str], shard: str):
+        """Keep these PDFs (e.g. one team's documents) in their own shard; call before ingesting them"""
+        if not isinstance(self.backend, ShardedBackend):
+            raise ValueError("Shard assignment needs a sharded index (Config.VECTOR_SHARDS > 1)")
+        self.backend.assign(pdf_names, shard)
+    
+    def embed_query(self, query_text: str) -> List[float]:
+        return self.embed_queries([query_text])[0]
+    
+    def embed_queries(self, query_texts: List[str]) -> List[List[float]]:
+        with span("query_embedding", queries=len(query_texts)):
+            return self.embedding_function(list(query_texts))
+    
+    def corpus_version(self):
+        """Changes whenever chunks are written or deleted, by this or any other instance"""
+        # Every mutation also goes through the lexical index journal
+        return self.lexical_index.version()
+    
+    def _current_metadata_index(self) -> MetadataIndex:
+        version = self.corpus_version()
+        if self.metadata_index.version != version:
+            self.metadata_index.rebuild(self.backend, version)
+        return self.metadata_index
+    
+    def pdf_names(self) -> List[str]:
+        return self._current_metadata_index().pdf_names()
+    
+    def resolve_scope(self, scope: RetrievalScope) -> Optional[Set[str]]:
+        """Chunk IDs inside a scope (None for an unscoped query), from the metadata index"""
+        if scope.is_empty():
+            return None
+        return self._current_metadata_index().resolve(scope)
+    
+    def query(self, query_text: str, n_results: int = 5, mode: str = None,
+              query_embedding: List[float] = None, include_embeddings: bool = False,
+              pdf_names: Optional[List[str]] = None, page_range: Optional[Tuple[int, int]] = None,
+              headings: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Query similar documents with dense, lexical (BM25) or hybrid retrieval, optionally scoped"""
+        return self.query_batch(
+            [query_text], n_results, mode,
+            query_embeddings=[query_embedding] if query_embedding is not None else None,
+            include_embeddings=include_embeddings,
+            pdf_names=pdf_names, page_range=page_range, headings=headings
+        )[0]
+    
+    def query_batch(self, query_texts: List[str], n_results: int = 5, mode: str = None,
+                    query_embeddings: Optional[List[List[float]]] = None, include_embeddings: bool = False,
+                    pdf_names: Optional[List[str]] = None, page_range: Optional[Tuple[int, int]] = None,
+                    headings: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """query() for many queries sharing one scope: one embedding call and one dense search for all"""
+        mode = mode or Config.RETRIEVAL_MODE
+        if mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if not query_texts:
+            return []
+        
+        scope = RetrievalScope(pdf_names, page_range, headings)
+        scope_ids = self.resolve_scope(scope)
+        if scope_ids is not None and not scope_ids:
+            return [self._build_results([], None, {}, include_embeddings) for _ in query_texts]
+        
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(query_texts)
+        
+        if mode == "vector":
+            with span("dense_search", queries=len(query_texts)):
+                return self._dense_search(query_embeddings, n_results, scope, scope_ids, include_embeddings)
+        
+        candidates = n_results * Config.HYBRID_CANDIDATE_FACTOR
+        with span("bm25_search", queries=len(query_texts)):
+            lexical = [
+                [chunk_id for chunk_id, _ in self.lexical_index.search(text, candidates, allowed_ids=scope_ids)]
+                for text in query_texts
+            ]
+        
+        if mode == "bm25":
+            return [
+                self._build_results(
+                    [(chunk_id, 1.0 / (Config.RRF_K + rank)) for rank, chunk_id in enumerate(lexical_ids[:n_results], 1)],
+                    embedding, {}, include_embeddings
+                )
+                for lexical_ids, embedding in zip(lexical, query_embeddings)
+            ]
+        
+        with span("dense_search", queries=len(query_texts)):
+            dense_batch = self._dense_search(query_embeddings, candidates, scope, scope_ids, include_embeddings)
+        
+        results = []
+        for dense, lexical_ids, embedding in zip(dense_batch, lexical, query_embeddings):
+            dense_ids = dense["ids"][0]
+            dense_embeddings = dense["embeddings"][0] if include_embeddings else [None] * len(dense_ids)
+            known = {
+                chunk_id: (doc, meta, distance, chunk_embedding)
+                for chunk_id, doc, meta, distance, chunk_embedding in zip(
+                    dense_ids, dense["documents"][0], dense["metadatas"][0], dense["distances"][0],
+                    dense_embeddings
+                )
+            }
+            ranked = reciprocal_rank_fusion([dense_ids, lexical_ids])[:n_results]
+            results.append(self._build_results(ranked, embedding, known, include_embeddings))
+        return results
+    
+    def _dense_search(self, query_embeddings: List[List[float]], n_results: int, scope: RetrievalScope,
+                      scope_ids: Optional[Set[str]], include_embeddings: bool) -> List[Dict[str, Any]]:
+        """Nearest chunks for each query embedding, as one single-query result dict per query"""
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        
+        if scope_ids is None or len(scope_ids) > Config.SCOPE_EXACT_SEARCH_LIMIT:
+            batch = self.backend.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results if scope_ids is None else min(n_results, len(scope_ids)),
+                where=scope.where() if scope_ids is not None else None,
+                include=include
+            )
+            return [{key: [batch[key][row]] for key in include + ["ids"]} for row in range(len(query_embeddings))]
+        
+        # Small scopes are scored exactly: cheaper than a filtered ANN search,
+        # which can also come back short when the filter is very selective
+        fetched = self.backend.get(ids=list(scope_ids), include=["documents", "metadatas", "embeddings"])
+        distances = self._cosine_distances(query_embeddings, fetched["embeddings"])
+        results = []
+        for row in distances:
+            order = np.argsort(row, kind="stable")[:n_results]
+            result = {
+                "ids": [[fetched["ids"][i] for i in order]],
+                "documents": [[fetched["documents"][i] for i in order]],
+                "metadatas": [[fetched["metadatas"][i] for i in order]],
+                "distances": [[float(row[i]) for i in order]]
+            }
+            if include_embeddings:
+                result["embeddings"] = [[fetched["embeddings"][i] for i in order]]
+            results.append(result)
         return results
     
+    def _build_results(self, ranked: List, query_embedding: List[float], known: Dict,
+                       include_embeddings: bool = False) -> Dict[str, Any]:
+        """Assemble Chroma-shaped results, fetching documents the dense search did not return"""
+        missing = [chunk_id for chunk_id, _ in ranked if chunk_id not in known]
+        if missing:
+            fetched = self.backend.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for chunk_id, doc, meta, embedding in zip(
+                fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+            ):
+                known[chunk_id] = (doc, meta, self._cosine_distance(query_embedding, embedding), embedding)
+        
+        ranked = [(chunk_id, score) for chunk_id, score in ranked if chunk_id in known]
+        results = {
+            "ids": [[chunk_id for chunk_id, _ in ranked]],
+            "documents": [[known[chunk_id][0] for chunk_id, _ in ranked]],
+            "metadatas": [[known[chunk_id][1] for chunk_id, _ in ranked]],
+            "distances": [[known[chunk_id][2] for chunk_id, _ in ranked]],
+            "scores": [[score for _, score in ranked]]
+        }
+        if include_embeddings:
+            results["embeddings"] = [[known[chunk_id][3] for chunk_id, _ in ranked]]
+        return results
+    
+    @staticmethod
+    def _cosine_distance(a: List[float], b: List[float]) -> float:
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        denom = float(np.linalg.norm(a) * np.linalg.norm(b)) or 1.0
+        return 1.0 - float(np.dot(a, b)) / denom
+    
+    @staticmethod
+    def _cosine_distances(queries: List[List[float]], embeddings: List[List[float]]) -> np.ndarray:
+        """Queries x embeddings matrix of cosine distances"""
+        queries = np.asarray(queries, dtype=np.float32)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return 1.0 - queries @ embeddings.T
+    
     def get_stats(self) -> Dict:
         """Get collection statistics"""
         return {
-            "total_documents": self.collection.count(),
-            "collection_name": self.collection.name
+            "total_documents": self.backend.count(),
+            "collection_name": self.backend.name,
+            "vector_backend": self.backend.stats(),
+            "lexical_index_documents": len(self.lexical_index),
+            "embedding_cache": self.embedding_cache.stats()
         }
     
     def clear(self):
         """Clear all documents"""
-        try:
-            self.client.delete_collection("pdf_documents")
-        except Exception:
-            pass
-        self.collection = self._get_or_create_collection()
\ No newline at end of file
+        self.backend.clear()
+        self.lexical_index.clear()
+        self.metadata_index.clear(self.corpus_version())
\ No newline at end of file
@@ -7,17 +7,83 @@ class Config:
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     CHROMA_PERSIST_DIR = "./data/chroma_db"
+    BM25_INDEX_DIR = "./data/bm25_index"
+    VECTOR_BACKEND = "chroma"  # "chroma" (HNSW, fastest queries) or "numpy" (exact: better recall, small disk, more RAM)
+    NUMPY_INDEX_DIR = "./data/numpy_index"
+    NUMPY_INDEX_DTYPE = "float16"  # "float16" or "int8" (per-row scaled: half the size, faster, slightly lower recall)
+    NUMPY_SEARCH_BLOCK = 65_536  # rows scored per matrix product; bounds the float32 working set
+    NUMPY_RESIDENT_MB = 1024  # float32 search blocks kept in RAM (1.5 KB per 384-d chunk); 0 reads the disk copy every query
+    NUMPY_COMPACT_RATIO = 0.3  # tombstoned share of rows that triggers a compaction
+    NUMPY_MAX_SEGMENTS = 16  # more segments than this are merged, smallest first
+    VECTOR_SHARDS = 1  # hash shards; >1 splits the index by PDF (an existing index becomes shard-000), re-indexing nothing
+    SHARD_DIR = "./data/shards"
+    SHARD_QUERY_WORKERS = 8  # threads fanning queries and writes out to shards
     LOG_DIR = "./data/logs"
     UPLOAD_DIR = "./data/uploads"
-    CHUNK_SIZE = 1000
-    CHUNK_OVERLAP = 200
+    MANIFEST_PATH = "./data/ingest_manifest.json"
+    ANALYTICS_STATE_PATH = "./data/logs/analytics_state.json"  # rolling aggregates + log offsets
+    ANALYTICS_STATE_VERSION = 2  # bump when the aggregate layout changes to force a rebuild
+    ANALYTICS_FLUSH_ENTRIES = 100  # queued log entries that trigger a write
+    ANALYTICS_FLUSH_SECONDS = 1.0  # longest an entry waits in the queue
+    ANALYTICS_QUEUE_SIZE = 10_000  # entries beyond this are dropped rather than block a request
+    LATENCY_HISTOGRAM_GROWTH = 1.05  # bucket width ratio; percentiles are within 5%
+    TRACE_HISTORY = 50  # finished traces kept in memory for Chrome trace export
+    CACHE_DIR = "./data/cache"
+    EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2"  # Chroma's DefaultEmbeddingFunction
+    EMBEDDING_MAX_TOKENS = 256  # the model truncates input beyond this many wordpieces
+    EMBEDDING_TOKEN_RATIO = 0.8  # cl100k tokens per wordpiece assumed when capping chunks (numbers, rare words split finer)
+    EMBEDDING_CACHE_PATH = "./data/cache/embeddings.sqlite"
+    EMBEDDING_CACHE_MAX_ENTRIES = 500_000
+    RESPONSE_CACHE_PATH = "./data/cache/llm_responses.sqlite"
+    RESPONSE_CACHE_MAX_ENTRIES = 50_000
+    QUERY_CACHE_MAX_ENTRIES = 1000
+    QUERY_CACHE_TTL_SECONDS = 3600
+    QUERY_CACHE_SIMILARITY = 0.95  # cosine similarity for a near-duplicate query hit
+    CHUNK_SIZE = 200  # tokens; PDFProcessor caps it at what the embedding model reads
+    CHUNK_OVERLAP = 40  # tokens
+    TOKEN_ENCODING = "cl100k_base"
     MAX_WORKERS = 4
+    EXTRACTION_MODE = "process"  # "thread" or "process"
+    PAGES_PER_TASK = 25
+    EXTRACTION_ENGINE = "pymupdf"  # "pymupdf" or "pdfplumber"
+    INGEST_BATCH_SIZE = 256  # chunks per vector store write
+    INGEST_QUEUE_SIZE = 4  # extracted batches buffered ahead of embedding
+    INGEST_CHECKPOINT_PATH = "./data/logs/bulk_ingest_checkpoint.jsonl"  # one line per finished PDF
+    INGEST_MANIFEST_FLUSH = 100  # bulk ingest: finished PDFs per manifest rewrite
+    JOBS_DB_PATH = "./data/ingestion_jobs.sqlite"
+    JOB_POLL_SECONDS = 2.0  # idle worker checks for queued jobs this often
+    JOB_PROGRESS_INTERVAL = 0.5  # seconds between progress writes to the job table
+    JOB_STALE_SECONDS = 300  # a running job whose worker has not checked in for this long is requeued
+    JOB_HEARTBEAT_SECONDS = 30  # a worker marks its running job alive this often, however slow the current step
+    JOB_UI_REFRESH_SECONDS = 1.0  # the upload tab re-reads job progress this often while jobs are active
+    HEADING_FONT_RATIO = 1.15  # font size vs. page body size that marks a heading
+    RETRIEVAL_MODE = "hybrid"  # "hybrid", "vector" or "bm25"
+    HYBRID_CANDIDATE_FACTOR = 4  # candidates per retriever = n_results * factor
+    RRF_K = 60
+    SCOPE_EXACT_SEARCH_LIMIT = 5000  # scoped queries over at most this many chunks skip the ANN index
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    BM25_MAX_DF_RATIO = 0.5  # skip query terms present in more than this share of chunks
+    BM25_COMPACT_EVERY = 50_000  # journal entries before a snapshot is written
+    CONTEXT_TOKEN_BUDGET = 3000  # tokens of retrieved text sent with each question
+    CONTEXT_CANDIDATE_FACTOR = 4  # over-retrieve n_results * factor chunks for MMR
+    CONTEXT_MAX_CHUNKS = 15  # adjacent chunks are merged back into longer spans when packed
+    CONTEXT_MIN_TRIM_TOKENS = 64  # smallest partial chunk worth keeping at the budget edge
+    MMR_LAMBDA = 0.7  # 1.0 ranks by relevance only, 0.0 by diversity only
     DEFAULT_MODEL = "gemini-flash-latest"
+    GROQ_MODEL = "llama-3.1-8b-instant"
+    HEDGE_ENABLED = True  # race a backup provider when the primary is slow
+    HEDGE_PERCENTILE = 95  # primary latency percentile used as the hedge deadline
+    HEDGE_DEFAULT_DEADLINE_SECONDS = 4.0  # deadline until enough latencies are observed
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_LATENCY_WINDOW = 200  # recent requests kept per provider
     TEMPERATURE = 0.3
+    BATCH_QA_CONCURRENCY = 8  # LLM calls in flight during batch evaluation
+    BATCH_QA_RETRIEVAL_SIZE = 64  # questions per batched retrieval call
     
     @classmethod
     def ensure_dirs(cls):
-        for dir_path in [cls.CHROMA_PERSIST_DIR, cls.LOG_DIR, cls.UPLOAD_DIR]:
+        for dir_path in [cls.CHROMA_PERSIST_DIR, cls.BM25_INDEX_DIR, cls.LOG_DIR, cls.UPLOAD_DIR, cls.CACHE_DIR]:
             os.makedirs(dir_path, exist_ok=True)
 
 Config.ensure_dirs()
\ No newline at end of file
@@ -0,0 +1,336 @@
+"""Ingest a directory tree of PDFs without the Streamlit UI.
+
+Usage:
+    python ingest.py path/to/pdfs [--workers 4] [--mode process] [--engine pymupdf]
+                     [--checkpoint FILE] [--retry-failed] [--summary summary.json] [--shard NAME]
+
+Every finished PDF is appended to the checkpoint file, so running the same
+command again after an interruption picks up where the last run stopped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from config import Config
+from components.pdf_processor import PDFProcessor
+from components.vector_store import VectorStore
+from components.vector_backends import ShardedBackend
+from components.ingestion import IngestionPipeline, IngestionManifest
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    tqdm = None
+
+FINISHED = ("done", "skipped")
+
+
+def find_pdfs(root: str) -> List[str]:
+    """Absolute paths of every PDF under root, in a stable order"""
+    paths = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        paths.extend(
+            os.path.abspath(os.path.join(dir_path, name))
+            for name in sorted(file_names) if name.lower().endswith(".pdf")
+        )
+    return paths
+
+
+class Checkpoint:
+    """Append-only JSONL log of finished PDFs; the last line for a path wins"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = self._load()
+        self._unchanged = {}  # path -> whether the file still matches its entry
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+    
+    def _load(self) -> Dict[str, Dict]:
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line of a killed run
+                entries[entry["path"]] = entry
+        return entries
+    
+    def finished(self, path: str) -> bool:
+        """Whether path was done or skipped and the file has not changed since"""
+        entry = self.entries.get(path)
+        if entry is None or entry["status"] not in FINISHED:
+            return False
+        if path not in self._unchanged:
+            self._unchanged[path] = self._matches(path, entry)
+        return self._unchanged[path]
+    
+    def _matches(self, path: str, entry: Dict) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return True
+        # Touched, or checkpointed before file stats were recorded: compare the content itself
+        try:
+            unchanged = IngestionManifest.hash_file(path) == entry["content_hash"]
+        except OSError:
+            return False
+        if unchanged:
+            # Record the current stats so the next run gets by with a stat call
+            self.write(path, entry["status"], entry["content_hash"], entry["chunks"], entry["error"])
+        return unchanged
+    
+    def write(self, path: str, status: str, content_hash: Optional[str] = None,
+              chunks: int = 0, error: Optional[str] = None):
+        entry = {
+            "path": path,
+            "pdf_name": os.path.basename(path),
+            "status": status,
+            "content_hash": content_hash,
+            "chunks": chunks,
+            "error": error,
+            "finished_at": datetime.now().isoformat()
+        }
+        try:
+            stat = os.stat(path)
+            entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+        except OSError:
+            pass
+        self.entries[path] = entry
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+    
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    """tqdm bar when available, otherwise one line per finished PDF"""
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.count = 0
+        self.bar = tqdm(total=total, unit="pdf") if tqdm else None
+    
+    def update(self, path: str, status: str, chunks: int = 0):
+        self.count += 1
+        if self.bar is not None:
+            self.bar.update(1)
+            self.bar.set_postfix_str(f"{status}: {os.path.basename(path)}")
+        else:
+            print(f"[{self.count}/{self.total}] {status} {path} ({chunks} chunks)")
+    
+    def close(self):
+        if self.bar is not None:
+            self.bar.close()
+
+
+class BulkIngest:
+    def __init__(self, processor: PDFProcessor, vector_store: VectorStore, checkpoint: Checkpoint,
+                 manifest: IngestionManifest, batch_size: int = Config.INGEST_BATCH_SIZE,
+                 shard: Optional[str] = None):
+        self.processor = processor
+        self.vector_store = vector_store
+        self.checkpoint = checkpoint
+        self.manifest = manifest
+        self.batch_size = batch_size
+        self.shard = shard  # keep this run's new PDFs together in one named shard
+        self.counts = {"ingested": 0, "reindexed": 0, "skipped": 0, "failed": 0, "chunks": 0}
+        self.failures = []
+        self._unrecorded = []  # manifest entries not yet written
+        self.progress = None
+    
+    def run(self, pdf_paths: List[str], retry_failed: bool = False):
+        self._recover_manifest()
+        
+        # A finished PDF whose file changed since is pending again, and _plan sends it to _reindex
+        pending = [
+            path for path in pdf_paths
+            if not self.checkpoint.finished(path)
+            and (retry_failed or self.checkpoint.entries.get(path, {}).get("status") != "failed")
+        ]
+        self.progress = Progress(len(pending))
+        try:
+            new, changed = self._plan(pdf_paths, pending)
+            for path, content_hash in changed:
+                self._reindex(path, content_hash)
+            
+            if new:
+                hashes = dict(new)
+                if self.shard:
+                    self.vector_store.assign_shard([os.path.basename(path) for path in hashes], self.shard)
+                pipeline = IngestionPipeline(self.processor, self.vector_store,
+                                             batch_size=self.batch_size, upsert=True)
+                pipeline.run(
+                    list(hashes),
+                    document_callback=lambda path, chunks: self._finish(path, hashes[path], chunks, "ingested")
+                )
+        finally:
+            self._flush_manifest()
+            self.progress.close()
+    
+    def _recover_manifest(self):
+        """Record PDFs the checkpoint has but the manifest lost, e.g. when a run was killed"""
+        missing = [
+            (entry["content_hash"], entry["pdf_name"], entry["path"], entry["chunks"])
+            for entry in self.checkpoint.entries.values()
+            if entry["status"] == "done" and not self.manifest.contains(entry["content_hash"])
+        ]
+        if missing:
+            self.manifest.record_many(missing)
+    
+    def _plan(self, pdf_paths: List[str], pending: List[str]):
+        """Split pending PDFs into new and changed ones, checkpointing duplicates and name clashes"""
+        # Chunks are keyed by file name, so only the first file of each name is ingested
+        first_with_name = {}
+        for path in pdf_paths:
+            first_with_name.setdefault(os.path.basename(path), path)
+        
+        # hashlib releases the GIL, so reading files in threads overlaps the I/O
+        with ThreadPoolExecutor(max_workers=self.processor.max_workers) as executor:
+            hashes = executor.map(self._hash_file, pending)
+            new, changed, seen = [], [], set()
+            for path, content_hash in zip(pending, hashes):
+                pdf_name = os.path.basename(path)
+                if isinstance(content_hash, Exception):
+                    self._fail(path, None, f"unreadable: {content_hash}")
+                elif first_with_name[pdf_name] != path:
+                    self._fail(path, content_hash, f"duplicate file name, already used by {first_with_name[pdf_name]}")
+                elif self.manifest.contains(content_hash) or content_hash in seen:
+                    self.checkpoint.write(path, "skipped", content_hash)
+                    self.counts["skipped"] += 1
+                    self.progress.update(path, "skipped")
+                elif self.manifest.hash_for_name(pdf_name):
+                    changed.append((path, content_hash))
+                    seen.add(content_hash)
+                else:
+                    new.append((path, content_hash))
+                    seen.add(content_hash)
+        return new, changed
+    
+    @staticmethod
+    def _hash_file(path: str):
+        try:
+            return IngestionManifest.hash_file(path)
+        except OSError as e:
+            return e
+    
+    def _reindex(self, path: str, content_hash: str):
+        """Same file name with new content: rewrite only the chunks that changed"""
+        try:
+            chunks = list(self.processor.iter_multiple_pdfs([path]))
+            if not chunks:
+                self._fail(path, content_hash, "no text extracted")
+                return
+            self.vector_store.reindex_pdf(os.path.basename(path), chunks)
+        except Exception as e:
+            self._fail(path, content_hash, str(e))
+            return
+        self._finish(path, content_hash, len(chunks), "reindexed")
+    
+    def _finish(self, path: str, content_hash: str, chunks: int, outcome: str):
+        if not chunks:
+            # The processor logs and swallows per-PDF errors, leaving no chunks
+            self._fail(path, content_hash, "no text extracted")
+            return
+        self.checkpoint.write(path, "done", content_hash, chunks)
+        self.counts[outcome] += 1
+        self.counts["chunks"] += chunks
+        self.progress.update(path, outcome, chunks)
+        
+        self._unrecorded.append((content_hash, os.path.basename(path), path, chunks))
+        if len(self._unrecorded) >= Config.INGEST_MANIFEST_FLUSH:
+            self._flush_manifest()
+    
+    def _fail(self, path: str, content_hash: Optional[str], error: str):
+        self.checkpoint.write(path, "failed", content_hash, error=error)
+        self.counts["failed"] += 1
+        self.failures.append({"path": path, "error": error})
+        self.progress.update(path, "failed")
+    
+    def _flush_manifest(self):
+        if self._unrecorded:
+            self.manifest.record_many(self._unrecorded)
+            self._unrecorded = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="Directory searched recursively for *.pdf")
+    parser.add_argument("--workers", type=int, default=Config.MAX_WORKERS)
+    parser.add_argument("--mode", choices=PDFProcessor.EXECUTION_MODES, default=Config.EXTRACTION_MODE)
+    parser.add_argument("--engine", choices=PDFProcessor.ENGINES, default=Config.EXTRACTION_ENGINE)
+    parser.add_argument("--batch-size", type=int, default=Config.INGEST_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=Config.INGEST_CHECKPOINT_PATH)
+    parser.add_argument("--retry-failed", action="store_true", help="Try PDFs that failed in earlier runs again")
+    parser.add_argument("--summary", help="Write the JSON summary here as well as to stdout")
+    parser.add_argument("--shard", help="Store new PDFs in this named shard, e.g. one per team "
+                                        "(needs Config.VECTOR_SHARDS > 1)")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.root):
+        parser.error(f"not a directory: {args.root}")
+    
+    pdf_paths = find_pdfs(args.root)
+    checkpoint = Checkpoint(args.checkpoint)
+    previously_finished = sum(1 for path in pdf_paths if checkpoint.finished(path))
+    vector_store = VectorStore()
+    if args.shard and not isinstance(vector_store.backend, ShardedBackend):
+        parser.error("--shard needs a sharded index (Config.VECTOR_SHARDS > 1)")
+    bulk = BulkIngest(
+        PDFProcessor(max_workers=args.workers, execution_mode=args.mode, engine=args.engine),
+        vector_store,
+        checkpoint,
+        IngestionManifest(),
+        batch_size=args.batch_size,
+        shard=args.shard
+    )
+    
+    start = time.perf_counter()
+    status = "completed"
+    try:
+        bulk.run(pdf_paths, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        status = "interrupted"
+    except Exception as e:
+        print(f"Bulk ingestion stopped: {e}", file=sys.stderr)
+        status = "aborted"
+    finally:
+        checkpoint.close()
+    seconds = time.perf_counter() - start
+    
+    processed = bulk.counts["ingested"] + bulk.counts["reindexed"]
+    summary = {
+        "status": status,
+        "root": os.path.abspath(args.root),
+        "checkpoint": os.path.abspath(args.checkpoint),
+        "documents_found": len(pdf_paths),
+        "finished_in_earlier_runs": previously_finished,
+        **bulk.counts,
+        "seconds": round(seconds, 2),
+        "documents_per_second": round(processed / seconds, 3) if seconds else None,
+        "chunks_per_second": round(bulk.counts["chunks"] / seconds, 2) if seconds else None,
+        "failures": bulk.failures
+    }
+    output = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    
+    sys.exit({"completed": 0, "interrupted": 130}.get(status, 1))
+
+
+if __name__ == "__main__":
+    main()
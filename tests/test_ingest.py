@@ -0,0 +1,36 @@
+import json
+import os
+
+from components.ingestion import IngestionManifest
+from ingest import Checkpoint
+
+
+def _checkpoint_done(tmp_path, pdf_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.write(str(pdf_path), "done", IngestionManifest.hash_file(str(pdf_path)), chunks=3)
+    checkpoint.close()
+    return Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+
+
+def test_changed_file_is_no_longer_finished(tmp_path):
+    pdf_path = tmp_path / "report.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 first version")
+    checkpoint = _checkpoint_done(tmp_path, pdf_path)
+    assert checkpoint.finished(str(pdf_path))
+
+    pdf_path.write_bytes(b"%PDF-1.4 second version, longer")
+    assert not Checkpoint(checkpoint.path).finished(str(pdf_path))
+
+
+def test_entry_without_file_stats_falls_back_to_the_content_hash(tmp_path):
+    pdf_path = tmp_path / "report.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 first version")
+    entry = {"path": str(pdf_path), "pdf_name": "report.pdf", "status": "done", "chunks": 3, "error": None,
+             "content_hash": IngestionManifest.hash_file(str(pdf_path))}
+    (tmp_path / "checkpoint.jsonl").write_text(json.dumps(entry) + "\n")
+
+    assert Checkpoint(str(tmp_path / "checkpoint.jsonl")).finished(str(pdf_path))
+
+    pdf_path.write_bytes(b"%PDF-1.4 other version")
+    os.utime(pdf_path, ns=(0, 0))
+    assert not Checkpoint(str(tmp_path / "checkpoint.jsonl")).finished(str(pdf_path))
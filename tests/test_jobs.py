@@ -0,0 +1,17 @@
+import time
+
+from components.jobs import JobStore, _Heartbeat
+
+
+def test_heartbeat_keeps_a_slow_job_from_being_requeued(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job_id = store.submit([{"path": "report.pdf", "pdf_name": "report.pdf"}])
+    assert store.claim_next()["id"] == job_id
+
+    with _Heartbeat(store, job_id, interval=0.05):
+        time.sleep(0.3)
+        assert store.requeue_stale(max_age=0.2) == 0
+
+    time.sleep(0.3)
+    assert store.requeue_stale(max_age=0.2) == 1
+    assert store.get(job_id)["status"] == "queued"
@@ -0,0 +1,39 @@
+import multiprocessing
+
+import pytest
+
+from components import lexical_index
+from components.lexical_index import BM25Index
+
+
+def _add_chunks(directory, writer):
+    index = BM25Index(directory)
+    for i in range(60):
+        index.add([f"w{writer}-{i}"], [f"valve pressure reading {i}"], [f"log-{writer}.pdf"])
+
+
+@pytest.mark.skipif(lexical_index.fcntl is None, reason="needs fcntl file locks")
+def test_compaction_keeps_other_processes_appends(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index.Config, "BM25_COMPACT_EVERY", 5)
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=_add_chunks, args=(str(tmp_path), writer)) for writer in range(3)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join()
+
+    assert [process.exitcode for process in writers] == [0, 0, 0]
+    assert len(BM25Index(str(tmp_path))) == 180
+
+
+def test_search_ranks_and_filters(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(["a", "b", "c"], ["pump valve valve", "pump manual", "valve seal AB-1234"],
+              ["one.pdf", "one.pdf", "two.pdf"])
+
+    assert [chunk_id for chunk_id, _ in index.search("valve", 5)] == ["a", "c"]
+    assert [chunk_id for chunk_id, _ in index.search("valve", 5, pdf_names=["two.pdf"])] == ["c"]
+    assert [chunk_id for chunk_id, _ in index.search("pump", 5, allowed_ids={"b"})] == ["b"]
+
+    index.delete(["a"])
+    assert [chunk_id for chunk_id, _ in index.search("valve", 5)] == ["c"]
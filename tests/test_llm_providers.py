@@ -0,0 +1,30 @@
+import asyncio
+
+from components.llm_providers import FakeProvider, HedgedProvider
+
+
+def _hedged():
+    primary = FakeProvider(response="slow", latency=0.3, model_name="primary")
+    backup = FakeProvider(response="fast", latency=0.01, model_name="backup")
+    return HedgedProvider(primary, backup, default_deadline=0.05)
+
+
+def test_cancelled_primary_latency_is_recorded():
+    provider = _hedged()
+
+    assert asyncio.run(provider.generate("question", 0.0)) == "fast"
+
+    assert provider.stats["backup_wins"] == 1
+    [latency] = provider.primary.latencies["generate"]
+    assert latency >= 0.05
+
+
+def test_cancelled_primary_first_chunk_is_recorded():
+    provider = _hedged()
+
+    async def collect():
+        return [text async for text in provider.stream("question", 0.0)]
+
+    assert asyncio.run(collect()) == ["fast"]
+    [latency] = provider.primary.latencies["first_chunk"]
+    assert latency >= 0.05
@@ -0,0 +1,48 @@
+import io
+
+import fitz
+import pytest
+
+from components.pdf_processor import PDFProcessor
+
+
+def _write_pdf(path, pages):
+    document = fitz.open()
+    for lines in pages:
+        page = document.new_page()
+        page.insert_text((72, 72), "\n".join(lines), fontsize=11)
+    document.save(str(path))
+    document.close()
+
+
+def test_pdfplumber_chunks_carry_line_headings(tmp_path):
+    pdf_path = tmp_path / "report.pdf"
+    _write_pdf(pdf_path, [
+        ["Chapter 1", "The pump was inspected before the trial began.", "METHODS",
+         "Pressure was logged every hour during the audit."],
+        ["Valve readings stayed within the agreed margin.", "RESULTS", "Latency fell after the upgrade."],
+    ])
+
+    chunks = PDFProcessor(engine="pdfplumber").extract_structure(str(pdf_path))
+
+    sections = [(chunk.heading, chunk.page_number, chunk.text) for chunk in chunks]
+    assert sections == [
+        ("Chapter 1", 1, "The pump was inspected before the trial began."),
+        ("METHODS", 1, "Pressure was logged every hour during the audit.\n\n"
+                       "Valve readings stayed within the agreed margin."),
+        ("RESULTS", 2, "Latency fell after the upgrade."),
+    ]
+
+
+def test_in_memory_pdfs_need_distinct_names(tmp_path):
+    pdf_path = tmp_path / "report.pdf"
+    _write_pdf(pdf_path, [["Chapter 1", "The pump was inspected before the trial began."]])
+    data = pdf_path.read_bytes()
+    processor = PDFProcessor(engine="pdfplumber")
+
+    with pytest.raises(ValueError):
+        list(processor.iter_multiple_pdfs([io.BytesIO(data), io.BytesIO(data)]))
+
+    chunks = list(processor.iter_multiple_pdfs([io.BytesIO(data), io.BytesIO(data)], names=["a.pdf", "b.pdf"]))
+    assert [chunk.pdf_name for chunk in chunks] == ["a.pdf", "b.pdf"]
+    assert chunks[0].chunk_id != chunks[1].chunk_id
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from components.vector_backends import ShardedBackend
+
+
+def _add_pdf(backend, pdf_name, rows=3, dim=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((rows, dim)).tolist()
+    backend.add(
+        [f"{pdf_name}-{row}" for row in range(rows)], vectors,
+        [f"text {row}" for row in range(rows)],
+        [{"pdf_name": pdf_name, "page_number": row + 1} for row in range(rows)]
+    )
+
+
+def _pdfs_per_shard(backend):
+    return {shard["name"]: shard["pdfs"] for shard in backend.stats()["shards"]}
+
+
+def test_deleted_pdf_can_move_to_another_shard(tmp_path):
+    backend = ShardedBackend("numpy", str(tmp_path), hash_shards=2, workers=2)
+    backend.assign(["a.pdf"], "team-a")
+    _add_pdf(backend, "a.pdf")
+    _add_pdf(backend, "b.pdf", seed=1)
+    assert _pdfs_per_shard(backend)["team-a"] == 1
+    
+    with pytest.raises(ValueError):
+        backend.assign(["a.pdf"], "team-b")
+    
+    backend.delete(where={"pdf_name": "a.pdf"})
+    assert _pdfs_per_shard(backend)["team-a"] == 0
+    
+    backend.assign(["a.pdf"], "team-b")
+    _add_pdf(backend, "a.pdf")
+    per_shard = _pdfs_per_shard(backend)
+    assert per_shard["team-a"] == 0 and per_shard["team-b"] == 1
+    assert backend.count() == 6
+    
+    # Another instance sees the released assignment
+    reopened = ShardedBackend("numpy", str(tmp_path), hash_shards=2, workers=2)
+    assert _pdfs_per_shard(reopened) == per_shard
+
+
+def test_partial_delete_keeps_the_assignment(tmp_path):
+    backend = ShardedBackend("numpy", str(tmp_path), hash_shards=2, workers=2)
+    backend.assign(["a.pdf"], "team-a")
+    _add_pdf(backend, "a.pdf")
+    
+    backend.delete(where={"$and": [{"pdf_name": "a.pdf"}, {"page_number": 1}]})
+    assert backend.count() == 2
+    with pytest.raises(ValueError):
+        backend.assign(["a.pdf"], "team-b")